@@ -51,11 +51,25 @@ namespace SAM.Classifiers
             throw new NotImplementedException();
         }
 
+        /// <summary>
+        /// Sends all sentences to the python server in one batch
+        /// </summary>
+        /// <param name="sentences"></param>
+        /// <returns>Label,rating for every sentence</returns>
         public IEnumerable<(string, float)> Evaluate(IEnumerable<string> sentences)
         {
             var results = new List<(string, float)>();
+            var stream = client.GetStream();
 
-            throw new NotImplementedException();
+            foreach (var response in RemoteHandler.CallServerBatch(stream, new List<string>(sentences)))
+            {
+                if (response == "" || response == null)
+                    results.Add(("Error", 0));
+                else
+                    results.Add(Evaluation(float.Parse(response)));
+            }
+
+            return results;
         }
 
 
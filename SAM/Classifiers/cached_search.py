@@ -0,0 +1,334 @@
+import hashlib, math, os, time
+import numpy as np
+import scipy.sparse as sp
+
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer, TfidfTransformer
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import ParameterGrid, check_cv
+
+from featurizers import CachedCharCountVectorizer
+
+'''
+Hyperparameter search over Pipeline([(featurizer), (classifier)]) objects that vectorizes every
+cross validation fold once per vectorizer setting. tf-idf vectorizers are split into counts,
+which are cached, and the weighting flags (use_idf, smooth_idf, sublinear_tf, norm), which are
+cheap to apply to the cached counts. Sweeps over classifier parameters or weighting flags therefore
+never featurize the text again. The matrices are kept in memory and optionally as .npz files, the
+files are keyed by the sentences and the fold indices, so re-runs only hit them with seeded folds.
+The candidates are fitted on the featurized folds in n_jobs processes, like GridSearchCV's n_jobs.
+HalvingSearch additionally scores the candidates on growing fractions of the folds and drops the
+weakest after every round, so large grids only pay full fits for the few best candidates.
+'''
+
+# tf-idf parameters applied to the cached counts instead of being part of the cache key
+weighting_params = ('norm', 'use_idf', 'smooth_idf', 'sublinear_tf')
+
+def split_featurizer(featurizer):
+    '''
+    Returns
+    -------
+    base: The vectorizer whose output is cached,
+    weighting: The TfidfTransformer parameters applied afterwards, None for other featurizers
+    '''
+    if not isinstance(featurizer, TfidfVectorizer):
+        return featurizer, None
+
+    params = featurizer.get_params()
+    count_params = {k: v for k, v in params.items() if k in CountVectorizer().get_params()}
+    # Same counts and dtype as the tf-idf vectorizer computes internally
+    base = CachedCharCountVectorizer(**count_params)
+    return base, {k: params[k] for k in weighting_params}
+
+def data_digest(X, folds):
+    digest = hashlib.sha1()
+    for sentence in X:
+        digest.update(str(sentence).encode('utf-8') + b'\0')
+    for train, test in folds:
+        digest.update(np.asarray(train, dtype=np.int64).tobytes() + b'|' + np.asarray(test, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+def params_digest(vectorizer):
+    params = sorted((k, repr(v)) for k, v in vectorizer.get_params().items())
+    return hashlib.sha1(repr((type(vectorizer).__name__, params)).encode('utf-8')).hexdigest()
+
+class FoldFeatureCache:
+    '''
+    Vectorized train and test matrices of every fold, keyed by the data and the vectorizer params.
+    The matrices do not depend on the labels, so searches over different labelings of the same
+    sentences and folds can share one cache.
+    Parameters
+    -----------
+    X: The sentences,
+    folds: List of (train_indices, test_indices),
+    directory: Where to keep .npz copies of the matrices, None to only cache in memory,
+    max_bytes: Size the directory may grow to, the least recently used entries are removed beyond it
+    '''
+    def __init__(self, X, folds, directory=None, max_bytes=2 * 2**30):
+        self.X = np.asarray(X)
+        self.folds = folds
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.digest = data_digest(self.X, folds)
+        self.matrices = {}
+        # Seconds it took to featurize every cached entry, used to estimate the time saved
+        self.costs = {}
+        self.featurize_seconds = 0.0
+        self.saved_seconds = 0.0
+        self.hits, self.misses = 0, 0
+
+    def path(self, key, fold):
+        return os.path.join(self.directory, '{}-{}-fold{}'.format(self.digest[:16], key[:16], fold))
+
+    def features(self, vectorizer, fold):
+        '''
+        Returns
+        -------
+        X_train, X_test: The fold's matrices, produced by fitting vectorizer on the training part
+        '''
+        key = params_digest(vectorizer)
+        if (key, fold) in self.matrices:
+            self.hits += 1
+            self.saved_seconds += self.costs[key, fold]
+            return self.matrices[key, fold]
+
+        start = time.perf_counter()
+        path = self.directory and self.path(key, fold)
+        if path and os.path.isfile(path + '.test.npz'):
+            matrices = sp.load_npz(path + '.train.npz'), sp.load_npz(path + '.test.npz')
+            # The mtime marks when an entry was last used, see prune
+            os.utime(path + '.test.npz')
+        else:
+            train, test = self.folds[fold]
+            vectorizer = clone(vectorizer)
+            matrices = vectorizer.fit_transform(self.X[train]), vectorizer.transform(self.X[test])
+            if path:
+                os.makedirs(self.directory, exist_ok=True)
+                sp.save_npz(path + '.train.npz', matrices[0])
+                # Written last, its presence marks a complete entry
+                sp.save_npz(path + '.test.npz', matrices[1])
+                self.prune()
+
+        self.costs[key, fold] = time.perf_counter() - start
+        self.featurize_seconds += self.costs[key, fold]
+        self.misses += 1
+        self.matrices[key, fold] = matrices
+        return matrices
+
+    def prune(self):
+        '''
+        Removes the least recently used entries of the directory until it holds at most max_bytes
+        '''
+        entries = {}
+        for name in os.listdir(self.directory):
+            for suffix in ('.train.npz', '.test.npz'):
+                if name.endswith(suffix):
+                    entries.setdefault(name[:-len(suffix)], []).append(os.path.join(self.directory, name))
+
+        def last_used(files):
+            return max(os.path.getmtime(path) for path in files)
+
+        total = sum(os.path.getsize(path) for files in entries.values() for path in files)
+        for entry in sorted(entries, key=lambda entry: last_used(entries[entry])):
+            if total <= self.max_bytes:
+                break
+            # The .test.npz file goes first, so a half removed entry is never read
+            for path in sorted(entries[entry], key=lambda path: not path.endswith('.test.npz')):
+                total -= os.path.getsize(path)
+                os.remove(path)
+
+    def fold_data(self, featurizer, fold):
+        '''
+        Returns
+        -------
+        X_train, X_test: The fold featurized by featurizer
+        '''
+        base, weighting = split_featurizer(featurizer)
+        X_train, X_test = self.features(base, fold)
+        if weighting is not None:
+            transformer = TfidfTransformer(**weighting)
+            X_train, X_test = transformer.fit_transform(X_train), transformer.transform(X_test)
+        return X_train, X_test
+
+    def report(self):
+        return ('Featurized {} folds in {} s, reused them {} times, saving about {} s'.format(
+            self.misses, round(self.featurize_seconds, 2), self.hits, round(self.saved_seconds, 2)))
+
+def pipeline_steps(pipeline):
+    if len(pipeline.steps) != 2:
+        raise ValueError('Only Pipeline([(featurizer), (classifier)]) objects can be searched')
+    return pipeline.steps[0][1], pipeline.steps[1][1]
+
+def fit_and_score(classifier, X_train, y_train, X_test, y_test):
+    model = clone(classifier).fit(X_train, y_train)
+    return accuracy_score(y_test, model.predict(X_test))
+
+def make_folds(cv, X, y):
+    # Like GridSearchCV, cv may also be a generator of (train, test) indices
+    return list(check_cv(cv, y, classifier=True).split(X, y))
+
+
+class CachedGridSearch:
+    '''
+    Exhaustive search like GridSearchCV(pipeline, param_grid, cv), scored by accuracy, with the
+    featurized folds shared between candidates. The best candidate is refit on all the data.
+    Parameters
+    -----------
+    pipeline: Pipeline([(featurizer), (classifier)]),
+    param_grid: Dict or list of dicts of pipeline parameters, like GridSearchCV's,
+    cv: Number of folds, a splitter, or an iterable of (train, test) indices,
+    cache_dir: Where to keep .npz copies of the featurized folds, None to only cache in memory,
+    verbose: Print every candidate's score,
+    n_jobs: Processes fitting the candidates on the featurized folds, -1 for one per CPU, like GridSearchCV's
+    '''
+    def __init__(self, pipeline, param_grid, cv=4, cache_dir=None, verbose=1, n_jobs=None):
+        self.pipeline = pipeline
+        self.param_grid = param_grid
+        self.cv = cv
+        self.cache_dir = cache_dir
+        self.verbose = verbose
+        self.n_jobs = n_jobs
+
+    def evaluate(self, candidates, y, train_rows=None):
+        '''
+        Scores the candidates on every fold. Candidates that only differ in classifier parameters,
+        eg. a path of C values, share the featurized and weighted fold matrices.
+        Parameters
+        -----------
+        candidates: List of parameter dicts,
+        y: The labels,
+        train_rows: Positions within every fold's training part to fit on, None to use all of them
+        Returns
+        -------
+        scores: The accuracy on every fold for every candidate
+        '''
+        steps = [pipeline_steps(clone(self.pipeline).set_params(**params)) for params in candidates]
+        groups = {}
+        for index, (featurizer, classifier) in enumerate(steps):
+            groups.setdefault(params_digest(featurizer), []).append(index)
+
+        # Every fold is featurized here, in this process, only the fits run in parallel
+        tasks = []
+        for fold, (train, test) in enumerate(self.cache_.folds):
+            y_train = y[train]
+            for members in groups.values():
+                X_train, X_test = self.cache_.fold_data(steps[members[0]][0], fold)
+                if train_rows is not None:
+                    X_train, y_train = X_train[train_rows[fold]], y[train][train_rows[fold]]
+                for index in members:
+                    tasks.append((index, (steps[index][1], X_train, y_train, X_test, y[test])))
+
+        fold_scores = Parallel(n_jobs=self.n_jobs)(delayed(fit_and_score)(*args) for index, args in tasks)
+        # The tasks are in fold order, so every candidate's scores are as well
+        scores = [[] for params in candidates]
+        for (index, args), score in zip(tasks, fold_scores):
+            scores[index].append(score)
+        return scores
+
+    def record(self, candidates, scores, fraction=1.0):
+        for params, fold_scores in zip(candidates, scores):
+            self.cv_results_['params'].append(params)
+            self.cv_results_['mean_test_score'].append(np.mean(fold_scores))
+            self.cv_results_['std_test_score'].append(np.std(fold_scores))
+            self.cv_results_['fraction'].append(fraction)
+            if self.verbose:
+                print('{}: {} (+/- {})'.format(params, round(np.mean(fold_scores), 4), round(np.std(fold_scores), 4)))
+
+    def search(self, y):
+        '''
+        Returns
+        -------
+        final: Indices into cv_results_ of the candidates the best one is picked from
+        '''
+        candidates = list(ParameterGrid(self.param_grid))
+        self.record(candidates, self.evaluate(candidates, y))
+        return list(range(len(candidates)))
+
+    def fit(self, X, y, cache=None):
+        '''
+        Parameters
+        -----------
+        X, y: The sentences and labels,
+        cache: FoldFeatureCache of X shared with other searches, its folds are used instead of cv
+        '''
+        start, cpu_start = time.perf_counter(), time.process_time()
+        X, y = np.asarray(X), np.asarray(y)
+        self.cache_ = cache if cache is not None else FoldFeatureCache(X, make_folds(self.cv, X, y), self.cache_dir)
+
+        self.cv_results_ = {'params': [], 'mean_test_score': [], 'std_test_score': [], 'fraction': []}
+        final = self.search(y)
+        best = max(final, key=lambda index: self.cv_results_['mean_test_score'][index])
+        self.best_index_ = best
+        self.best_params_ = self.cv_results_['params'][best]
+        self.best_score_ = self.cv_results_['mean_test_score'][best]
+        self.best_estimator_ = clone(self.pipeline).set_params(**self.best_params_).fit(X, y)
+
+        self.seconds_ = time.perf_counter() - start
+        self.cpu_seconds_ = time.process_time() - cpu_start
+        if self.verbose:
+            print('Best: {} ({}). Scored {} candidates in {} s, {} s of CPU time. {}'.format(
+                self.best_params_, round(self.best_score_, 4), len(self.cv_results_['params']),
+                round(self.seconds_, 2), round(self.cpu_seconds_, 2), self.cache_.report()))
+        return self
+
+    def predict(self, X):
+        return self.best_estimator_.predict(X)
+
+    def score(self, X, y):
+        return self.best_estimator_.score(X, y)
+
+class HalvingSearch(CachedGridSearch):
+    '''
+    Successive halving over the grid of CachedGridSearch. Every round fits the remaining candidates
+    on a fraction of every fold's training rows, keeps the best 1/factor of them and multiplies the
+    fraction by factor, the last round uses all rows. The folds are featurized once and shared by
+    every round, and the row subsets of a fold grow without being redrawn.
+    Parameters
+    -----------
+    pipeline, param_grid, cv, cache_dir, verbose, n_jobs: As for CachedGridSearch,
+    factor: How many times fewer candidates and more rows every round has,
+    min_fraction: Smallest fraction of the rows the first round may use, None to start so that
+                  about factor candidates are left for the last round,
+    random_state: Seed of the row subsets
+    '''
+    def __init__(self, pipeline, param_grid, cv=4, cache_dir=None, verbose=1, factor=3, min_fraction=None,
+                 random_state=0, n_jobs=None):
+        super().__init__(pipeline, param_grid, cv, cache_dir, verbose, n_jobs)
+        self.factor = factor
+        self.min_fraction = min_fraction
+        self.random_state = random_state
+
+    def fractions(self, n_candidates):
+        if self.min_fraction is None:
+            rounds = max(1, math.ceil(math.log(n_candidates, self.factor)))
+        else:
+            rounds = 1 + int(math.floor(math.log(1 / self.min_fraction, self.factor) + 1e-9))
+        return [float(self.factor) ** (step - rounds + 1) for step in range(rounds)]
+
+    def subsample(self, y_train, fraction, fold):
+        # Stratified, and the same permutation every round, so a larger fraction extends a smaller one
+        rng = np.random.RandomState(None if self.random_state is None else self.random_state + fold)
+        rows = []
+        for label in np.unique(y_train):
+            positions = rng.permutation(np.flatnonzero(y_train == label))
+            rows.append(positions[:max(1, int(round(fraction * len(positions))))])
+        return np.sort(np.concatenate(rows))
+
+    def search(self, y):
+        candidates = list(ParameterGrid(self.param_grid))
+        remaining = list(range(len(candidates)))
+        for fraction in self.fractions(len(candidates)):
+            if self.verbose:
+                print('{} candidates on {}% of the rows'.format(len(remaining), round(fraction * 100, 1)))
+            train_rows = None if fraction >= 1 else [self.subsample(y[train], fraction, fold)
+                                                     for fold, (train, test) in enumerate(self.cache_.folds)]
+            first = len(self.cv_results_['params'])
+            self.record([candidates[index] for index in remaining],
+                        self.evaluate([candidates[index] for index in remaining], y, train_rows), fraction)
+
+            final = list(range(first, len(self.cv_results_['params'])))
+            means = np.asarray(self.cv_results_['mean_test_score'][first:])
+            keep = np.sort(np.argsort(-means, kind='stable')[:max(1, math.ceil(len(remaining) / self.factor))])
+            remaining = [remaining[index] for index in keep]
+        return final
@@ -1,13 +1,14 @@
-﻿import numpy as np
-import keras as K
-import tensorflow as tf
-import os, csv, pickle
+﻿import keras as K
+import os, pickle
 
 from keras.preprocessing.text import Tokenizer
 from keras.callbacks import EarlyStopping
 from keras.callbacks import ModelCheckpoint
 from keras.callbacks import CSVLogger
 
+from fast_tokenizer import FastTokenizer
+import labeled_data, sequence_cache
+
 dir_path = os.path.dirname(os.path.realpath(__file__))
 train_path = dir_path + '/TrainingData/training_data.csv'
 test_path = dir_path + '/TrainingData/test_data.csv'
@@ -18,35 +19,38 @@ max_text_length = 20
 embed_vec_len   = 64
 bat_size        = 64
 max_epochs      = 50
+# Keras' defaults, spelled out since they are part of the tokenizer's cache key
+tokenizer_config = {'num_words': max_words, 'filters': '!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n', 'lower': True,
+                    'split': ' ', 'char_level': False, 'oov_token': None}
 
 model_path      = dir_path + '/Model/LSTM_model.h5'
 tokenizer_path  = dir_path + '/Model/tokenizer.pickle'
-
-# Loads labeled data from csv file
-def load_labeled_data(filepath):
-    sentences, labels = [], []
-    csv_reader = csv.reader(open(filepath, encoding='utf8'))
-
-    for row in csv_reader:
-        label = int(row[0])
-        sentences.append(row[1])
-        
-        if label > 0:
-            labels.append(1)
-        elif label < 0:
-            labels.append(-1)
-        else:
-            labels.append(0)
-            
-    return sentences, labels
-
-def train_model(tokenizer, x_train, y_train, x_test, y_test, modelpath):
-    X_train = tokenizer.texts_to_sequences(x_train)
-    X_train = K.preprocessing.sequence.pad_sequences(X_train, maxlen=max_text_length, padding='pre', truncating='pre')
-
-    X_test = tokenizer.texts_to_sequences(x_test)
-    X_test = K.preprocessing.sequence.pad_sequences(X_test, maxlen=max_text_length, padding='pre', truncating='pre')
-
+compact_tokenizer_path = dir_path + '/Model/tokenizer.json'
+# Fitted tokenizers and padded sequences, keyed by the hash of the training data
+cache_dir       = dir_path + '/Model/cache/'
+
+# Fits the tokenizer while streaming the sentences, a fitted tokenizer is reused for the same data and config
+def fit_tokenizer(filepaths):
+    key = sequence_cache.tokenizer_key(sequence_cache.data_digest(filepaths), tokenizer_config)
+    path = cache_dir + key + '.tokenizer.pickle'
+    if os.path.isfile(path):
+        print('Using cached tokenizer')
+        return load_tokenizer(path)
+
+    tokenizer = Tokenizer(**tokenizer_config)
+    tokenizer.fit_on_texts(sentence for filepath in filepaths for sentence, _ in labeled_data.iter_labeled(filepath))
+
+    os.makedirs(cache_dir, exist_ok=True)
+    save_tokenizer(path, tokenizer)
+    return tokenizer
+
+# Tokenized and padded sequences as memory maps, only built if the data or tokenizer changed
+def load_sequences(filepath, tokenizer):
+    X, y, hit = sequence_cache.cached_sequences(filepath, FastTokenizer.from_keras(tokenizer), max_text_length, cache_dir)
+    print('{} sequences for {} ({} rows)'.format('Cached' if hit else 'Built', os.path.basename(filepath), len(X)))
+    return X, y
+
+def train_model(X_train, y_train, X_test, y_test, modelpath):
     print("Creating LSTM model")
 
     e_init      = K.initializers.RandomUniform(-0.01, 0.01)
@@ -74,7 +78,13 @@ def train_model(tokenizer, x_train, y_train, x_test, y_test, modelpath):
     print(model.summary)
 
     print('Started training model')
-    model.fit(X_train, y_train, epochs=max_epochs, batch_size=bat_size, shuffle=True, verbose=1, validation_data=(X_test, y_test), callbacks=callbacks)
+    # Batches are streamed from the memory maps, so the padded data never has to fit in memory
+    model.fit_generator(sequence_cache.batches(X_train, y_train, bat_size, shuffle=True),
+                        steps_per_epoch=sequence_cache.steps(X_train, bat_size),
+                        epochs=max_epochs, verbose=1,
+                        validation_data=sequence_cache.batches(X_test, y_test, bat_size, shuffle=False),
+                        validation_steps=sequence_cache.steps(X_test, bat_size),
+                        callbacks=callbacks)
     print('Training complete')
 
     model.save(modelpath)
@@ -82,17 +92,16 @@ def train_model(tokenizer, x_train, y_train, x_test, y_test, modelpath):
     return model
 
 def main():
-    train_x, train_y = load_labeled_data(train_path)
-    test_x, test_y = load_labeled_data(test_path)
+    tokenizer = fit_tokenizer([train_path, test_path])
 
-    all_sentences = train_x + test_x
+    X_train, y_train = load_sequences(train_path, tokenizer)
+    X_test, y_test = load_sequences(test_path, tokenizer)
 
-    tokenizer = Tokenizer(num_words=max_words, split=' ', lower=True)
-    tokenizer.fit_on_texts(all_sentences)
-
-    train_model(tokenizer, train_x, train_y, test_x, test_y, model_path)
+    train_model(X_train, y_train, X_test, y_test, model_path)
 
     save_tokenizer(tokenizer_path, tokenizer)
+    # The vocabulary lstm.py tokenizes with at inference
+    FastTokenizer.from_keras(tokenizer).save(compact_tokenizer_path)
 
 def load_model(filepath):
     return K.models.load_model(filepath)
@@ -107,14 +116,8 @@ def load_tokenizer(filepath):
     
 
 
-if __name__ == '__main__':
-    main()
-
-model = load_model(model_path)
-tokenizer = load_tokenizer(tokenizer_path)
-
 def predict_sentence(sentence):
-    X = tokenizer.texts_to_sequences(sentence)
+    X = tokenizer.texts_to_sequences([sentence])
 
     X = K.preprocessing.sequence.pad_sequences(X, maxlen=max_text_length, padding='pre', truncating='pre')
 
@@ -131,7 +134,13 @@ def predict_sentences(sentences):
     return y_prob.argmax(axis=-1)
 
 
-sentence = "Du er den sødeste i verden, og jeg elsker dig! "
-res = predict_sentence(sentence)
+if __name__ == '__main__':
+    main()
+
+    model = load_model(model_path)
+    tokenizer = load_tokenizer(tokenizer_path)
+
+    sentence = "Du er den sødeste i verden, og jeg elsker dig! "
+    res = predict_sentence(sentence)
 
-print("'{}' predicted as {}".format(sentence, res[0]))
+    print("'{}' predicted as {}".format(sentence, res[0]))
@@ -1,17 +1,18 @@
-import argparse, joblib, csv, sys, os
+import joblib, os
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 
-from mpl_toolkits.mplot3d import Axes3D
-
-from sklearn.naive_bayes import *
+from sklearn.naive_bayes import MultinomialNB
 from sklearn.pipeline import Pipeline
 from sklearn.decomposition import PCA
 from sklearn.metrics import confusion_matrix
-from sklearn.model_selection import train_test_split, StratifiedKFold, GridSearchCV
+from sklearn.model_selection import train_test_split, StratifiedKFold
 from sklearn.feature_extraction.text import TfidfVectorizer
 
+import labeled_data
+from cached_search import HalvingSearch
+
 '''
 SVM classifier
 '''
@@ -46,9 +47,11 @@ def train_model(X, y, auto_split=True):
                   'tfidf__use_idf':(True, False),
                   'tfidf__smooth_idf':(True, False),
                   'tfidf__sublinear_tf':(True, False),
+                  'nb__alpha':(0.1, 0.3, 1.0),
     }
-    skf = StratifiedKFold(10, True)
-    clf = GridSearchCV(svm_pipeline, parameters, cv=skf.split(X, y), verbose=3)
+    skf = StratifiedKFold(10, shuffle=True)
+    # The folds are featurized once, weak candidates are dropped on small fractions of them
+    clf = HalvingSearch(svm_pipeline, parameters, cv=skf)
     if auto_split is True:
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.1)
         clf.fit(X_train, y_train)
@@ -80,71 +83,18 @@ def train_model(X, y, auto_split=True):
     joblib.dump(clf, model_path)
     return clf
 
-def load_dataset(encoding='utf8'):
+def load_dataset():
     '''
-    Loads training data and splits it into test and train sets
-    Parameters
-    -----------
-    encoding: The encoding of the file loaded. Default is UTF-8
-    
+    Loads the training data without the neutral sentences, see labeled_data.load_labeled
     Returns
     -------
     X: The sentences,
-    y: The labels
-    '''
-    csv_reader = csv.reader(open(data_path, encoding=encoding))
-    X, y = [], []
-
-    # Saving comments and likes in seperate lists
-    for row in csv_reader:
-        #X.append(row[1])
-        if int(row[0]) < 0:
-            X.append(row[1])
-            y.append(-1)
-        elif int(row[0]) > 0:
-            X.append(row[1])
-            y.append(1)
-        else:
-            pass
-            #y.append(-0)
-
-    y = np.asarray(y)
-    X = np.asarray(X)
-
-    return X, y
-
-def load_test_dataset(encoding='utf8'):
+    y: The labels, -1 or 1
     '''
-    Loads training data and splits it into test and train sets
-    Parameters
-    -----------
-    encoding: The encoding of the file loaded. Default is UTF-8
-    
-    Returns
-    -------
-    X: The sentences,
-    y: The labels
-    '''
-    csv_reader = csv.reader(open(test_data_path, encoding=encoding))
-    X, y = [], []
-
-    # Saving comments and likes in seperate lists
-    for row in csv_reader:
-        #X.append(row[1])
-        if int(row[0]) < 0:
-            X.append(row[1])
-            y.append(-1)
-        elif int(row[0]) > 0:
-            X.append(row[1])
-            y.append(1)
-        else:
-            pass
-            #y.append(0)           
-
-    y = np.asarray(y)
-    X = np.asarray(X)
+    return labeled_data.load_labeled(data_path, 'binary')
 
-    return X, y
+def load_test_dataset():
+    return labeled_data.load_labeled(test_data_path, 'binary')
 
 
 # Get list of stop words
@@ -237,10 +187,11 @@ def plot_confusion_matrix(cm, title='SVM Confusion matrix', cmap=plt.get_cmap('B
 # <- SCRIPT STARTS HERE ->
 # <---------------------->
 
-# Train model first time
-X, y = load_dataset() 
+if __name__ == '__main__':
+    # Train model first time
+    X, y = load_dataset()
 
-pipeline = train_model(X, y, False)
-print(pipeline.named_steps['tfidf'])
-# X_transformed = pipeline.named_steps['tfidf'].transform(X)
-# plot_data_2d(X_transformed, y)
+    pipeline = train_model(X, y, False)
+    print(pipeline.named_steps['tfidf'])
+    # X_transformed = pipeline.named_steps['tfidf'].transform(X)
+    # plot_data_2d(X_transformed, y)
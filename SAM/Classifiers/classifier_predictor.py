@@ -1,8 +1,7 @@
-import sys, joblib, os, lstm#, multisvm
+import time
+startup_time = time.perf_counter()
 
-from sklearn.svm import SVR
-from sklearn.pipeline import Pipeline
-from sklearn.feature_extraction.text import TfidfVectorizer
+import sys, joblib, os, importlib, argparse, csv, json, io, itertools, collections, multiprocessing, queue
 
 # Arguments:
 # First argument specifies the classifier
@@ -12,15 +11,25 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 #
 # Every argument afterwards are phrases to be predicted. Eg:
 # python classifier_predictor.py -svm "First string." "Second string."
+#
+# Without phrases, or if the second argument is an option, the input is streamed in chunks instead. Eg:
+# python classifier_predictor.py -svm --input comments.csv --output labels.csv
+# cat comments.txt | python classifier_predictor.py -svm --format lines
+# python classifier_predictor.py -svm --input comments.csv --jobs 4
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
 model_path = dir_path + "/Model"
 
 def main():
-    if len(sys.argv) < 3:
+    if len(sys.argv) < 2:
         print("Please supply correct number of arguments")
         exit(1)
 
+    # Without phrases the sentences are streamed from --input or stdin
+    if len(sys.argv) == 2 or sys.argv[2].startswith('--'):
+        stream_main(sys.argv[1], sys.argv[2:])
+        return
+
     # Read every phrase from arguments
     predict_phrases = []
     for i in range(2, len(sys.argv)):
@@ -36,25 +45,223 @@ def main():
         print(predict_results[i])
 
 
-# Get classifier from supplied argument
-def getClassifier(clf):
-    switcher = {
-        "-svm": joblib.load(model_path + "/svm_pipeline.joblib"),
-        # "-nb": joblib.load(model_path + "/nb_pipeline.joblib"),
-        "-rf": joblib.load(model_path + "/rf_pipeline.joblib"),
-        "-lstm": lstm
-    }
+# <---------------------->
+# <-   STREAMING MODE   ->
+# <---------------------->
+
+def parse_stream_args(args):
+    parser = argparse.ArgumentParser(description='Scores a file or stdin in fixed size chunks')
+    parser.add_argument('--input', default='-', help='File to score, - for stdin')
+    parser.add_argument('--output', default='-', help='File to write, - for stdout')
+    parser.add_argument('--format', choices=['csv', 'jsonl', 'lines'],
+                        help='Input format, guessed from the file extension if omitted')
+    parser.add_argument('--column', default=None,
+                        help='csv column index (default 1) or jsonl key (default text) holding the sentence')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='Sentences per predict call')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Worker processes scoring chunks in parallel, each loads the model once')
+    parser.add_argument('--load-timeout', type=float, default=600,
+                        help='Seconds to wait for the workers to load the model')
+    return parser.parse_args(args)
+
+def guess_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.json'):
+        return 'jsonl'
+    return 'lines'
+
+def open_input(path):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+    return open(path, encoding='utf-8-sig', newline='')
+
+def open_output(path):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+def read_sentences(handle, fmt, column=None):
+    '''
+    Lazily reads sentences, so only one chunk is held in memory at a time
+    '''
+    if fmt == 'csv':
+        index = int(column) if column is not None else 1
+        for row in csv.reader(handle):
+            yield row[index]
+    elif fmt == 'jsonl':
+        key = column or 'text'
+        for line in handle:
+            if line.strip():
+                yield json.loads(line)[key]
+    else:
+        for line in handle:
+            yield line.rstrip('\r\n')
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def write_results(handle, fmt, sentences, labels):
+    if fmt == 'jsonl':
+        for sentence, label in zip(sentences, labels):
+            # numpy scalars are not json serializable
+            label = getattr(label, 'item', lambda: label)()
+            handle.write(json.dumps({'label': label, 'text': sentence}, ensure_ascii=False) + '\n')
+    else:
+        # Same layout as the training data: label, sentence
+        csv.writer(handle).writerows(zip(labels, sentences))
+    handle.flush()
+
+def print_summary(rows, load_seconds, score_seconds):
+    # The rate leaves out model loading, which does not depend on the input size
+    rate = rows / score_seconds if score_seconds > 0 else 0
+    print("Scored {} rows in {} s, {} s loading the model and {} s scoring ({} rows/s)".format(
+        rows, round(load_seconds + score_seconds, 3), round(load_seconds, 3), round(score_seconds, 3),
+        round(rate, 1)), file=sys.stderr)
+
+# The model loaded by each worker process
+worker_clf = None
+
+def init_worker(classifier, ready):
+    # A failing initializer is restarted by the pool forever, so the error is sent to the parent instead
+    global worker_clf
+    try:
+        worker_clf = getClassifier(classifier)
+    except BaseException as e:
+        ready.put((os.getpid(), repr(e)))
+        return
+    ready.put((os.getpid(), None))
 
+def predict_chunk(chunk):
+    return list(worker_clf.predict(chunk))
+
+def start_pool(classifier, jobs, timeout=None):
+    '''
+    Parameters
+    -----------
+    classifier: The classifier argument, checked with check_classifier first,
+    jobs: The number of worker processes,
+    timeout: Seconds to wait for every worker to load the model, None waits forever
+    Returns
+    -------
+    pool: A process pool whose workers have all loaded the model
+    Raises
+    ------
+    RuntimeError: When a worker failed to load the model or the timeout passed, the pool is terminated then
+    '''
+    ready = multiprocessing.Queue()
+    pool = multiprocessing.Pool(jobs, initializer=init_worker, initargs=(classifier, ready))
+    try:
+        for _ in range(jobs):
+            pid, error = ready.get(timeout=timeout)
+            if error is not None:
+                raise RuntimeError('Worker {} failed to load {}: {}'.format(pid, classifier, error))
+    except queue.Empty:
+        pool.terminate()
+        raise RuntimeError('The workers did not load {} within {} s'.format(classifier, timeout))
+    except BaseException:
+        pool.terminate()
+        raise
+    return pool
+
+def predict_parallel(pool, chunk_iterator, jobs):
+    '''
+    Scores chunks in the pool and yields (chunk, labels) in input order.
+    At most two chunks per worker are in flight, so memory stays bounded.
+    '''
+    pending = collections.deque()
+    for chunk in chunk_iterator:
+        pending.append((chunk, pool.apply_async(predict_chunk, (chunk,))))
+        if len(pending) >= 2 * jobs:
+            chunk, result = pending.popleft()
+            yield chunk, result.get()
+    while pending:
+        chunk, result = pending.popleft()
+        yield chunk, result.get()
+
+def stream_main(classifier, args):
+    options = parse_stream_args(args)
+    fmt = options.format or guess_format(options.input)
+
+    # Loading and scoring are timed separately, the workers load their models in parallel
+    # and nothing is read before every model is loaded
+    rows = 0
+    start = time.perf_counter()
+    with open_input(options.input) as source, open_output(options.output) as target:
+        chunk_iterator = chunks(read_sentences(source, fmt, options.column), options.chunk_size)
+        pool = None
+        if options.jobs > 1:
+            # Checked before forking, the workers would otherwise fail one by one
+            check_classifier(classifier)
+            try:
+                pool = start_pool(classifier, options.jobs, options.load_timeout)
+            except RuntimeError as e:
+                print(e, file=sys.stderr)
+                exit(1)
+            results = predict_parallel(pool, chunk_iterator, options.jobs)
+        else:
+            clf = getClassifier(classifier)
+            results = ((chunk, clf.predict(chunk)) for chunk in chunk_iterator)
+        loaded = time.perf_counter()
+
+        try:
+            for chunk, labels in results:
+                write_results(target, fmt, chunk, labels)
+                rows += len(chunk)
+        finally:
+            if pool is not None:
+                pool.terminate()
+    print_summary(rows, loaded - start, time.perf_counter() - loaded)
+
+# Backends are only imported and loaded when requested
+registry = {
+    "-svm": lambda: joblib.load(model_path + "/svm_pipeline.joblib"),
+    # "-nb": lambda: joblib.load(model_path + "/nb_pipeline.joblib"),
+    "-rf": lambda: joblib.load(model_path + "/rf_pipeline.joblib"),
+    "-lstm": lambda: importlib.import_module('lstm'),
+}
+
+# Files every backend loads, one of each group has to exist
+artifacts = {
+    "-svm": [["/svm_pipeline.joblib"]],
+    "-rf": [["/rf_pipeline.joblib"]],
+    "-lstm": [["/LSTM_weights.npz", "/LSTM_model.h5"], ["/tokenizer.json", "/tokenizer.pickle"]],
+}
+
+def check_classifier(clf):
+    '''
+    Exits with a message when clf is not a known classifier or its model files are missing
+    '''
     # Check if wrong input
-    if clf not in switcher:
+    if clf not in registry:
         print("Please use one of the classifier arguments:")
-        print("-svm")
-        print("-nb")
-        print("-rf")
-        print("-lstm")
+        for name in registry:
+            print(name)
         exit(1)
 
-    return switcher.get(clf)
+    for group in artifacts.get(clf, []):
+        if not any(os.path.isfile(model_path + filename) for filename in group):
+            print("Missing model file for {}: {}".format(clf, " or ".join(model_path + f for f in group)),
+                  file=sys.stderr)
+            exit(1)
+
+# Get classifier from supplied argument
+def getClassifier(clf):
+    check_classifier(clf)
+
+    load_start = time.perf_counter()
+    model = registry[clf]()
+    load_end = time.perf_counter()
+    print("Loaded {} in {} ms ({} ms since start)".format(
+        clf, round((load_end - load_start) * 1000, 3), round((load_end - startup_time) * 1000, 3)), file=sys.stderr)
+
+    return model
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,4 +1,4 @@
-import argparse, joblib, csv, sys, os
+import joblib, os
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
@@ -6,13 +6,12 @@ import matplotlib.patches as mpatches
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.pipeline import Pipeline
 from sklearn.decomposition import PCA
-from sklearn.decomposition import LatentDirichletAllocation
-from sklearn.manifold import TSNE
 from sklearn.metrics import confusion_matrix
-from sklearn.metrics import accuracy_score
 from sklearn.model_selection import train_test_split
 from sklearn.feature_extraction.text import TfidfVectorizer
 
+import labeled_data
+
 '''
 SVM classifier
 '''
@@ -43,26 +42,8 @@ def train_model(X_train, y_train):
     return svm_pipeline
 
 # Loading data
-def load_training_data(encoding='utf8'):
-    csv_reader = csv.reader(open(data_path, encoding=encoding))
-    corpus = []
-    labels = []
-
-    # Saving comments and likes in seperate lists
-    for row in csv_reader:
-        corpus.append(row[1])
-        # labels.append(int(row[0]))
-
-        if int(row[0]) < 0:
-            labels.append(-1)
-        elif int(row[0]) > 0:
-            labels.append(1)
-        else:
-            labels.append(0)            
-
-    labels = np.asarray(labels)
-
-    return corpus, labels
+def load_training_data():
+    return labeled_data.load_labeled(data_path, 'three_class')
 
 # Get list of stop words
 def load_stop_words():
@@ -129,16 +110,17 @@ def plot_confusion_matrix(cm, title='rf Confusion matrix', cmap=plt.get_cmap('Bl
 # <---------------------->
 # <- SCRIPT STARTS HERE ->
 # <---------------------->
-X, y = load_training_data()
-X_train, X_test, y_train, y_test = train_test_split(X, y) 
+if __name__ == '__main__':
+    X, y = load_training_data()
+    X_train, X_test, y_train, y_test = train_test_split(X, y)
 
-pipeline = train_model(X_train, y_train)
+    pipeline = train_model(X_train, y_train)
 
-cm = confusion_matrix(y_test, pipeline.predict(X_test))
-svr_score = get_svr_score(pipeline, X_test, y_test)
+    cm = confusion_matrix(y_test, pipeline.predict(X_test))
+    svr_score = get_svr_score(pipeline, X_test, y_test)
 
-print(cm)
-print('Accuracy: {}'.format(round(svr_score*100, 4)))
+    print(cm)
+    print('Accuracy: {}'.format(round(svr_score*100, 4)))
 
-# visualise_data(pipeline, X, y)
+    # visualise_data(pipeline, X, y)
 
@@ -1,20 +1,17 @@
-import argparse, joblib, csv, sys, os
+import argparse, joblib, os
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
-import pandas as pd
 
-from mpl_toolkits.mplot3d import Axes3D
-
-from yellowbrick.text import TSNEVisualizer
-
-from sklearn.cluster import KMeans
-from sklearn.svm import SVC, LinearSVC
+from sklearn.svm import LinearSVC
 from sklearn.pipeline import Pipeline
 from sklearn.decomposition import PCA
 from sklearn.metrics import confusion_matrix, f1_score
-from sklearn.model_selection import train_test_split, StratifiedKFold, GridSearchCV, learning_curve
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.model_selection import train_test_split, StratifiedKFold, learning_curve
+
+import labeled_data
+from featurizers import char_wb_featurizer
+from cached_search import CachedGridSearch, HalvingSearch
 
 '''
 SVM classifier
@@ -26,37 +23,44 @@ dir_path = os.path.dirname(os.path.realpath(__file__))
 data_path = dir_path + '/TrainingData/training_data_all.csv'
 test_data_path = dir_path + '/TrainingData/HypothesisData.csv'
 model_path = dir_path + '/Model/svm_pipeline.joblib'
+feature_cache_path = dir_path + '/Model/cache/features'
 stop_words_path = dir_path + '/TrainingData/stop_words_da.txt'
 
 # Rest
 
 # Train our SVM model
-def train_model(X, y, auto_split=False):
+# feature_cache_dir keeps the featurized folds on disk, so re-runs over the same data skip featurizing
+# search is 'grid' to fit every candidate fully, or 'halving' to drop weak candidates on small data fractions
+# filepath is where the best pipeline is saved, None to only return it
+# random_state seeds the splits, the cached folds are keyed by their indices and only hit with the same seed
+def train_model(X, y, auto_split=False, featurizer='tfidf', hash_bits=18, feature_cache_dir=None, search='grid',
+                filepath=model_path, random_state=0):
     # Create data processing and classifier pipeline
+    # The featurizer step keeps the name 'tfidf' in hashing mode, so grid parameters and named_steps still apply
     svm_pipeline = Pipeline([
-        ('tfidf', TfidfVectorizer(ngram_range=(1,10),
-                                  analyzer='char_wb',
-                                  stop_words=load_stop_words(),
-                                  use_idf=False,
-                                  smooth_idf=True,
-                                  sublinear_tf=False
-        )),
+        ('tfidf', char_wb_featurizer(featurizer, hash_bits, load_stop_words())),
         ('svm', LinearSVC(C=3))
     ])
 
     # Parameters for Grid Search. This is used for finding the best values for processing and classifying
     parameters = {#'tfidf__stop_words':(load_stop_words(), None),
-                #   'tfidf__smooth_idf':(True, False),
-                #   'tfidf__sublinear_tf':(True, False),
+                  'svm__C':(0.3, 1, 3, 10),
     }
+    if featurizer == 'tfidf':
+        # Only the idf flags may differ between the fused multisvm heads, see fused_linear.head_params
+        # smooth_idf does nothing without idf, so it is only searched together with use_idf
+        parameters = [dict(parameters, tfidf__use_idf=(True,), tfidf__smooth_idf=(True, False)),
+                      dict(parameters, tfidf__use_idf=(False,))]
+    Search = HalvingSearch if search == 'halving' else CachedGridSearch
 
     out = open('svm_f1score.txt', 'w+')
     
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.1)
-    skf = StratifiedKFold(4, True)
+    skf = StratifiedKFold(4, shuffle=True, random_state=random_state)
     if auto_split is True:
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.1)
-        clf = GridSearchCV(svm_pipeline, parameters, cv=skf.split(X_train, y_train), verbose=2, return_train_score=True, n_jobs=-1)
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.1, random_state=random_state)
+        # Every fold is featurized once and shared by all candidates
+        clf = Search(svm_pipeline, parameters, cv=skf.split(X_train, y_train), cache_dir=feature_cache_dir,
+                     n_jobs=-1)
         clf.fit(X_train, y_train)
         clf = clf.best_estimator_
 
@@ -66,10 +70,10 @@ def train_model(X, y, auto_split=False):
 
         y_pred = clf.predict(X_test)
         f_score = f1_score(y_true=y_test, y_pred=y_pred, average='weighted')
-        score = clf.score(X_test, y_test)
-        out.write('{}, {}\n'.format(score, f_score))
+        svm_score = clf.score(X_test, y_test)
+        out.write('{}, {}\n'.format(svm_score, f_score))
     else:
-        clf = GridSearchCV(svm_pipeline, parameters, cv=skf.split(X, y), verbose=2, return_train_score=True, n_jobs=-1)
+        clf = Search(svm_pipeline, parameters, cv=skf.split(X, y), cache_dir=feature_cache_dir, n_jobs=-1)
         X_test, y_test = load_test_dataset(squish_classes=True)
         clf.fit(X, y)
         clf = clf.best_estimator_
@@ -86,74 +90,22 @@ def train_model(X, y, auto_split=False):
     print('SVM Accuracy: {}'.format(round(svm_score*100, 4)))
     print('SVM F1 Score: {}'.format(round(f_score*100, 4)))
 
-    joblib.dump(clf, model_path)
+    if filepath is not None:
+        joblib.dump(clf, filepath)
     return clf
 
-def load_dataset(encoding='utf8', squish_classes=True):
-    '''
-    Loads training data and splits it into test and train sets
-    Parameters
-    -----------
-    encoding: The encoding of the file loaded. Default is UTF-8
-    
-    Returns
-    -------
-    X: The sentences,
-    y: The labels
-    '''
-    csv_reader = csv.reader(open(data_path, encoding=encoding))
-    X, y = [], []
-
-    # Saving comments and likes in seperate lists
-    for row in csv_reader:
-        X.append(row[1])
-        if squish_classes:
-            if int(row[0]) < 0:
-                y.append(-1)
-            elif int(row[0]) > 0:
-                y.append(1)
-            else:
-                y.append(0)           
-        else:
-            y.append(row[0])        
-
-    y = np.asarray(y)
-    X = np.asarray(X)
-
-    return X, y
-
-def load_test_dataset(encoding='utf-8-sig', squish_classes=True):
+def load_dataset(squish_classes=True):
     '''
-    Loads training data and splits it into test and train sets
-    Parameters
-    -----------
-    encoding: The encoding of the file loaded. Default is UTF-8
-    
+    Loads the training data, see labeled_data.load_labeled
     Returns
     -------
     X: The sentences,
-    y: The labels
+    y: The labels, squished to -1, 0 and 1 unless squish_classes is False
     '''
-    csv_reader = csv.reader(open(test_data_path, encoding=encoding))
-    X, y = [], []
-
-    # Saving comments and likes in seperate lists
-    for row in csv_reader:
-        X.append(row[1])
-        if squish_classes:
-            if int(row[0]) < 0:
-                y.append(-1)
-            elif int(row[0]) > 0:
-                y.append(1)
-            else:
-                y.append(0)           
-        else:
-            y.append(row[0])
+    return labeled_data.load_labeled(data_path, 'three_class' if squish_classes else 'raw')
 
-    y = np.asarray(y)
-    X = np.asarray(X)
-
-    return X, y
+def load_test_dataset(squish_classes=True):
+    return labeled_data.load_labeled(test_data_path, 'three_class' if squish_classes else 'raw')
 
 
 # Get list of stop words
@@ -330,12 +282,23 @@ def plot_learning_curve(estimator, title, X, y, ylim=None, cv=None,
 # <- SCRIPT STARTS HERE ->
 # <---------------------->
 
-# Train model first time
-X, y = load_dataset(squish_classes=True)
-
-pipeline = train_model(X, y, auto_split=False)
-X_transformed = pipeline.named_steps['tfidf'].transform(X)
-
-# tsne = TSNEVisualizer()
-# tsne.fit(X_transformed, y)
-# tsne.poof()
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Trains the SVM pipeline')
+    parser.add_argument('--featurizer', choices=['tfidf', 'hashing'], default='tfidf')
+    parser.add_argument('--hash-bits', type=int, default=18, help='The hashing featurizer uses 2^bits buckets')
+    parser.add_argument('--feature-cache', action='store_true',
+                        help='Keep the featurized folds in Model/cache/features for later runs')
+    parser.add_argument('--search', choices=['grid', 'halving'], default='grid',
+                        help='An exhaustive grid search or successive halving over the parameters')
+    args = parser.parse_args()
+
+    # Train model first time
+    X, y = load_dataset(squish_classes=True)
+
+    pipeline = train_model(X, y, auto_split=False, featurizer=args.featurizer, hash_bits=args.hash_bits,
+                           feature_cache_dir=feature_cache_path if args.feature_cache else None, search=args.search)
+    X_transformed = pipeline.named_steps['tfidf'].transform(X)
+
+    # tsne = TSNEVisualizer()
+    # tsne.fit(X_transformed, y)
+    # tsne.poof()
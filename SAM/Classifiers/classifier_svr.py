@@ -1,19 +1,16 @@
-import argparse, joblib, csv, sys, os
+import joblib, os
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 
-from sklearn.svm import SVC
 from sklearn.svm import SVR
 from sklearn.pipeline import Pipeline
 from sklearn.decomposition import PCA
-from sklearn.decomposition import LatentDirichletAllocation
-from sklearn.manifold import TSNE
-from sklearn.metrics import confusion_matrix
-from sklearn.metrics import accuracy_score
 from sklearn.model_selection import train_test_split
 from sklearn.feature_extraction.text import TfidfVectorizer
 
+import labeled_data
+
 '''
 SVM regression classifier
 '''
@@ -48,26 +45,8 @@ def train_model(X_train, y_train):
     return svm_pipeline
 
 # Loading data
-def load_training_data(encoding='utf8'):
-    csv_reader = csv.reader(open(data_path, encoding=encoding))
-    corpus = []
-    labels = []
-
-    # Saving comments and likes in seperate lists
-    for row in csv_reader:
-        corpus.append(row[1])
-        # labels.append(int(row[0]))
-
-        if int(row[0]) < 0:
-            labels.append(-1)
-        elif int(row[0]) > 0:
-            labels.append(1)
-        else:
-            labels.append(0)           
-
-    labels = np.asarray(labels)
-
-    return corpus, labels
+def load_training_data():
+    return labeled_data.load_labeled(data_path, 'three_class')
 
 # Get list of stop words
 def load_stop_words():
@@ -134,14 +113,15 @@ def plot_confusion_matrix(cm, title='SVM Confusion matrix', cmap=plt.get_cmap('B
 # <---------------------->
 # <- SCRIPT STARTS HERE ->
 # <---------------------->
-X, y = load_training_data()
-X_train, X_test, y_train, y_test = train_test_split(X, y) 
+if __name__ == '__main__':
+    X, y = load_training_data()
+    X_train, X_test, y_train, y_test = train_test_split(X, y)
 
-pipeline = train_model(X_train, y_train)
-X_test = pipeline.named_steps['tfidf'].transform(X_test)
-svr_score = pipeline.named_steps['svm'].score(X_test, y_test)
+    pipeline = train_model(X_train, y_train)
+    X_test = pipeline.named_steps['tfidf'].transform(X_test)
+    svr_score = pipeline.named_steps['svm'].score(X_test, y_test)
 
-print('R^2 score: {}'.format(svr_score))
+    print('R^2 score: {}'.format(svr_score))
 
-# visualise_data(pipeline, X, y)
+    # visualise_data(pipeline, X, y)
 
@@ -0,0 +1,141 @@
+import argparse, contextlib, json, os, subprocess, sys
+import joblib
+
+from sklearn.metrics import accuracy_score, f1_score
+
+from fused_linear import FusedLinearModel
+from flat_model import save_flat
+from model_sources import fingerprint
+import classifier_svm_experimental, labeled_data, multisvm, quantization
+
+'''
+Post-training compaction of the linear SVM models.
+The heads of a backend are fused, every feature whose weight is at most the threshold in all
+heads is dropped and the result is saved as a single, much smaller artifact. With --flat the artifact
+is a memory mappable directory instead of a pickle, see flat_model. The artifact records the
+heads it was built from, and multisvm ignores it once those are retrained. Eg:
+python compact_model.py multisvm --threshold 0.001
+python compact_model.py multisvm --threshold 0.001 --flat
+
+With --precision the weights are also stored as float16 or int8. The quantized artifact is
+refused, and nothing is written, if the weighted F1 on the held-out set drops by more than
+--max-f1-drop. Eg:
+python compact_model.py multisvm --threshold 0.001 --flat --precision int8 --max-f1-drop 0.005
+'''
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+model_dir = dir_path + '/Model/'
+eval_paths = [dir_path + '/TrainingData/HypothesisData.csv', dir_path + '/TrainingData/test_data.csv']
+# The held-out set guarding quantized artifacts. The heads are trained on training_data_all.csv,
+# which contains all of test_data.csv, HypothesisData.csv shares no sentence with it
+gate_path = dir_path + '/TrainingData/HypothesisData.csv'
+
+# Artifacts, how the heads' labels become one label and where the compact and flat artifacts go
+backends = {
+    'multisvm': (multisvm.head_paths,
+                 multisvm.combine, multisvm.compact_path, multisvm.flat_path),
+    'svm': (lambda: [model_dir + 'svm_pipeline.joblib'],
+            lambda sentences, labels: labels, model_dir + 'svm_compact.joblib', model_dir + 'svm_flat'),
+    'experimental': (lambda: [model_dir + 'svm_pos_pipeline.joblib', model_dir + 'svm_neg_pipeline.joblib'],
+                     classifier_svm_experimental.combine,
+                     model_dir + 'experimental_compact.joblib', model_dir + 'experimental_flat'),
+}
+
+def score(model, combine, path):
+    X, y = labeled_data.load_labeled(path)
+    # multisvm reports conflicting heads on stdout, keep the report clean
+    with contextlib.redirect_stdout(sys.stderr):
+        y_pred = combine(X, *model.predict(X))
+    return {'accuracy': accuracy_score(y, y_pred), 'f1': f1_score(y, y_pred, average='weighted')}
+
+def artifact_size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
+def measure_load(paths, flat=False):
+    '''
+    Loads the artifacts in a fresh interpreter, so the numbers are not skewed by this process.
+    Flat artifacts are memory mapped, their pages only count once they are touched.
+    Returns
+    -------
+    seconds: The time loading took,
+    rss_mb: The growth of the resident set size in MB, None where /proc is not available
+    '''
+    code = ('import json, sys, time, joblib\n'
+            'sys.path.insert(0, {dir!r})\n'
+            'def rss():\n'
+            '    # Current resident set size, the peak is inherited from the parent process on Linux\n'
+            '    try:\n'
+            '        with open("/proc/self/status") as status:\n'
+            '            return int(status.read().split("VmRSS:")[1].split()[0]) / 1024\n'
+            '    except (OSError, IndexError):\n'
+            '        return None\n'
+            '# Both loaders import sklearn, keep that out of the numbers\n'
+            'from flat_model import load_flat\n'
+            'before = rss()\n'
+            'start = time.perf_counter()\n'
+            'models = [{load}(p) for p in {paths!r}]\n'
+            'seconds = time.perf_counter() - start\n'
+            'after = rss()\n'
+            'print(json.dumps({{"seconds": seconds, "rss_mb": after - before if after is not None else None}}))'
+            ).format(dir=dir_path, paths=paths, load='load_flat' if flat else 'joblib.load')
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return json.loads(output.decode('utf-8').splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Drops near-zero features from the linear SVM models')
+    parser.add_argument('backend', choices=sorted(backends))
+    parser.add_argument('--threshold', type=float, default=0.0,
+                        help='Features whose absolute weight is at most this in every head are dropped')
+    parser.add_argument('--flat', action='store_true', help='Export a memory mappable directory instead of a pickle')
+    parser.add_argument('--precision', choices=quantization.precisions, help='Store the weights in reduced precision')
+    parser.add_argument('--max-f1-drop', type=float, default=0.01,
+                        help='Largest weighted F1 drop on the held-out set a quantized model may have')
+    parser.add_argument('--output', help='Where to save the compact model')
+    args = parser.parse_args()
+
+    artifacts, combine, output, flat_output = backends[args.backend]
+    artifacts = artifacts()
+    output = args.output or (flat_output if args.flat else output)
+
+    fused = FusedLinearModel.from_pipelines([joblib.load(a) for a in artifacts])
+    compact = fused.compact(args.threshold)
+    if args.precision:
+        compact = compact.quantize(args.precision)
+
+    report = {'backend': args.backend, 'threshold': args.threshold, 'flat': args.flat,
+              'precision': args.precision, 'output': output,
+              'features': {'original': fused.n_features, 'compact': compact.n_features},
+              'scores': {}}
+
+    for path in sorted(set(eval_paths + [gate_path])):
+        original, smaller = score(fused, combine, path), score(compact, combine, path)
+        report['scores'][os.path.basename(path)] = {
+            'original': original, 'compact': smaller,
+            'delta': {k: smaller[k] - original[k] for k in original}}
+
+    if args.precision:
+        f1_drop = -report['scores'][os.path.basename(gate_path)]['delta']['f1']
+        report['accepted'] = f1_drop <= args.max_f1_drop
+        if not report['accepted']:
+            print(json.dumps(report, indent=2))
+            print('Refusing the {} model, F1 dropped by {} (at most {} allowed)'.format(
+                args.precision, round(f1_drop, 5), args.max_f1_drop), file=sys.stderr)
+            exit(1)
+
+    # Loaders skip the export once the artifacts are retrained, see model_sources.is_stale
+    compact.sources = fingerprint(artifacts, model_dir)
+    if args.flat:
+        save_flat(compact, output)
+    else:
+        joblib.dump(compact, output)
+
+    report['size_mb'] = {'original': sum(os.path.getsize(a) for a in artifacts) / 2**20,
+                         'compact': artifact_size(output) / 2**20}
+    report['load'] = {'original': measure_load(artifacts), 'compact': measure_load([output], args.flat)}
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
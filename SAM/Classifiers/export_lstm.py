@@ -0,0 +1,96 @@
+import argparse, json, os, sys
+import numpy as np
+import keras as K
+
+from sklearn.metrics import accuracy_score, f1_score
+
+import labeled_data, quantization
+from model_sources import fingerprint
+from fast_tokenizer import FastTokenizer
+from lstm_numpy import NumpyLSTM
+
+'''
+Exports the weights of LSTM_model.h5 to an .npz file for the NumPy inference engine in lstm_numpy.
+The weights can be stored as float32, float16 or int8, together with the fingerprints of the Keras
+model and tokenizer they belong to. The engine is scored against Keras on the
+held-out set; the export is refused, and nothing is written, if a float32 export differs from Keras
+by more than --tolerance or a reduced precision one drops weighted F1 by more than --max-f1-drop.
+lstm.py uses the exported weights instead of Keras when they are present and were exported from
+the current model and tokenizer. Eg:
+python export_lstm.py
+python export_lstm.py --precision int8 --max-f1-drop 0.01
+'''
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+model_dir = dir_path + '/Model'
+model_path = dir_path + '/Model/LSTM_model.h5'
+tokenizer_path = dir_path + '/Model/tokenizer.pickle'
+weights_path = dir_path + '/Model/LSTM_weights.npz'
+gate_path = dir_path + '/TrainingData/test_data.csv'
+
+max_text_length = 20
+
+# Keras weight order of the Embedding -> LSTM -> Dense model
+weight_names = ['embedding', 'lstm_kernel', 'lstm_recurrent_kernel', 'lstm_bias', 'dense_kernel', 'dense_bias']
+# Embedding rows are looked up one at a time, so every row gets a scale. The other matrices
+# are multiplied from the left, so every output column gets one. Biases stay float32.
+scale_axes = {'embedding': 1, 'lstm_kernel': 0, 'lstm_recurrent_kernel': 0, 'dense_kernel': 0}
+
+def layer_config(model):
+    embedding, lstm, dense = model.layers
+    return {'mask_zero': embedding.get_config()['mask_zero'],
+            'activation': lstm.get_config()['activation'],
+            'recurrent_activation': lstm.get_config()['recurrent_activation'],
+            'dense_activation': dense.get_config()['activation']}
+
+def score(probabilities, y):
+    y_pred = (probabilities > 0.5).astype(int)[:, 0]
+    return {'accuracy': accuracy_score(y, y_pred), 'f1': f1_score(y, y_pred, average='weighted')}
+
+def main():
+    parser = argparse.ArgumentParser(description='Exports the LSTM weights for the NumPy inference engine')
+    parser.add_argument('--precision', choices=('float32',) + quantization.precisions, default='float32')
+    parser.add_argument('--tolerance', type=float, default=1e-4,
+                        help='Largest difference to the Keras probabilities a float32 export may have')
+    parser.add_argument('--max-f1-drop', type=float, default=0.01,
+                        help='Largest weighted F1 drop on the held-out set a reduced precision export may have')
+    parser.add_argument('--output', default=weights_path)
+    args = parser.parse_args()
+
+    model = K.models.load_model(model_path)
+    tokenizer = FastTokenizer.from_pickle(tokenizer_path)
+    sentences, y = labeled_data.load_labeled(gate_path)
+    X = tokenizer.encode(sentences, max_text_length)
+
+    # Written to a temporary file first, so a refused export never replaces an accepted one
+    temporary = args.output + '.tmp.npz'
+    # The word indices of the weights are those of the tokenizer, so both are recorded, see lstm.py
+    config = dict(layer_config(model), sources=fingerprint([model_path, tokenizer_path], model_dir))
+    quantization.save_quantized(temporary, dict(zip(weight_names, model.get_weights())), scale_axes,
+                                args.precision, config)
+
+    expected, actual = model.predict(X), NumpyLSTM.load(temporary).predict(X)
+    difference = float(np.abs(expected - actual).max())
+    original, exported = score(expected, y), score(actual, y)
+    f1_drop = original['f1'] - exported['f1']
+
+    report = {'precision': args.precision, 'output': args.output,
+              'size_mb': {'original': os.path.getsize(model_path) / 2**20,
+                          'exported': os.path.getsize(temporary) / 2**20},
+              'max_probability_difference': difference,
+              'scores': {'keras': original, 'numpy': exported}}
+    if args.precision == 'float32':
+        report['accepted'] = difference <= args.tolerance
+    else:
+        report['accepted'] = f1_drop <= args.max_f1_drop
+    print(json.dumps(report, indent=2))
+
+    if not report['accepted']:
+        os.remove(temporary)
+        print('Refusing the {} export, probabilities differ by {} and F1 dropped by {}'.format(
+            args.precision, round(difference, 6), round(f1_drop, 5)), file=sys.stderr)
+        exit(1)
+    os.replace(temporary, args.output)
+
+if __name__ == '__main__':
+    main()
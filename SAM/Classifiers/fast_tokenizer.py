@@ -0,0 +1,114 @@
+import json, os, pickle
+import numpy as np
+
+'''
+Inference tokenizer for the LSTM, built from a compact vocabulary exported from the Keras Tokenizer.
+Only the num_words - 1 words Keras actually uses are kept, in one dict, and sentences are
+encoded straight into a preallocated pre-padded int32 array. Filtering, lowercasing and
+splitting follow keras_preprocessing's text_to_word_sequence exactly. Export with:
+python fast_tokenizer.py
+'''
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+tokenizer_path = dir_path + '/Model/tokenizer.pickle'
+compact_path = dir_path + '/Model/tokenizer.json'
+
+class KerasTokenizerState:
+    '''
+    Stands in for keras_preprocessing.text.Tokenizer while unpickling, so exporting needs no Keras
+    '''
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+class TokenizerUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if name == 'Tokenizer' and module.startswith(('keras_preprocessing', 'keras')):
+            return KerasTokenizerState
+        return super().find_class(module, name)
+
+class FastTokenizer:
+    '''
+    Parameters
+    -----------
+    words: The vocabulary in index order, words[i] has index i + 1,
+    filters: Characters replaced by the split character,
+    lower: Whether sentences are lowercased first,
+    split: The word separator,
+    oov_index: Index of words not in the vocabulary, None to drop them
+    '''
+    def __init__(self, words, filters, lower=True, split=' ', oov_index=None):
+        self.words = list(words)
+        self.filters = filters
+        self.lower = lower
+        self.split = split
+        self.oov_index = oov_index
+        self.word_index = {word: i + 1 for i, word in enumerate(self.words)}
+        self.translate_map = str.maketrans({c: split for c in filters})
+
+    @classmethod
+    def from_keras(cls, tokenizer):
+        '''
+        Builds the compact tokenizer from a fitted (or unpickled) Keras Tokenizer
+        '''
+        if tokenizer.char_level:
+            raise ValueError('Character level tokenizers are not supported')
+        # Keras ignores indices from num_words on
+        limit = tokenizer.num_words or len(tokenizer.word_index) + 1
+        words = [None] * (min(limit, len(tokenizer.word_index) + 1) - 1)
+        for word, index in tokenizer.word_index.items():
+            if index < limit:
+                words[index - 1] = word
+        oov_index = tokenizer.word_index.get(tokenizer.oov_token) if tokenizer.oov_token is not None else None
+        if oov_index is not None and oov_index >= limit:
+            oov_index = None
+        return cls(words, tokenizer.filters, tokenizer.lower, tokenizer.split, oov_index)
+
+    @classmethod
+    def from_pickle(cls, filepath):
+        with open(filepath, 'rb') as handle:
+            return cls.from_keras(TokenizerUnpickler(handle).load())
+
+    @classmethod
+    def load(cls, filepath):
+        with open(filepath, encoding='utf-8') as f:
+            return cls(**json.load(f))
+
+    def save(self, filepath):
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump({'words': self.words, 'filters': self.filters, 'lower': self.lower,
+                       'split': self.split, 'oov_index': self.oov_index}, f, ensure_ascii=False)
+
+    def tokenize(self, text):
+        if self.lower:
+            text = text.lower()
+        return [word for word in text.translate(self.translate_map).split(self.split) if word]
+
+    def sequence(self, text):
+        get, oov_index = self.word_index.get, self.oov_index
+        if oov_index is None:
+            return [index for index in map(get, self.tokenize(text)) if index is not None]
+        return [get(word, oov_index) for word in self.tokenize(text)]
+
+    def texts_to_sequences(self, texts):
+        return [self.sequence(text) for text in texts]
+
+    def encode(self, sentences, maxlen=20):
+        '''
+        Returns
+        -------
+        X: int32 array of shape (n_sentences, maxlen), padded and truncated at the front like
+           Keras' pad_sequences(padding='pre', truncating='pre')
+        '''
+        X = np.zeros((len(sentences), maxlen), dtype=np.int32)
+        for row, sentence in enumerate(sentences):
+            sequence = self.sequence(sentence)[-maxlen:]
+            if sequence:
+                X[row, maxlen - len(sequence):] = sequence
+        return X
+
+if __name__ == '__main__':
+    tokenizer = FastTokenizer.from_pickle(tokenizer_path)
+    tokenizer.save(compact_path)
+    print('Saved {} words to {} ({} KB, the pickle is {} KB)'.format(
+        len(tokenizer.words), compact_path, os.path.getsize(compact_path) // 1024,
+        os.path.getsize(tokenizer_path) // 1024))
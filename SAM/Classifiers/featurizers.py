@@ -0,0 +1,119 @@
+import numpy as np
+import scipy.sparse as sp
+
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer, HashingVectorizer
+
+'''
+Drop-in replacements for the char_wb vectorizers that memoize the features of every word.
+Social media text repeats the same words over and over, so instead of generating up to
+55 padded n-grams per word and looking each one up in the vocabulary, the vocabulary
+indices of a word are computed once and the count matrix is built from the cached arrays.
+The resulting matrices are identical to the ones from the stock vectorizers.
+
+Like every module in Classifiers, this one is imported by its bare name, so pickled pipelines
+refer to featurizers.CachedCharTfidfVectorizer. Unpickling them needs the Classifiers folder on
+sys.path, which is why PythonServer and multisvm add it, and renaming or moving this module
+breaks every trained model until it is retrained.
+'''
+
+class CachedCharNgramsMixin:
+    # Most distinct words kept in the cache, the oldest entries are evicted first
+    cache_size = 200000
+
+    def _count_vocab(self, raw_documents, fixed_vocab):
+        if self.analyzer != 'char_wb':
+            return super()._count_vocab(raw_documents, fixed_vocab)
+
+        if fixed_vocab:
+            vocabulary = self.vocabulary_
+            # The cached indices are only valid for the vocabulary they were looked up in
+            if self.__dict__.get('_cache_vocabulary') is not vocabulary:
+                self._word_cache = {}
+                self._cache_vocabulary = vocabulary
+            cache = self._word_cache
+        else:
+            # Indices assigned during fit are remapped afterwards, so that cache is thrown away
+            vocabulary = {}
+            cache = {}
+
+        preprocess = self.build_preprocessor()
+        words_of = lambda doc: self._white_spaces.sub(' ', preprocess(self.decode(doc))).split()
+
+        columns, lengths = [], []
+        for doc in raw_documents:
+            length = 0
+            for word in words_of(doc):
+                indices = cache.get(word)
+                if indices is None:
+                    indices = self._word_indices(word, vocabulary, fixed_vocab)
+                    if len(cache) >= self.cache_size:
+                        cache.pop(next(iter(cache)))
+                    cache[word] = indices
+                columns.append(indices)
+                length += len(indices)
+            lengths.append(length)
+
+        if not fixed_vocab and not vocabulary:
+            raise ValueError("empty vocabulary; perhaps the documents only contain stop words")
+
+        columns = np.concatenate(columns) if columns else np.zeros(0, dtype=np.intp)
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+
+        # Duplicate (row, column) pairs are summed, which gives the n-gram counts
+        X = sp.csr_matrix((np.ones(len(columns), dtype=self.dtype), (rows, columns)),
+                          shape=(len(lengths), len(vocabulary)), dtype=self.dtype)
+        X.sum_duplicates()
+        X.sort_indices()
+        return vocabulary, X
+
+    def _word_indices(self, word, vocabulary, fixed_vocab):
+        if fixed_vocab and hasattr(vocabulary, 'indices'):
+            # Memory mapped vocabularies look up all n-grams of a word at once, see flat_model
+            return vocabulary.indices(self._char_wb_ngrams(word))
+        indices = []
+        for ngram in self._char_wb_ngrams(word):
+            if fixed_vocab:
+                index = vocabulary.get(ngram)
+                if index is not None:
+                    indices.append(index)
+            else:
+                indices.append(vocabulary.setdefault(ngram, len(vocabulary)))
+        return np.array(indices, dtype=np.intp)
+
+    def __getstate__(self):
+        # The cache is rebuilt on demand, there is no reason to pickle it
+        state = super().__getstate__()
+        state.pop('_word_cache', None)
+        state.pop('_cache_vocabulary', None)
+        return state
+
+class CachedCharCountVectorizer(CachedCharNgramsMixin, CountVectorizer):
+    pass
+
+class CachedCharTfidfVectorizer(CachedCharNgramsMixin, TfidfVectorizer):
+    pass
+
+def char_wb_featurizer(featurizer='tfidf', hash_bits=18, stop_words=None):
+    '''
+    The char_wb 1-10 gram featurizer of the SVM classifiers
+    Parameters
+    -----------
+    featurizer: 'tfidf' for the vocabulary based vectorizer, 'hashing' for the stateless hashing trick,
+    hash_bits: The hashing vectorizer uses 2**hash_bits signed buckets,
+    stop_words: Passed on to the tf-idf vectorizer
+    '''
+    if featurizer == 'hashing':
+        # Same n-grams and l2 normalized term frequencies as use_idf=False, but no vocabulary to store
+        return HashingVectorizer(ngram_range=(1,10),
+                                 analyzer='char_wb',
+                                 n_features=2**hash_bits,
+                                 alternate_sign=True,
+                                 norm='l2')
+    if featurizer == 'tfidf':
+        return CachedCharTfidfVectorizer(ngram_range=(1,10),
+                                         analyzer='char_wb',
+                                         stop_words=stop_words,
+                                         use_idf=False,
+                                         smooth_idf=True,
+                                         sublinear_tf=False)
+    raise ValueError('Unknown featurizer: {}'.format(featurizer))
@@ -0,0 +1,202 @@
+import hashlib, json, os
+from collections.abc import Mapping
+
+import numpy as np
+
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from featurizers import CachedCharCountVectorizer
+from fused_linear import FusedLinearModel
+
+'''
+Flat, memory-mappable artifacts for FusedLinearModel.
+A model is a directory with the weights as .npy files, the vocabulary as one sorted UTF-8
+blob plus offsets and a hash table into it, and a small JSON manifest. Everything is opened with np.load(mmap_mode='r'),
+so nothing is unpickled at startup and every process serving the model shares the page cache
+copy of the files. The manifest also records the artifacts the model was built from, so loaders
+can tell when those were retrained after the export, see model_sources.is_stale. Eg:
+save_flat(model, 'Model/multisvm_flat')
+model = load_flat('Model/multisvm_flat')
+'''
+
+format_version = 1
+manifest_name = 'manifest.json'
+
+class FlatVocabulary(Mapping):
+    '''
+    Read-only term -> index mapping over a sorted vocabulary file.
+    Terms are found by searching a sorted table of their 64 bit hashes and checking the
+    stored UTF-8 bytes. The vectorizer caches the indices of every word, so only unseen
+    words are looked up.
+    Parameters
+    -----------
+    directory: The directory holding vocabulary.npy, offsets.npy, hashes.npy and hash_rows.npy,
+    mmap_mode: Passed on to np.load
+    '''
+    def __init__(self, directory, mmap_mode='r'):
+        self.directory = directory
+        self.mmap_mode = mmap_mode
+        self.blob = np.load(os.path.join(directory, 'vocabulary.npy'), mmap_mode=mmap_mode)
+        self.offsets = np.load(os.path.join(directory, 'offsets.npy'), mmap_mode=mmap_mode)
+        self.hashes = np.load(os.path.join(directory, 'hashes.npy'), mmap_mode=mmap_mode)
+        self.hash_rows = np.load(os.path.join(directory, 'hash_rows.npy'), mmap_mode=mmap_mode)
+        # Indexing memoryviews gives plain Python ints and bytes, much faster than numpy scalars
+        self._blob = memoryview(self.blob)
+        self._offsets = memoryview(self.offsets)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def term(self, index):
+        return self._blob[self._offsets[index]:self._offsets[index + 1]].tobytes().decode('utf-8')
+
+    def indices(self, terms):
+        '''
+        Returns
+        -------
+        indices: Array with the index of every known term, unknown terms are skipped
+        '''
+        keys = [term.encode('utf-8') for term in terms]
+        hashes = np.fromiter((term_hash(k) for k in keys), dtype=np.uint64, count=len(keys))
+        positions = np.searchsorted(self.hashes, hashes)
+        positions[positions == len(self.hashes)] = 0
+
+        found = []
+        if len(self.hashes):
+            candidates = self.hash_rows[positions]
+            for key, matched, row in zip(keys, self.hashes[positions] == hashes, candidates.tolist()):
+                # The bytes are compared as well, so a hash collision never maps to the wrong term
+                if matched and self._blob[self._offsets[row]:self._offsets[row + 1]] == key:
+                    found.append(row)
+        return np.array(found, dtype=np.intp)
+
+    def get(self, term, default=None):
+        found = self.indices([term])
+        return int(found[0]) if len(found) else default
+
+    def __getitem__(self, term):
+        index = self.get(term)
+        if index is None:
+            raise KeyError(term)
+        return index
+
+    def __contains__(self, term):
+        return self.get(term) is not None
+
+    def __iter__(self):
+        return (self.term(i) for i in range(len(self)))
+
+    def __reduce__(self):
+        # Memory maps can not be pickled, the copy opens the same files again
+        return (FlatVocabulary, (self.directory, self.mmap_mode))
+
+def term_hash(key):
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+def vectorizer_params(vectorizer):
+    params = {k: v for k, v in vectorizer.get_params().items() if k not in ('vocabulary', 'dtype')}
+    for name in ('preprocessor', 'tokenizer'):
+        if params.get(name) is not None:
+            raise ValueError('Vectorizers with a custom {} can not be exported'.format(name))
+    if params.get('stop_words') is not None and not isinstance(params['stop_words'], str):
+        params['stop_words'] = list(params['stop_words'])
+    return params
+
+def save_flat(model, directory):
+    '''
+    Exports a FusedLinearModel. The manifest is written last, so a half written
+    directory is never picked up by load_flat. The model's sources are recorded in it.
+    Parameters
+    -----------
+    model: The FusedLinearModel to export,
+    directory: Where to write the files, created if missing
+    '''
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, manifest_name)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    hashing = isinstance(model.vectorizer, HashingVectorizer)
+    arrays = {'coef': model.coef, 'intercept': model.intercept}
+    if model.norm_weights is not None:
+        arrays['norm_weights'] = model.norm_weights
+    # int8 weights carry their column scales
+    if model.coef_scale is not None:
+        arrays['coef_scale'] = model.coef_scale
+    if model.norm_scale is not None:
+        arrays['norm_scale'] = model.norm_scale
+
+    if not hashing:
+        vocabulary = model.vectorizer.get_params()['vocabulary']
+        terms = np.empty(len(vocabulary), dtype=object)
+        for term, index in vocabulary.items():
+            terms[index] = term
+        # Rows are stored in term order, so the row of a term is its position in the sorted file
+        order = np.argsort(terms, kind='stable')
+        encoded = [term.encode('utf-8') for term in terms[order]]
+
+        arrays['coef'] = model.coef[order]
+        arrays['norm_weights'] = model.norm_weights[order]
+        arrays['vocabulary'] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        arrays['offsets'] = np.concatenate([[0], np.cumsum([len(e) for e in encoded])]).astype(np.int64)
+
+        hashes = np.fromiter((term_hash(e) for e in encoded), dtype=np.uint64, count=len(encoded))
+        hash_order = np.argsort(hashes, kind='stable')
+        if len(hashes) > 1 and (np.diff(hashes[hash_order]) == 0).any():
+            raise ValueError('Two terms share a 64 bit hash, the vocabulary can not be exported')
+        arrays['hashes'] = hashes[hash_order]
+        arrays['hash_rows'] = hash_order.astype(np.int64)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, name + '.npy'), np.ascontiguousarray(array))
+
+    manifest = {
+        'format': format_version,
+        'vectorizer': 'hashing' if hashing else 'count',
+        'vectorizer_params': vectorizer_params(model.vectorizer),
+        'norm': model.norm,
+        'sublinear_tf': model.sublinear_tf,
+        'head_slices': [list(s) for s in model.head_slices],
+        'classes': [np.asarray(c).tolist() for c in model.classes],
+        'arrays': sorted(arrays),
+        'sources': model.sources,
+    }
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+def load_flat(directory, mmap_mode='r'):
+    '''
+    Opens a model written by save_flat
+    Parameters
+    -----------
+    directory: The exported model,
+    mmap_mode: Passed on to np.load, None reads the arrays into memory
+    Returns
+    -------
+    model: A FusedLinearModel whose arrays and vocabulary are memory maps
+    '''
+    with open(os.path.join(directory, manifest_name), encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest['format'] != format_version:
+        raise ValueError('Unsupported flat model format: {}'.format(manifest['format']))
+
+    arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+              for name in manifest['arrays'] if name not in ('vocabulary', 'offsets', 'hashes', 'hash_rows')}
+
+    params = manifest['vectorizer_params']
+    params['ngram_range'] = tuple(params['ngram_range'])
+    if manifest['vectorizer'] == 'hashing':
+        vectorizer = HashingVectorizer(**params)
+    else:
+        vocabulary = FlatVocabulary(directory, mmap_mode)
+        vectorizer = CachedCharCountVectorizer(vocabulary=vocabulary, dtype=np.float64, **params)
+        # Set directly, validating the vocabulary would copy it into a dict
+        vectorizer.vocabulary_ = vocabulary
+        vectorizer.fixed_vocabulary_ = True
+
+    classes = [np.array(c) for c in manifest['classes']]
+    head_slices = [tuple(s) for s in manifest['head_slices']]
+    return FusedLinearModel(vectorizer, arrays['coef'], arrays['intercept'], arrays.get('norm_weights'),
+                            classes, manifest['norm'], manifest['sublinear_tf'], head_slices,
+                            arrays.get('coef_scale'), arrays.get('norm_scale'), manifest.get('sources'))
@@ -0,0 +1,201 @@
+import numpy as np
+
+from sklearn.base import clone
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
+
+from featurizers import CachedCharCountVectorizer
+import quantization
+
+'''
+Several tf-idf + linear classifier pipelines fused into one model.
+The text is vectorized once and every head is evaluated in a single sparse matrix product.
+'''
+
+# Vectorizer parameters that may differ between heads, everything else must be shared
+head_params = ('vocabulary', 'use_idf', 'smooth_idf')
+
+class FusedLinearModel:
+    '''
+    Parameters
+    -----------
+    vectorizer: A CachedCharCountVectorizer over the union of the heads' vocabularies,
+                or the heads' HashingVectorizer, which normalizes the rows itself,
+    coef: Matrix of shape (n_features, n_columns) with the idf weights folded in,
+    intercept: Array of shape (n_columns,),
+    norm_weights: Matrix of shape (n_features, n_columns) used to compute every column's row norm,
+                  None if the rows are not normalized here,
+    classes: The classes of every head,
+    norm: The norm used by the original vectorizers, 'l2', 'l1' or None,
+    sublinear_tf: Whether term frequencies are replaced by 1 + log(tf),
+    head_slices: The (start, stop) columns of every head. Binary heads have one column and
+                 pick their second class above zero, multiclass heads pick the largest column.
+                 Defaults to one column per head,
+    coef_scale, norm_scale: Column scales of int8 coef and norm_weights, see quantize,
+    sources: Fingerprints of the artifacts the model was built from, see model_sources.fingerprint
+    '''
+    # Models pickled before quantization existed have full precision weights
+    coef_scale, norm_scale = None, None
+    # Models pickled before sources were recorded do not know what they were built from
+    sources = None
+
+    def __init__(self, vectorizer, coef, intercept, norm_weights, classes, norm='l2', sublinear_tf=False,
+                 head_slices=None, coef_scale=None, norm_scale=None, sources=None):
+        self.vectorizer = vectorizer
+        self.coef = coef
+        self.intercept = intercept
+        self.norm_weights = norm_weights
+        self.classes = classes
+        self.norm = norm
+        self.sublinear_tf = sublinear_tf
+        self.head_slices = head_slices or [(h, h + 1) for h in range(len(classes))]
+        self.coef_scale = coef_scale
+        self.norm_scale = norm_scale
+        self.sources = sources
+
+    @classmethod
+    def from_pipelines(cls, pipelines):
+        '''
+        Builds a fused model from fitted Pipeline([('tfidf', TfidfVectorizer), (..., LinearSVC)]) objects.
+        GridSearchCV objects are unwrapped to their best estimator.
+        '''
+        steps = [getattr(p, 'best_estimator_', p).steps for p in pipelines]
+        tfidfs = [s[0][1] for s in steps]
+        svms = [s[-1][1] for s in steps]
+
+        head_slices, start = [], 0
+        for svm in svms:
+            head_slices.append((start, start + svm.coef_.shape[0]))
+            start += svm.coef_.shape[0]
+
+        intercept = np.concatenate([svm.intercept_ for svm in svms])
+        classes = [svm.classes_ for svm in svms]
+
+        if any(isinstance(tfidf, HashingVectorizer) for tfidf in tfidfs):
+            return cls._from_hashing(tfidfs, svms, intercept, classes, head_slices)
+
+        shared = {k: v for k, v in tfidfs[0].get_params().items() if k not in head_params}
+        for tfidf in tfidfs[1:]:
+            params = {k: v for k, v in tfidf.get_params().items() if k not in head_params}
+            if params != shared:
+                raise ValueError('The pipelines do not share the same vectorizer settings')
+
+        # Union of all vocabularies, sorted like a fitted vectorizer's
+        terms = sorted(set().union(*(tfidf.vocabulary_ for tfidf in tfidfs)))
+        vocabulary = {term: i for i, term in enumerate(terms)}
+
+        coef = np.zeros((len(terms), start))
+        norm_weights = np.zeros((len(terms), start))
+        for (begin, end), tfidf, svm in zip(head_slices, tfidfs, svms):
+            head_terms = sorted(tfidf.vocabulary_, key=tfidf.vocabulary_.get)
+            columns = np.fromiter((vocabulary[t] for t in head_terms), dtype=np.int64, count=len(head_terms))
+            idf = tfidf.idf_ if tfidf.use_idf else np.ones(len(head_terms))
+            coef[columns, begin:end] = svm.coef_.T * idf[:, None]
+            norm_weights[columns, begin:end] = (idf ** 2 if shared['norm'] == 'l2' else idf)[:, None]
+
+        count_params = CountVectorizer().get_params()
+        vectorizer = CachedCharCountVectorizer(**{k: v for k, v in shared.items() if k in count_params})
+        vectorizer.set_params(vocabulary=vocabulary, dtype=np.float64)
+
+        return cls(vectorizer, coef, intercept, norm_weights, classes, shared['norm'], shared['sublinear_tf'],
+                   head_slices)
+
+    @classmethod
+    def _from_hashing(cls, vectorizers, svms, intercept, classes, head_slices):
+        # Hashed columns mean the same in every head, so the weights are simply stacked
+        params = vectorizers[0].get_params()
+        if not all(isinstance(v, HashingVectorizer) and v.get_params() == params for v in vectorizers):
+            raise ValueError('The pipelines do not share the same vectorizer settings')
+
+        coef = np.hstack([svm.coef_.T for svm in svms])
+        return cls(clone(vectorizers[0]), coef, intercept, None, classes, None, False, head_slices)
+
+    def compact(self, threshold=0.0):
+        '''
+        Drops every feature whose absolute weight is at most threshold in all heads.
+        The dropped features no longer count towards the row norms, so predictions can change slightly.
+        Returns
+        -------
+        model: A new FusedLinearModel with the smaller vocabulary
+        '''
+        if isinstance(self.vectorizer, HashingVectorizer):
+            raise ValueError('Hashed models have no vocabulary to compact')
+
+        keep = np.flatnonzero(np.abs(self.coef).max(axis=1) > threshold)
+
+        params = self.vectorizer.get_params()
+        terms = np.empty(len(params['vocabulary']), dtype=object)
+        for term, index in params['vocabulary'].items():
+            terms[index] = term
+
+        params['vocabulary'] = {term: i for i, term in enumerate(terms[keep])}
+        vectorizer = type(self.vectorizer)(**params)
+
+        return FusedLinearModel(vectorizer, self.coef[keep], self.intercept, self.norm_weights[keep],
+                                self.classes, self.norm, self.sublinear_tf, self.head_slices,
+                                self.coef_scale, self.norm_scale, self.sources)
+
+    def quantize(self, precision):
+        '''
+        Stores the weights in reduced precision, int8 weights get one scale per column
+        Parameters
+        -----------
+        precision: 'float16' or 'int8'
+        Returns
+        -------
+        model: A new FusedLinearModel evaluated directly on the reduced precision weights
+        '''
+        coef, coef_scale = quantization.quantize(
+            quantization.dequantize(self.coef, self.coef_scale, np.float64), precision, axis=0)
+        norm_weights, norm_scale = None, None
+        if self.norm_weights is not None:
+            norm_weights, norm_scale = quantization.quantize(
+                quantization.dequantize(self.norm_weights, self.norm_scale, np.float64), precision, axis=0)
+
+        return FusedLinearModel(self.vectorizer, coef, self.intercept, norm_weights, self.classes, self.norm,
+                                self.sublinear_tf, self.head_slices, coef_scale, norm_scale, self.sources)
+
+    @property
+    def n_features(self):
+        return self.coef.shape[0]
+
+    def transform(self, sentences):
+        counts = self.vectorizer.transform(sentences)
+        if self.sublinear_tf:
+            np.log(counts.data, counts.data)
+            counts.data += 1
+        return counts
+
+    def decision_function(self, sentences):
+        '''
+        Returns
+        -------
+        decisions: Matrix of shape (n_sentences, n_columns), the heads' decision_function side by side
+        '''
+        counts = self.transform(sentences)
+        decisions = quantization.sparse_dot(counts, self.coef, self.coef_scale)
+
+        if self.norm == 'l2':
+            norms = np.sqrt(quantization.sparse_dot(counts.multiply(counts), self.norm_weights, self.norm_scale))
+        elif self.norm == 'l1':
+            norms = quantization.sparse_dot(abs(counts), self.norm_weights, self.norm_scale)
+        else:
+            norms = np.ones_like(decisions)
+        # rows without any known feature stay zero, like the normalizer leaves them
+        norms[norms == 0] = 1
+
+        return decisions / norms + self.intercept
+
+    def predict(self, sentences):
+        '''
+        Returns
+        -------
+        labels: A list with an array of labels per head
+        '''
+        decisions = self.decision_function(sentences)
+        labels = []
+        for (start, stop), classes in zip(self.head_slices, self.classes):
+            if stop - start == 1:
+                labels.append(classes[(decisions[:, start] > 0).astype(int)])
+            else:
+                labels.append(classes[decisions[:, start:stop].argmax(axis=1)])
+        return labels
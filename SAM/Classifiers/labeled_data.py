@@ -0,0 +1,138 @@
+import csv, hashlib, json, os
+import numpy as np
+
+'''
+Loads the labeled (label, sentence) CSV files of TrainingData. The labels are squished by a label
+scheme with NumPy. Parsed files are cached as an int8 array of the raw labels, plus the UTF-8
+sentences in one bytes buffer with their offsets. The cache is keyed by the file's mtime and the
+hash of its content, so repeated runs skip parsing the CSV and touched or copied files are only
+hashed again.
+'''
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+default_cache_dir = dir_path + '/Model/cache/datasets'
+
+# three_class: -1, 0 and 1. binary: neutral sentences dropped, -1 and 1. raw: the labels as annotated
+label_schemes = ('three_class', 'binary', 'raw')
+
+def file_digest(filepath):
+    digest = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def parse_csv(filepath):
+    '''
+    Returns
+    -------
+    labels: int8 array of the raw labels,
+    offsets: int64 array where sentence i is text[offsets[i]:offsets[i + 1]],
+    text: The UTF-8 encoded sentences
+    '''
+    labels, sentences = [], []
+    with open(filepath, encoding='utf-8-sig', newline='') as data:
+        for row in csv.reader(data):
+            labels.append(row[0])
+            sentences.append(row[1].encode('utf-8'))
+
+    offsets = np.zeros(len(sentences) + 1, dtype=np.int64)
+    np.cumsum([len(sentence) for sentence in sentences], out=offsets[1:])
+    return np.asarray(labels, dtype=np.int64).astype(np.int8), offsets, b''.join(sentences)
+
+def write_entry(path, labels, offsets, text):
+    # Written to a temporary file first, so an interrupted run never leaves a partial entry
+    np.savez(path + '.tmp.npz', labels=labels, offsets=offsets, text=np.frombuffer(text, dtype=np.uint8))
+    os.replace(path + '.tmp.npz', path + '.npz')
+
+def read_entry(path):
+    with np.load(path + '.npz') as entry:
+        return entry['labels'], entry['offsets'], entry['text'].tobytes()
+
+def read_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'index.json')) as index:
+            return json.load(index)
+    except (OSError, ValueError):
+        return {}
+
+def write_index(cache_dir, index):
+    path = os.path.join(cache_dir, 'index.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(index, f)
+    os.replace(path + '.tmp', path)
+
+def cached_parse(filepath, cache_dir):
+    '''
+    Returns the parse_csv result of filepath, from the cache when the file is unchanged
+    '''
+    os.makedirs(cache_dir, exist_ok=True)
+    filepath = os.path.realpath(filepath)
+    stat = os.stat(filepath)
+    index = read_index(cache_dir)
+    known = index.get(filepath)
+
+    # An unchanged mtime and size is trusted, otherwise the content decides
+    if known and known['mtime_ns'] == stat.st_mtime_ns and known['size'] == stat.st_size:
+        digest = known['digest']
+    else:
+        digest = file_digest(filepath)
+    path = os.path.join(cache_dir, digest)
+
+    if os.path.isfile(path + '.npz'):
+        parsed = read_entry(path)
+    else:
+        parsed = parse_csv(filepath)
+        write_entry(path, *parsed)
+
+    if known != {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'digest': digest}:
+        index[filepath] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'digest': digest}
+        write_index(cache_dir, index)
+    return parsed
+
+def squish(labels, scheme='three_class'):
+    '''
+    Returns
+    -------
+    keep: Boolean mask of the sentences the scheme keeps,
+    y: Their labels
+    '''
+    labels = np.asarray(labels, dtype=np.int64)
+    if scheme == 'three_class':
+        return np.ones(len(labels), dtype=bool), np.sign(labels)
+    if scheme == 'binary':
+        keep = labels != 0
+        return keep, np.sign(labels[keep])
+    if scheme == 'raw':
+        return np.ones(len(labels), dtype=bool), labels
+    raise ValueError('Unknown label scheme: {}, use one of {}'.format(scheme, label_schemes))
+
+def iter_labeled(filepath, scheme='three_class', cache_dir=default_cache_dir):
+    '''
+    Lazily yields the (sentence, label) rows of filepath that the scheme keeps, only the
+    current sentence is decoded. The parameters are the same as load_labeled's
+    '''
+    labels, offsets, text = cached_parse(filepath, cache_dir) if cache_dir else parse_csv(filepath)
+    keep, y = squish(labels, scheme)
+    bounds = offsets.tolist()
+    for i, label in zip(np.flatnonzero(keep).tolist(), y.tolist()):
+        yield text[bounds[i]:bounds[i + 1]].decode('utf-8'), label
+
+def load_labeled(filepath, scheme='three_class', cache_dir=default_cache_dir):
+    '''
+    Parameters
+    -----------
+    filepath: CSV file of (label, sentence) rows, further columns are ignored,
+    scheme: One of label_schemes,
+    cache_dir: Where the parsed files are cached, None to always parse the CSV
+    Returns
+    -------
+    X: Object array of the sentences,
+    y: Their labels
+    '''
+    rows = list(iter_labeled(filepath, scheme, cache_dir))
+    # A str array would pad every sentence to the longest one
+    X = np.empty(len(rows), dtype=object)
+    X[:] = [sentence for sentence, _ in rows]
+    y = np.fromiter((label for _, label in rows), dtype=np.int64, count=len(rows))
+    return X, y
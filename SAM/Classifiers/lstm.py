@@ -1,39 +1,58 @@
-import pickle, os, sys
+import contextlib, os, sys
 
-stderr = sys.stderr
-sys.stderr = open(os.devnull, 'w')
-import keras as K
-sys.stderr = stderr
-
-#import keras as K
+import quantization
+from lstm_numpy import NumpyLSTM
+from fast_tokenizer import FastTokenizer
+from model_sources import is_stale
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
+model_dir       = dir_path + '/Model'
 model_path      = dir_path + '/Model/LSTM_model.h5'
 tokenizer_path  = dir_path + '/Model/tokenizer.pickle'
+# Written by fast_tokenizer.py, otherwise the vocabulary is taken from the pickle at startup
+compact_tokenizer_path = dir_path + '/Model/tokenizer.json'
+# Written by export_lstm.py, served by the NumPy engine instead of Keras unless it is stale, see weights_are_current
+weights_path    = dir_path + '/Model/LSTM_weights.npz'
 
 max_text_length = 20
 
 def load_model(filepath):
+    # Keras and TensorFlow are only imported without exported weights. Their import noise is
+    # hidden, stderr is restored even when the import fails so the error is still reported
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stderr(devnull):
+        import keras as K
+
     return K.models.load_model(filepath)
-    
-def load_tokenizer(filepath):
-    with open(filepath, 'rb') as handle:
-        return pickle.load(handle)
 
-model = load_model(model_path)
+def load_tokenizer(filepath):
+    if os.path.isfile(compact_tokenizer_path):
+        return FastTokenizer.load(compact_tokenizer_path)
+    return FastTokenizer.from_pickle(filepath)
+
+def weights_are_current(filepath):
+    '''
+    Whether the exported weights belong to the current Keras model and tokenizer. After a retrain
+    the old weights would look up the new tokenizer's word indices and predict nonsense
+    '''
+    sources = quantization.load_config(filepath).get('sources')
+    return not is_stale(sources, [model_path, tokenizer_path], model_dir, os.path.getmtime(filepath))
+
+if os.path.isfile(weights_path) and weights_are_current(weights_path):
+    model = NumpyLSTM.load(weights_path)
+else:
+    if os.path.isfile(weights_path):
+        print('Ignoring {}, it was exported from another model or tokenizer than the current ones, '
+              'run export_lstm.py again'.format(weights_path), file=sys.stderr)
+    model = load_model(model_path)
 tokenizer = load_tokenizer(tokenizer_path)
 
 def predict_sentence(sentence):
-    X = tokenizer.texts_to_sequences(sentence)
-
-    X = K.preprocessing.sequence.pad_sequences(X, maxlen=max_text_length, padding='pre', truncating='pre')
+    X = tokenizer.encode([sentence], maxlen=max_text_length)
 
     return model.predict_classes(X)[0][0]
 
 def predict_sentences(sentences):
-    X = tokenizer.texts_to_sequences(sentences)
-
-    X = K.preprocessing.sequence.pad_sequences(X, maxlen=max_text_length, padding='pre', truncating='pre')
+    X = tokenizer.encode(sentences, maxlen=max_text_length)
 
     return model.predict_classes(X)
 
@@ -47,7 +66,7 @@ def predict(X):
         predictions = predict_sentences(X)
         for pred in predictions:
             results.append(pred[0])
-    
+
     return results
 
 # Skal fikses så den siger enten -1 eller 1 afhængig af pred
@@ -58,4 +77,3 @@ def predict(X):
 
 # print("prediction single string: {}".format(predict(sentences)))
 # print("prediction string list : {}".format(predict(sentences2)))
-
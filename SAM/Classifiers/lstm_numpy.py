@@ -0,0 +1,92 @@
+import numpy as np
+
+import quantization
+
+'''
+NumPy-only inference for the Embedding -> LSTM -> Dense(1, sigmoid) model trained by classifier_lstm.
+The weights are exported by export_lstm.py, so serving the model never imports Keras or TensorFlow.
+Reduced precision embeddings are used as stored, only the looked up rows are converted.
+'''
+
+activations = {
+    'tanh': np.tanh,
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+    # Keras 2 definition, a piecewise linear approximation of the sigmoid
+    'hard_sigmoid': lambda x: np.clip(0.2 * x + 0.5, 0, 1),
+    'relu': lambda x: np.maximum(x, 0),
+    'linear': lambda x: x,
+}
+
+class NumpyLSTM:
+    '''
+    Parameters
+    -----------
+    weights: Dict with the values and int8 scales (or None) of embedding, lstm_kernel,
+             lstm_recurrent_kernel, lstm_bias, dense_kernel and dense_bias, see quantization.load_quantized,
+    config: The activations of the layers and whether the embedding masks index 0
+    '''
+    def __init__(self, weights, config):
+        self.embedding, self.embedding_scale = weights['embedding']
+        dequantized = {name: quantization.dequantize(values, scale) for name, (values, scale) in weights.items()
+                       if name != 'embedding'}
+        self.kernel = dequantized['lstm_kernel']
+        self.recurrent_kernel = dequantized['lstm_recurrent_kernel']
+        self.bias = dequantized['lstm_bias']
+        self.dense_kernel = dequantized['dense_kernel']
+        self.dense_bias = dequantized['dense_bias']
+
+        self.units = self.recurrent_kernel.shape[0]
+        self.mask_zero = config.get('mask_zero', True)
+        self.activation = activations[config.get('activation', 'tanh')]
+        self.recurrent_activation = activations[config.get('recurrent_activation', 'hard_sigmoid')]
+        self.dense_activation = activations[config.get('dense_activation', 'sigmoid')]
+
+    @classmethod
+    def load(cls, filepath):
+        return cls(quantization.load_quantized(filepath), quantization.load_config(filepath))
+
+    def embed(self, X):
+        vectors = self.embedding[X].astype(np.float32)
+        if self.embedding_scale is not None:
+            vectors *= self.embedding_scale[X]
+        return vectors
+
+    def predict(self, X):
+        '''
+        Parameters
+        -----------
+        X: Pre-padded token indices of shape (n_sentences, n_steps), see FastTokenizer.encode
+        Returns
+        -------
+        probabilities: Matrix of shape (n_sentences, 1), like Keras' predict
+        '''
+        X = np.asarray(X)
+        units = self.units
+        h = np.zeros((len(X), units), dtype=np.float32)
+        c = np.zeros((len(X), units), dtype=np.float32)
+
+        mask = X != 0 if self.mask_zero else np.ones(X.shape, dtype=bool)
+        # Pre-padded steps that are masked in every sentence leave the state at zero, skip them
+        active = np.flatnonzero(mask.any(axis=0))
+        steps = range(active[0], X.shape[1]) if len(active) else range(0)
+
+        if len(steps):
+            # The input projections of every step in one product
+            inputs = self.embed(X[:, steps.start:]) @ self.kernel + self.bias
+        for step in steps:
+            z = inputs[:, step - steps.start] + h @ self.recurrent_kernel
+            i = self.recurrent_activation(z[:, :units])
+            f = self.recurrent_activation(z[:, units:2 * units])
+            g = self.activation(z[:, 2 * units:3 * units])
+            o = self.recurrent_activation(z[:, 3 * units:])
+            c_next = f * c + i * g
+            h_next = o * self.activation(c_next)
+            # Masked steps carry the previous state over
+            keep = mask[:, step, None]
+            c = np.where(keep, c_next, c)
+            h = np.where(keep, h_next, h)
+
+        return self.dense_activation(h @ self.dense_kernel + self.dense_bias)
+
+    def predict_classes(self, X):
+        return (self.predict(X) > 0.5).astype(np.int32)
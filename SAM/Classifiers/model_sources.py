@@ -0,0 +1,53 @@
+import os
+
+from labeled_data import file_digest
+
+'''
+Fingerprints of the artifacts an export was built from, eg. the multisvm heads of the flat and
+compact exports or the Keras model of the NumPy LSTM weights. Exports record them, so loaders
+can tell when the artifacts were retrained after the export and skip it.
+'''
+
+def fingerprint(paths, root):
+    '''
+    Returns
+    -------
+    sources: Dict from every path, relative to root, to its size, mtime and sha1
+    '''
+    sources = {}
+    for path in paths:
+        stat = os.stat(path)
+        sources[os.path.relpath(path, root).replace(os.sep, '/')] = {
+            'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': file_digest(path)}
+    return sources
+
+def is_stale(sources, paths, root, exported_mtime):
+    '''
+    Whether an export was built from other artifacts than the ones at paths
+    Parameters
+    -----------
+    sources: The fingerprints the export recorded, see fingerprint, None if it recorded none,
+    paths: The artifacts the export would be built from now,
+    root: The directory the recorded paths are relative to,
+    exported_mtime: When the export was written, used when it recorded no sources
+    Returns
+    -------
+    stale: False as well when none of the artifacts exist, the export is all there is then
+    '''
+    paths = [path for path in paths if os.path.isfile(path)]
+    if not paths:
+        return False
+    if sources is None:
+        return any(os.path.getmtime(path) > exported_mtime for path in paths)
+
+    current = {os.path.relpath(path, root).replace(os.sep, '/'): path for path in paths}
+    if set(current) != set(sources):
+        return True
+    for name, path in current.items():
+        stat, known = os.stat(path), sources[name]
+        if stat.st_size != known['size']:
+            return True
+        # An unchanged mtime and size is trusted, otherwise the content decides
+        if stat.st_mtime_ns != known['mtime_ns'] and file_digest(path) != known['sha1']:
+            return True
+    return False
@@ -1,24 +1,118 @@
-import joblib
-import Classifiers.classifier_svm as svm
+import argparse, joblib, json, os, sys
+import numpy as np
 
-modelpath = svm.dir_path + '/Model/'
+# Inference only needs joblib. The training code in classifier_svm (and its plotting
+# dependencies) is only imported when this file is run as a script.
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+modelpath = dir_path + '/Model/'
+# Written by compact_model.py, used instead of the four pipelines when present.
+# The memory mapped flat export is preferred over the pickled one.
+compact_path = modelpath + 'multisvm_compact.joblib'
+flat_path = modelpath + 'multisvm_flat'
+# Points at the current version of the four heads, written by parallel_heads.save_heads
+heads_manifest_path = modelpath + 'multisvm_heads.json'
+head_names = ['posSvm', 'negSvm', 'neuSvm', 'polarity']
+
+# The trained pipelines reference the featurizers module by its bare name, see featurizers.py.
+# The imports below rely on it too when this file is imported as Classifiers.multisvm
+sys.path.insert(0, dir_path)
+
+is_pos, is_neg, is_neu, polarizer = None, None, None, None
+fused = None
 
 def load_model(filepath):
     return joblib.load(filepath)
 
-if __name__ != '__main__':
-    is_pos = load_model(modelpath + 'posSvm.joblib')
-    is_neg = load_model(modelpath + 'negSvm.joblib')
-    is_neu = load_model(modelpath + 'neuSvm.joblib')
-    polarizer = load_model(modelpath + 'polarity.joblib')
-
-def train_svm(X, y, X_test, y_test, modelpath):
-        return svm.train_model(X, y, X_test, y_test, modelpath, False)
+def head_paths():
+    '''
+    Returns
+    -------
+    paths: The artifacts of the positive, negative, neutral and polarity heads, from the version
+           multisvm_heads.json points at, or directly in Model for heads saved before it existed
+    '''
+    try:
+        with open(heads_manifest_path) as f:
+            heads = json.load(f)['heads']
+    except FileNotFoundError:
+        return [modelpath + name + '.joblib' for name in head_names]
+    return [modelpath + heads[name] for name in head_names]
+
+def load_models():
+    '''
+    Loads the flat export, else the compact export, else the four heads. An export is skipped
+    when the heads were retrained after it was made, see model_sources.is_stale
+    '''
+    global is_pos, is_neg, is_neu, polarizer, fused
+    if fused is None:
+        from fused_linear import FusedLinearModel
+        from flat_model import load_flat
+        from model_sources import is_stale
+
+        heads = head_paths()
+        exports = [(os.path.join(flat_path, 'manifest.json'), flat_path, load_flat),
+                   (compact_path, compact_path, load_model)]
+        for marker, path, load in exports:
+            if not os.path.isfile(marker):
+                continue
+            model = load(path)
+            if is_stale(model.sources, heads, modelpath, os.path.getmtime(marker)):
+                print('Ignoring {}, it was exported from other heads than the current ones'.format(path))
+                continue
+            fused = model
+            print('Loaded multisvm from {}'.format(path))
+            return
+
+        is_pos, is_neg, is_neu, polarizer = [load_model(path) for path in heads]
+        # The four heads share one featurization, see predict
+        fused = FusedLinearModel.from_pipelines([is_pos, is_neg, is_neu, polarizer])
+        print('Loaded multisvm from the heads in {}'.format(os.path.dirname(heads[0])))
+
+def train_svm(X, y, X_test, y_test):
+        import classifier_svm as svm
+        # train_model evaluates on its own split of X, X_test and y_test are not used.
+        # The heads are saved together by parallel_heads.save_heads
+        return svm.train_model(np.asarray(X), np.asarray(y), auto_split=True, filepath=None)
+
+def train_parallel(X, y, X_test, y_test, n_jobs, C):
+    '''
+    Featurizes the corpus once and trains the four heads in n_jobs processes, see parallel_heads
+    '''
+    import classifier_svm as svm
+    import parallel_heads
+    from featurizers import char_wb_featurizer
+    from sklearn.svm import LinearSVC
+
+    # Seeded, so the heads do not depend on n_jobs, see parallel_heads.train_heads
+    pipelines = parallel_heads.train_heads(X, y, char_wb_featurizer('tfidf', stop_words=svm.load_stop_words()),
+                                           LinearSVC(C=C, random_state=0), n_jobs)
+    for name, score in parallel_heads.evaluate(pipelines, X_test, y_test).items():
+        print('{} accuracy: {}'.format(name, round(score*100, 4)))
+    parallel_heads.save_heads(pipelines, modelpath)
+    report_stale_exports()
+
+def report_stale_exports():
+    # Called after the heads are saved, load_models skips the exports from now on
+    for path in (flat_path, compact_path):
+        if os.path.exists(path):
+            print('{} holds the old heads and is ignored until compact_model.py is run again'.format(path))
 
 def main():
+    parser = argparse.ArgumentParser(description='Trains the four multisvm heads')
+    parser.add_argument('--sequential', action='store_true',
+                        help='Train the heads one after another, each with its own featurization and parameter search')
+    parser.add_argument('--jobs', type=int, help='Processes the heads are trained in, by default one per head or CPU')
+    parser.add_argument('--C', type=float, default=3, help='Regularization of the heads in parallel mode')
+    args = parser.parse_args()
+
+    import classifier_svm as svm
     all_train_x, all_train_y = svm.load_dataset()
     test_x, test_y = svm.load_test_dataset()
 
+    if not args.sequential:
+        train_parallel(all_train_x, all_train_y, test_x, test_y, args.jobs, args.C)
+        return
+
     positives, negatives, neutrals = [], [], []
     non_pos, non_neg, non_neu = [], [], []
     test_pos, test_neu, test_neg = [], [], []
@@ -45,7 +139,7 @@ def main():
         elif y < 0: 
             test_neg.append(x)
         else:
-            test_neg.append(x)
+            test_neu.append(x)
 
     # Positive vs non-positive
     X1 = positives + non_pos
@@ -70,67 +164,69 @@ def main():
     testX4 = test_pos + test_neg
     testy4 = [1 for _ in test_pos] + [-1 for _ in test_neg]
 
+    import parallel_heads
+    pipelines = {}
     print("Training positive svm")
-    train_svm(X1, y1, testX1, testy1, modelpath + 'posSvm.joblib')
+    pipelines['posSvm'] = train_svm(X1, y1, testX1, testy1)
     print("Training negative svm")
-    train_svm(X2, y2, testX2, testy2, modelpath + 'negSvm.joblib')
+    pipelines['negSvm'] = train_svm(X2, y2, testX2, testy2)
     print("Training neutral svm")
-    train_svm(X3, y3, testX3, testy3, modelpath + 'neuSvm.joblib')
+    pipelines['neuSvm'] = train_svm(X3, y3, testX3, testy3)
     print("Training polarity svm")
-    train_svm(X4, y4, testX4, testy4, modelpath + 'polarity.joblib')
+    pipelines['polarity'] = train_svm(X4, y4, testX4, testy4)
+    parallel_heads.save_heads(pipelines, modelpath)
+    report_stale_exports()
 
 # Need to find the right order to predict in
 def predict(sentences):
-    results = []
-
-    for i in range(0, len(sentences)):
-        s = [sentences[i]]
-
-        neu = is_neu.predict(s)
-        pos = is_pos.predict(s)
-        neg = is_neg.predict(s)
-        polarity = polarizer.predict(s)[0]
-
-        if not(pos) and not(neg) and neu:
-            results.append(0)
-            continue
-        if pos and neg and not(neu):
-            print("{0} was both positive and negative".format(sentences[i]))
-            results.append(polarity)
-            continue
-        if pos:
-            results.append(1)
-            continue
-        if neg:
-            results.append(-1)
-            continue
-        else:
-            results.append(0);
-
-        # if pos:
-        #     if polarity > 0:
-        #         results.append(1)
-        #         continue
-        #     if not(neg or neu):
-        #         results.append(1)
-        #         continue
-        #     if neu or neg:
-        #         results.append(0)
-        #         continue
-        # if neg:
-        #     if polarity < 0:
-        #         results.append(-1)
-        #         continue
-        #     if not(neu):
-        #         results.append(-1)
-        #         continue
-        #     if neu:
-        #         results.append(0)
-        #         continue
-        # else:
-        #     results.append(0)
-
-    return results
+    '''
+    Vectorizes all sentences once and evaluates the four heads with one sparse matrix product
+    Returns
+    -------
+    results: Array with 1, 0 or -1 for every sentence
+    '''
+    load_models()
+    if isinstance(sentences, str):
+        sentences = [sentences]
+
+    return combine(sentences, *fused.predict(sentences))
+
+def combine(sentences, pos, neg, neu, polarity):
+    '''
+    Turns the labels of the four heads into 1, 0 or -1 for every sentence
+    '''
+    pos, neg, neu = pos.astype(bool), neg.astype(bool), neu.astype(bool)
+
+    only_neu = ~pos & ~neg & neu
+    pos_and_neg = pos & neg & ~neu
+    for i in np.flatnonzero(pos_and_neg):
+        print("{0} was both positive and negative".format(sentences[i]))
+
+    # The conditions are checked in order, the first one that holds decides the result
+    return np.select([only_neu, pos_and_neg, pos, neg], [0, polarity, 1, -1], default=0)
+
+    # if pos:
+    #     if polarity > 0:
+    #         results.append(1)
+    #         continue
+    #     if not(neg or neu):
+    #         results.append(1)
+    #         continue
+    #     if neu or neg:
+    #         results.append(0)
+    #         continue
+    # if neg:
+    #     if polarity < 0:
+    #         results.append(-1)
+    #         continue
+    #     if not(neu):
+    #         results.append(-1)
+    #         continue
+    #     if neu:
+    #         results.append(0)
+    #         continue
+    # else:
+    #     results.append(0)
 
 if (__name__ == '__main__'):
    main()
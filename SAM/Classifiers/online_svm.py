@@ -0,0 +1,87 @@
+import argparse, joblib, os, time
+import numpy as np
+
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import f1_score
+from sklearn.pipeline import Pipeline
+
+import labeled_data
+from featurizers import char_wb_featurizer
+
+'''
+Online linear SVM that learns from newly labeled batches without a full retrain. The hashing
+featurizer has no vocabulary to refit, so the hinge loss SGD classifier behind it is updated
+with partial_fit and the pipeline is checkpointed. PythonServer serves the checkpoint as the
+'online' backend and swaps in new checkpoints while running. Eg:
+python online_svm.py --init
+python online_svm.py TrainingData/new_comments.csv
+'''
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+data_path = dir_path + '/TrainingData/training_data_all.csv'
+test_data_path = dir_path + '/TrainingData/test_data.csv'
+checkpoint_path = dir_path + '/Model/online_svm.joblib'
+
+classes = np.array([-1, 0, 1])
+
+def new_model(hash_bits=18, alpha=1e-5):
+    # The step names match the other SVM pipelines, so FusedLinearModel.from_pipelines accepts it
+    return Pipeline([
+        ('tfidf', char_wb_featurizer('hashing', hash_bits)),
+        ('svm', SGDClassifier(loss='hinge', alpha=alpha, average=True, random_state=0))
+    ])
+
+def partial_fit(model, X, y, epochs=1, seed=None):
+    '''
+    Updates the classifier of model with the labeled sentences, each epoch in a new order.
+    The sentences are featurized once, the featurizer itself is never fitted.
+    '''
+    features = model.named_steps['tfidf'].transform(X)
+    y = np.asarray(y)
+    rng = np.random.RandomState(seed)
+    for _ in range(epochs):
+        order = rng.permutation(len(y))
+        model.named_steps['svm'].partial_fit(features[order], y[order], classes=classes)
+    return model
+
+def save_checkpoint(model, filepath=checkpoint_path):
+    # Written to a temporary file first, so a running server never loads a partial checkpoint
+    joblib.dump(model, filepath + '.tmp')
+    os.replace(filepath + '.tmp', filepath)
+
+def load_checkpoint(filepath=checkpoint_path):
+    return joblib.load(filepath)
+
+def evaluate(model, X, y):
+    y_pred = model.predict(X)
+    return {'accuracy': np.mean(y_pred == y), 'f1': f1_score(y, y_pred, average='weighted')}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Updates the online SVM with newly labeled sentences')
+    parser.add_argument('batches', nargs='*', help='CSV files of labeled sentences to learn from')
+    parser.add_argument('--init', action='store_true',
+                        help='Start a new checkpoint trained on training_data_all.csv before learning the batches')
+    parser.add_argument('--init-epochs', type=int, default=10, help='Passes over the data of a new checkpoint')
+    parser.add_argument('--epochs', type=int, default=3, help='Passes over every new batch')
+    parser.add_argument('--hash-bits', type=int, default=18, help='The hashing featurizer uses 2^bits buckets')
+    parser.add_argument('--alpha', type=float, default=1e-5, help='Regularization of the SGD classifier')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.init or not os.path.isfile(checkpoint_path):
+        model = partial_fit(new_model(args.hash_bits, args.alpha), *labeled_data.load_labeled(data_path),
+                            epochs=args.init_epochs, seed=0)
+        print('Trained a new model on {} in {} s'.format(data_path, round(time.perf_counter() - start, 2)))
+    else:
+        model = load_checkpoint()
+
+    for batch in args.batches:
+        batch_start = time.perf_counter()
+        X, y = labeled_data.load_labeled(batch)
+        partial_fit(model, X, y, epochs=args.epochs)
+        print('Learned {} sentences from {} in {} s'.format(len(X), batch, round(time.perf_counter() - batch_start, 2)))
+
+    save_checkpoint(model)
+    scores = evaluate(model, *labeled_data.load_labeled(test_data_path))
+    print('Checkpointed to {} after {} s. Accuracy: {}, F1: {}'.format(
+        checkpoint_path, round(time.perf_counter() - start, 2), round(scores['accuracy']*100, 4), round(scores['f1']*100, 4)))
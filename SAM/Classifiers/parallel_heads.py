@@ -0,0 +1,132 @@
+import joblib, json, os, shutil, tempfile, time
+import numpy as np
+import scipy.sparse as sp
+
+from concurrent.futures import ProcessPoolExecutor
+
+from sklearn.base import clone
+from sklearn.pipeline import Pipeline
+
+'''
+Trains the four one-vs-rest heads of multisvm in parallel. The training corpus is featurized once,
+the sparse matrix is written to .npy files that every worker process memory maps read-only, and
+each worker fits one head on its rows. Every training run saves its heads to a new version directory
+under Model/multisvm_heads and then points multisvm_heads.json at it, see save_heads.
+'''
+
+head_names = ['posSvm', 'negSvm', 'neuSvm', 'polarity']
+heads_dir_name = 'multisvm_heads'
+# Read by multisvm.head_paths
+manifest_name = 'multisvm_heads.json'
+
+def head_rows(y):
+    '''
+    Returns
+    -------
+    heads: Dict from head name to the (rows, labels) it is trained on. The positive, negative and
+           neutral heads see every sentence, the polarity head only the positive and negative ones
+    '''
+    y = np.asarray(y).astype(int)
+    every = np.arange(len(y))
+    polar = np.flatnonzero(y != 0)
+    return {'posSvm': (every, y > 0), 'negSvm': (every, y < 0), 'neuSvm': (every, y == 0),
+            'polarity': (polar, y[polar])}
+
+def share_matrix(X, directory):
+    X = sp.csr_matrix(X)
+    for name in ('data', 'indices', 'indptr'):
+        np.save(os.path.join(directory, name + '.npy'), getattr(X, name))
+    return X.shape
+
+def open_matrix(directory, shape):
+    arrays = [np.load(os.path.join(directory, name + '.npy'), mmap_mode='r') for name in ('data', 'indices', 'indptr')]
+    return sp.csr_matrix(tuple(arrays), shape=shape, copy=False)
+
+def fit_head(directory, shape, rows, labels, classifier):
+    # Runs in a worker process. Heads trained on every row use the memory map as it is,
+    # only the polarity head's subset of rows is copied out of it
+    X = open_matrix(directory, shape)
+    if len(rows) < shape[0]:
+        X = X[rows]
+    return clone(classifier).fit(X, labels)
+
+def train_heads(X, y, featurizer, classifier, n_jobs=None):
+    '''
+    Parameters
+    -----------
+    X, y: The sentences and their 1, 0 or -1 labels,
+    featurizer: The unfitted vectorizer, fitted once on all of X and shared by the heads,
+    classifier: The unfitted classifier every head is a clone of. Give it a random_state, unseeded
+                clones draw their seeds from the global RNG every worker inherits, so the heads
+                would depend on which worker fitted them and on n_jobs,
+    n_jobs: Number of worker processes, None for one per head or CPU, whichever is fewer
+    Returns
+    -------
+    pipelines: Dict from head name to a fitted Pipeline([('tfidf', featurizer), ('svm', classifier)])
+    '''
+    n_jobs = n_jobs or min(len(head_names), os.cpu_count() or 1)
+    start = time.perf_counter()
+    vectorizer = clone(featurizer)
+    matrix = vectorizer.fit_transform(X)
+    print('Featurized {} sentences once in {} s'.format(len(X), round(time.perf_counter() - start, 2)))
+
+    directory = tempfile.mkdtemp(prefix='multisvm-')
+    try:
+        shape = share_matrix(matrix, directory)
+        del matrix
+        with ProcessPoolExecutor(n_jobs) as pool:
+            futures = {name: pool.submit(fit_head, directory, shape, rows, labels, classifier)
+                       for name, (rows, labels) in head_rows(y).items()}
+            classifiers = {name: future.result() for name, future in futures.items()}
+    finally:
+        shutil.rmtree(directory)
+
+    print('Trained {} heads in {} s'.format(len(classifiers), round(time.perf_counter() - start, 2)))
+    return {name: Pipeline([('tfidf', vectorizer), ('svm', classifiers[name])]) for name in head_names}
+
+def evaluate(pipelines, X, y):
+    '''
+    Returns
+    -------
+    scores: Dict from head name to its accuracy on the sentences it would be trained on
+    '''
+    features = pipelines[head_names[0]].named_steps['tfidf'].transform(X)
+    scores = {}
+    for name, (rows, labels) in head_rows(y).items():
+        scores[name] = np.mean(pipelines[name].named_steps['svm'].predict(features[rows]) == labels)
+    return scores
+
+def save_heads(pipelines, modelpath):
+    '''
+    Writes the heads to a new version directory and only then points multisvm_heads.json at it with
+    a single os.replace, so a reader always loads four heads of the same run. The previous version
+    is kept for readers that read the old pointer just before the swap, older ones are removed.
+    Returns
+    -------
+    paths: The saved artifact of every head
+    '''
+    root = os.path.join(modelpath, heads_dir_name)
+    os.makedirs(root, exist_ok=True)
+    manifest_path = os.path.join(modelpath, manifest_name)
+    try:
+        with open(manifest_path) as f:
+            previous = json.load(f)['version']
+    except (OSError, ValueError, KeyError):
+        previous = None
+
+    # Names sort by time, the random suffix keeps concurrent runs apart
+    directory = tempfile.mkdtemp(prefix=time.strftime('%Y%m%d-%H%M%S-'), dir=root)
+    version = os.path.basename(directory)
+    heads = {}
+    for name in head_names:
+        joblib.dump(pipelines[name], os.path.join(directory, name + '.joblib'))
+        heads[name] = '/'.join([heads_dir_name, version, name + '.joblib'])
+
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump({'version': version, 'heads': heads}, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+    for old in os.listdir(root):
+        if old not in (version, previous):
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return {name: os.path.join(modelpath, path) for name, path in heads.items()}
@@ -0,0 +1,117 @@
+import json
+import numpy as np
+import scipy.sparse as sp
+
+'''
+Reduced precision weights. float16 halves the size of float32 weights, int8 stores them as
+single bytes with one float32 scale per row or column, a quarter of the float32 size.
+Smaller weights mean more workers per box and fewer cache misses in the dot products.
+'''
+
+precisions = ('float16', 'int8')
+
+def quantize(matrix, precision, axis=-1):
+    '''
+    Parameters
+    -----------
+    matrix: The float weights,
+    precision: 'float16' or 'int8', 'float32' only changes the dtype,
+    axis: The int8 scales are shared along this axis, eg. axis=0 gives one scale per column
+    Returns
+    -------
+    values: The weights in the new precision,
+    scale: float32 array broadcastable to matrix that the values are multiplied with, None for float16
+    '''
+    matrix = np.asarray(matrix, dtype=np.float64)
+    if precision == 'float32':
+        return matrix.astype(np.float32), None
+    if precision == 'float16':
+        return matrix.astype(np.float16), None
+    if precision == 'int8':
+        scale = np.abs(matrix).max(axis=axis, keepdims=True) / 127
+        # All zero rows stay zero with any scale
+        scale[scale == 0] = 1
+        return np.round(matrix / scale).astype(np.int8), scale.astype(np.float32)
+    raise ValueError('Unknown precision: {}'.format(precision))
+
+def dequantize(values, scale=None, dtype=np.float32):
+    values = np.asarray(values, dtype=dtype)
+    return values if scale is None else values * scale
+
+def sparse_dot(X, weights, scale=None, chunk_nnz=1 << 16):
+    '''
+    X @ weights for a sparse X and dense weights in any precision.
+    scipy only multiplies matching dtypes and would convert all the weights on every call,
+    so only the reduced precision weights of the batch's nonzeros are gathered and converted. Large
+    batches are multiplied in chunks of rows, so at most chunk_nnz weight rows are converted at a time.
+    Parameters
+    -----------
+    X: Sparse matrix of shape (n_rows, n_features),
+    weights: Matrix of shape (n_features, n_columns),
+    scale: The column scales of int8 weights, see quantize,
+    chunk_nnz: Nonzeros of X per chunk, a single row with more is its own chunk
+    Returns
+    -------
+    product: Matrix of shape (n_rows, n_columns)
+    '''
+    if weights.dtype in (np.float32, np.float64):
+        product = np.asarray(X @ weights)
+        return product if scale is None else product * scale
+
+    X = sp.csr_matrix(X)
+    product = np.empty((X.shape[0], weights.shape[1]))
+    start = 0
+    while start < X.shape[0]:
+        end = np.searchsorted(X.indptr, X.indptr[start] + chunk_nnz, side='right') - 1
+        end = max(end, start + 1)
+        chunk = X[start:end]
+        gathered = weights[chunk.indices].astype(np.float64)
+        # Row i of sums adds up the gathered weights of row i's nonzeros, scaled by their values
+        sums = sp.csr_matrix((chunk.data, np.arange(chunk.nnz), chunk.indptr), shape=(chunk.shape[0], chunk.nnz))
+        product[start:end] = sums @ gathered
+        start = end
+    return product if scale is None else product * scale
+
+def save_quantized(path, weights, axes, precision, config=None):
+    '''
+    Saves named weight matrices in reduced precision to an .npz file
+    Parameters
+    -----------
+    path: The .npz file to write,
+    weights: Dict of name -> matrix, kept in this order,
+    axes: Dict of name -> axis the int8 scales are shared along, names missing are kept as float32,
+    precision: 'float32', 'float16' or 'int8',
+    config: Optional JSON serializable dict saved alongside, see load_config
+    '''
+    arrays = {'names': np.array(list(weights)), 'precision': np.array(precision),
+              'config': np.array(json.dumps(config or {}))}
+    for name, matrix in weights.items():
+        if name in axes:
+            arrays[name], scale = quantize(matrix, precision, axes[name])
+            if scale is not None:
+                arrays[name + '_scale'] = scale
+        else:
+            arrays[name] = np.asarray(matrix, dtype=np.float32)
+    np.savez(path, **arrays)
+
+def load_quantized(path):
+    '''
+    Returns
+    -------
+    weights: Dict of name -> the raw values and the scale (None unless int8), in the saved order
+    '''
+    with np.load(path) as data:
+        return {str(name): (data[name], data[name + '_scale'] if name + '_scale' in data else None)
+                for name in data['names']}
+
+def load_dequantized(path, dtype=np.float32):
+    '''
+    Returns
+    -------
+    weights: Dict of name -> matrix converted back to dtype, in the saved order
+    '''
+    return {name: dequantize(values, scale, dtype) for name, (values, scale) in load_quantized(path).items()}
+
+def load_config(path):
+    with np.load(path) as data:
+        return json.loads(str(data['config'])) if 'config' in data else {}
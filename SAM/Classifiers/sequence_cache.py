@@ -0,0 +1,114 @@
+import hashlib, json, os
+import numpy as np
+
+import labeled_data
+
+'''
+On-disk cache of tokenized and padded training sequences for the LSTM trainer.
+The rows of labeled_data.iter_labeled are encoded in chunks with the FastTokenizer and appended
+to a raw int32 file, which is opened again as a read-only memory map. Entries are keyed by the hash of the data and
+the tokenizer configuration, so re-runs skip tokenization and memory stays bounded by one chunk.
+'''
+
+chunk_size = 10000
+
+def data_digest(paths):
+    '''
+    Returns
+    -------
+    digest: Hash of the labeled_data.file_digest of every file, in order
+    '''
+    return hashlib.sha1('\n'.join(labeled_data.file_digest(path) for path in paths).encode('utf-8')).hexdigest()
+
+def cache_key(data_digest, tokenizer, maxlen):
+    config = {'data': data_digest, 'maxlen': maxlen, 'filters': tokenizer.filters, 'lower': tokenizer.lower,
+              'split': tokenizer.split, 'oov_index': tokenizer.oov_index,
+              'words': hashlib.sha1('\n'.join(tokenizer.words).encode('utf-8')).hexdigest()}
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
+def tokenizer_key(data_digest, config):
+    '''
+    Returns
+    -------
+    key: Hash of the data and every setting the tokenizer is constructed with
+    '''
+    config = dict(config, data=data_digest)
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
+def chunks(rows, size):
+    sentences, labels = [], []
+    for sentence, label in rows:
+        sentences.append(sentence)
+        labels.append(label)
+        if len(sentences) == size:
+            yield sentences, labels
+            sentences, labels = [], []
+    if sentences:
+        yield sentences, labels
+
+def build(rows, tokenizer, maxlen, path):
+    '''
+    Writes the sequences and labels of rows to path.X.int32, path.y.int8 and path.json.
+    The metadata is written last, so an interrupted build is never opened.
+    '''
+    count = 0
+    with open(path + '.X.int32.tmp', 'wb') as X_file, open(path + '.y.int8.tmp', 'wb') as y_file:
+        for sentences, labels in chunks(rows, chunk_size):
+            X_file.write(tokenizer.encode(sentences, maxlen).tobytes())
+            y_file.write(np.array(labels, dtype=np.int8).tobytes())
+            count += len(sentences)
+
+    os.replace(path + '.X.int32.tmp', path + '.X.int32')
+    os.replace(path + '.y.int8.tmp', path + '.y.int8')
+    with open(path + '.json.tmp', 'w') as meta:
+        json.dump({'rows': count, 'maxlen': maxlen}, meta)
+    os.replace(path + '.json.tmp', path + '.json')
+
+def open_cache(path):
+    with open(path + '.json') as meta:
+        meta = json.load(meta)
+    rows, maxlen = meta['rows'], meta['maxlen']
+    # np.memmap refuses empty files
+    if rows == 0:
+        return np.zeros((0, maxlen), dtype=np.int32), np.zeros(0, dtype=np.int8)
+    X = np.memmap(path + '.X.int32', dtype=np.int32, mode='r', shape=(rows, maxlen))
+    y = np.memmap(path + '.y.int8', dtype=np.int8, mode='r', shape=(rows,))
+    return X, y
+
+def cached_sequences(filepath, tokenizer, maxlen, directory):
+    '''
+    Parameters
+    -----------
+    filepath: Labeled CSV file,
+    tokenizer: The FastTokenizer to encode with,
+    maxlen: Length the sequences are padded and truncated to,
+    directory: Where the cache lives
+    Returns
+    -------
+    X: Read-only int32 memory map of shape (n_rows, maxlen),
+    y: Read-only int8 memory map of shape (n_rows,),
+    hit: Whether the sequences were already cached
+    '''
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, cache_key(data_digest([filepath]), tokenizer, maxlen))
+    hit = os.path.isfile(path + '.json')
+    if not hit:
+        build(labeled_data.iter_labeled(filepath), tokenizer, maxlen, path)
+    X, y = open_cache(path)
+    return X, y, hit
+
+def batches(X, y, batch_size, shuffle=True, seed=None):
+    '''
+    Endless generator of (X, y) batches for Keras' fit_generator, reshuffled every epoch.
+    Only one batch is read from the memory maps at a time.
+    '''
+    rng = np.random.RandomState(seed)
+    while True:
+        order = rng.permutation(len(X)) if shuffle else np.arange(len(X))
+        for start in range(0, len(X), batch_size):
+            # Sorted indices read the file front to back
+            index = np.sort(order[start:start + batch_size])
+            yield np.asarray(X[index]), np.asarray(y[index])
+
+def steps(X, batch_size):
+    return -(-len(X) // batch_size)
@@ -1,5 +1,6 @@
 ﻿using System;
 using System.Collections.Generic;
+using System.IO;
 using System.Net;
 using System.Net.Sockets;
 using System.Text;
@@ -10,6 +11,10 @@ namespace SAM.IO
 {
     class RemoteHandler
     {
+        // Message types of the length-prefixed protocol spoken by PythonServer.py
+        private const byte MsgSingle = (byte)'S';
+        private const byte MsgBatch = (byte)'B';
+
         /// <summary>
         /// Connects to a server and tests the connection.
         /// </summary>
@@ -45,35 +50,113 @@ namespace SAM.IO
 
 
         /// <summary>
-        /// This method writes a message to the network stream and reads the response
+        /// This method writes a single sentence request to the network stream and reads the response
         /// </summary>
         /// <param name="stream">A network stream (TCPClient)</param>
         /// <param name="message">Message to write to the stream</param>
         /// <returns>the response</returns>
         public static string CallServer(NetworkStream stream, string message)
         {
-            // Get a client stream for reading and writing.
-            //  Stream stream = client.GetStream();
+            byte[] body = Encoding.UTF8.GetBytes(message);
+            byte[] payload = new byte[body.Length + 1];
+            payload[0] = MsgSingle;
+            Buffer.BlockCopy(body, 0, payload, 1, body.Length);
 
-            //byte[] data = Encoding.UTF8.GetBytes(message);
-            byte[] data = Encoding.UTF8.GetBytes(message);
-            // Send the message to the connected TcpServer. 
+            WriteFrame(stream, payload);
 
-            stream.Write(data, 0, data.Length);
+            byte[] response = ReadFrame(stream);
+            if (response == null)
+                return string.Empty;
 
-            // Receive the TcpServer.response.
-            
-            // Buffer to store the response bytes.
-            data = new byte[256];
+            return Encoding.UTF8.GetString(response);
+        }
 
-            string responseData = string.Empty;
-            Int32 bytes;
+        /// <summary>
+        /// Sends every message in a single batch frame, so the server can predict them in one call
+        /// </summary>
+        /// <param name="stream">A network stream (TCPClient)</param>
+        /// <param name="messages">Messages to write to the stream</param>
+        /// <returns>the responses, in the same order as the messages</returns>
+        public static List<string> CallServerBatch(NetworkStream stream, IList<string> messages)
+        {
+            using (var payload = new MemoryStream())
+            {
+                payload.WriteByte(MsgBatch);
+                WriteInt(payload, messages.Count);
+                foreach (var message in messages)
+                {
+                    byte[] data = Encoding.UTF8.GetBytes(message);
+                    WriteInt(payload, data.Length);
+                    payload.Write(data, 0, data.Length);
+                }
+                WriteFrame(stream, payload.ToArray());
+            }
 
-            // Read the first batch of the TcpServer response bytes.
-            while((bytes = stream.Read(data, 0, data.Length)) != 0) break;
+            var results = new List<string>();
+            byte[] response = ReadFrame(stream);
+            if (response == null)
+                return results;
 
-            return Encoding.UTF8.GetString(data, 0, bytes);
+            int offset = 0;
+            int count = ReadInt(response, ref offset);
+            for (int i = 0; i < count; i++)
+            {
+                int length = ReadInt(response, ref offset);
+                results.Add(Encoding.UTF8.GetString(response, offset, length));
+                offset += length;
+            }
+            return results;
         }
+
+        /// <summary>
+        /// Writes a 4 byte big-endian length followed by the payload
+        /// </summary>
+        private static void WriteFrame(Stream stream, byte[] payload)
+        {
+            WriteInt(stream, payload.Length);
+            stream.Write(payload, 0, payload.Length);
+        }
+
+        /// <summary>
+        /// Reads a whole frame from the stream, returns null if the connection was closed
+        /// </summary>
+        private static byte[] ReadFrame(Stream stream)
+        {
+            byte[] header = ReadExactly(stream, 4);
+            if (header == null)
+                return null;
+
+            int offset = 0;
+            return ReadExactly(stream, ReadInt(header, ref offset));
+        }
+
+        private static byte[] ReadExactly(Stream stream, int size)
+        {
+            byte[] buffer = new byte[size];
+            int read = 0;
+            while (read < size)
+            {
+                int bytes = stream.Read(buffer, read, size - read);
+                if (bytes == 0)
+                    return null;
+                read += bytes;
+            }
+            return buffer;
+        }
+
+        private static void WriteInt(Stream stream, int value)
+        {
+            byte[] data = BitConverter.GetBytes(IPAddress.HostToNetworkOrder(value));
+            stream.Write(data, 0, data.Length);
+        }
+
+        private static int ReadInt(byte[] buffer, ref int offset)
+        {
+            int value = IPAddress.NetworkToHostOrder(BitConverter.ToInt32(buffer, offset));
+            offset += 4;
+            return value;
+        }
+
         /// <summary>
         /// This puts a canary up. It blocks untill it recieves an incoming connection
         /// </summary>
@@ -1,43 +1,439 @@
-import sys, joblib, os, socket, Classifiers.lstm, Classifiers.multisvm
+import time
+startup_time = time.perf_counter()
+
+import sys, os, gc, signal, socket, struct, argparse, asyncio, json, collections, importlib, hashlib, re, select
 
-from sklearn.svm import SVC
-from sklearn.pipeline import Pipeline
-from sklearn.feature_extraction.text import TfidfVectorizer
+from concurrent.futures import ThreadPoolExecutor
 sys.path.insert(0, './Model/')
+# Pickled pipelines reference modules in Classifiers, eg. featurizers, by their bare name,
+# see Classifiers/featurizers.py
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)) + '/Classifiers')
 
-import time
 import warnings
 warnings.filterwarnings("ignore")
 
 #https://www.geeksforgeeks.org/socket-programming-multi-threading-python/
 # address and port is arbitrary
 
-def server(host='127.0.0.1', port=9999):
-  # create socket
-  with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-    sock.bind((host, port))
+# <------------------>
+# <- WIRE PROTOCOL  ->
+# <------------------>
+# Every message is a frame: a 4 byte big-endian length followed by that many bytes.
+# A request payload starts with a single type byte:
+#   'S' + utf-8 sentence                      -> response payload is the label
+#   'B' + count + count * (length + utf-8)    -> response payload is count * (length + label)
+#   'T'                                       -> response payload is the server statistics as json
+# All counts and lengths are 4 byte big-endian unsigned ints.
 
-    sock.listen(100) # number of connections in buffer?
+HEADER = struct.Struct('>I')
+MSG_SINGLE = b'S'
+MSG_BATCH = b'B'
+MSG_STATS = b'T'
+MAX_FRAME_SIZE = 16 * 1024 * 1024
 
-    ready_signaler()
+def encode_frame(payload):
+    return HEADER.pack(len(payload)) + payload
+
+def encode_strings(strings):
+    parts = [HEADER.pack(len(strings))]
+    for s in strings:
+        data = s.encode('utf-8')
+        parts.append(HEADER.pack(len(data)))
+        parts.append(data)
+    return b''.join(parts)
+
+def decode_strings(payload, offset=0):
+    count, = HEADER.unpack_from(payload, offset)
+    offset += HEADER.size
+    strings = []
+    for _ in range(count):
+        length, = HEADER.unpack_from(payload, offset)
+        offset += HEADER.size
+        if offset + length > len(payload):
+            raise ValueError('String length exceeds frame size')
+        strings.append(str(payload[offset:offset + length], 'utf-8'))
+        offset += length
+    return strings
+
+def decode_request(payload):
+    '''
+    Decodes a request payload
+    Returns
+    -------
+    sentences: The sentences to be predicted,
+    is_batch: Whether the response should be a batch response
+    '''
+    msg_type, body = payload[:1], payload[1:]
+    if msg_type == MSG_SINGLE:
+        return [str(body, 'utf-8')], False
+    if msg_type == MSG_BATCH:
+        return decode_strings(body), True
+    raise ValueError('Unknown message type: {}'.format(msg_type))
+
+def encode_response(labels, is_batch):
+    if is_batch:
+        return encode_strings([str(label) for label in labels])
+    return str(labels[0]).encode('utf-8')
 
-    # permit to access
-    conn, addr = sock.accept()
+async def read_frame(reader):
     try:
-      with conn as c:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    size, = HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ValueError('Frame of {} bytes exceeds the maximum frame size'.format(size))
+    return await reader.readexactly(size)
+
+# <---------------------->
+# <-  PREDICTION CACHE  ->
+# <---------------------->
+
+link_pattern = re.compile(r'(https?://|www\.)\S+', re.IGNORECASE)
+whitespace_pattern = re.compile(r'\s+')
+
+def normalize(sentence):
+    # Links carry no sentiment. The model predicts on the normalized sentence as well, see
+    # BatchScheduler.submit, so every sentence with the same key gets the same label
+    return whitespace_pattern.sub(' ', link_pattern.sub('', sentence)).strip().lower()
+
+class PredictionCache:
+    '''
+    Bounded LRU cache of labels keyed by the normalized sentence and the model version.
+    Setting a new model version empties the cache.
+    '''
+    def __init__(self, max_size=10000, version=None):
+        self.max_size = max_size
+        self.version = version
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def set_version(self, version):
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def key(self, sentence):
+        return (self.version, normalize(sentence))
+
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, self.entries[key]
+        self.misses += 1
+        return False, None
+
+    def put(self, key, label):
+        if self.max_size <= 0 or key[0] != self.version:
+            return
+        self.entries[key] = label
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def to_dict(self):
+        return {
+            'model_version': self.version,
+            'size': len(self.entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / (self.hits + self.misses) if self.hits + self.misses else 0,
+        }
+
+# <---------------------->
+# <- BATCHING SCHEDULER ->
+# <---------------------->
+
+class BatchStats:
+    def __init__(self):
+        self.batches = 0
+        self.sentences = 0
+        self.largest = 0
+        self.sizes = collections.Counter()
+
+    def record(self, size):
+        self.batches += 1
+        self.sentences += size
+        self.largest = max(self.largest, size)
+        self.sizes[size] += 1
+
+    def to_dict(self):
+        return {
+            'batches': self.batches,
+            'sentences': self.sentences,
+            'mean_batch_size': self.sentences / self.batches if self.batches else 0,
+            'max_batch_size': self.largest,
+            'batch_sizes': {str(size): count for size, count in sorted(self.sizes.items())},
+        }
+
+class BatchScheduler:
+    '''
+    Collects sentences from every connection and predicts them together. The sentences are
+    normalized before they are looked up in the cache and predicted, see normalize
+    Parameters
+    -----------
+    predict: Function taking a list of sentences and returning a list of labels,
+    executor: The executor running the predict calls,
+    max_batch_size: The most sentences given to a single predict call,
+    max_wait: Seconds to wait for more sentences after the first one arrives,
+    cache: A PredictionCache consulted before sentences are queued
+    '''
+    def __init__(self, predict, executor, max_batch_size=64, max_wait=0.002, cache=None):
+        self.predict = predict
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.cache = cache or PredictionCache(0)
+        self.stats = BatchStats()
+        self.queue = asyncio.Queue()
+
+    async def submit(self, sentences):
+        loop = asyncio.get_running_loop()
+        futures = []
+        for sentence in sentences:
+            future = loop.create_future()
+            key = self.cache.key(sentence)
+            found, label = self.cache.get(key)
+            if found:
+                future.set_result(label)
+            else:
+                # The normalized sentence of the key is predicted, not the raw one
+                self.queue.put_nowait((key[1], key, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def collect(self):
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
         while True:
-          request = c.recv(4096)
-          if not request:
-            print("Got here")
+            batch = await self.collect()
+            sentences = [sentence for sentence, _, _ in batch]
+            self.stats.record(len(batch))
+            try:
+                labels = await loop.run_in_executor(self.executor, self.predict, sentences)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, key, future), label in zip(batch, labels):
+                self.cache.put(key, label)
+                if not future.done():
+                    future.set_result(label)
+
+async def handle_request(payload, scheduler):
+    if payload[:1] == MSG_STATS:
+        return json.dumps({'startup': startup_report, 'batching': scheduler.stats.to_dict(),
+                           'cache': scheduler.cache.to_dict()}).encode('utf-8')
+
+    sentences, is_batch = decode_request(payload)
+    labels = await scheduler.submit(sentences) if sentences else []
+    return encode_response(labels, is_batch)
+
+async def handle_client(reader, writer, scheduler):
+    try:
+      while True:
+        request = await read_frame(reader)
+        if request is None:
+          break
 
-          evalstring = str(request,'utf-8')
-          #run svm-script here
-          # main should take argument such that program can pick what script to run here
+        response = await handle_request(request, scheduler)
+        writer.write(encode_frame(response))
+        await writer.drain()
+    except Exception as e:
+      print("Dropping client: {}".format(e))
+    finally:
+      writer.close()
 
-          res = clf.predict([evalstring])
-          c.sendall(str(res[0]).encode('utf-8'))
-    except:
-      print("Shutting down server...")
+def create_socket(host, port):
+  sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+  sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+  sock.bind((host, port))
+  sock.listen(100) # number of connections in buffer
+  return sock
+
+async def watch_model(scheduler, clf_name, interval):
+  '''
+  Polls the artifacts of the backend and swaps in the new model when they change.
+  Requests in flight finish on the old model, the cache is emptied by its new version.
+  '''
+  loop = asyncio.get_running_loop()
+  while True:
+    await asyncio.sleep(interval)
+    version = artifact_version(clf_name)
+    if version == scheduler.cache.version:
+      continue
+    try:
+      # Loaded on the default executor, so the inference threads keep serving meanwhile
+      model = await loop.run_in_executor(None, registry[clf_name])
+    except Exception as e:
+      print("Keeping model {}, loading version {} failed: {}".format(scheduler.cache.version, version, e))
+      continue
+    scheduler.predict = model.predict
+    scheduler.cache.set_version(version)
+    startup_report['model_version'] = version
+    startup_report['reloads'] = startup_report.get('reloads', 0) + 1
+    print("[{}] Reloaded {} version {}".format(os.getpid(), clf_name, version))
+
+async def serve(sock, scheduler, inference_threads=1, on_ready=None, reload_interval=0, parent_fd=None):
+  sock_server = await asyncio.start_server(
+    lambda r, w: handle_client(r, w, scheduler), sock=sock)
+  if parent_fd is not None:
+    # Only the parent holds the write end, so the pipe reads EOF once the parent is gone,
+    # even when it was killed without a chance to stop its workers
+    asyncio.get_running_loop().add_reader(parent_fd, asyncio.current_task().cancel)
+  # one batching loop per inference thread, so every thread can have a batch in flight
+  batchers = [asyncio.ensure_future(scheduler.run()) for _ in range(inference_threads)]
+  classifier = startup_report.get('classifier')
+  if reload_interval > 0 and classifier in reloadable:
+    batchers.append(asyncio.ensure_future(watch_model(scheduler, classifier, reload_interval)))
+
+  if on_ready is not None:
+    on_ready()
+
+  try:
+    async with sock_server:
+      await sock_server.serve_forever()
+  finally:
+    for batcher in batchers:
+      batcher.cancel()
+
+def server(host='127.0.0.1', port=9999, inference_threads=1, max_batch_size=64, max_wait_ms=2,
+           cache_size=10000, reload_interval=0, sock=None, on_ready=None, parent_fd=None):
+  if sock is None:
+    sock = create_socket(host, port)
+    on_ready = on_ready or ready_signaler
+
+  # Models are not guaranteed to be thread safe, so inference defaults to a single thread
+  # while the event loop keeps serving I/O for every connection
+  with ThreadPoolExecutor(max_workers=inference_threads) as executor:
+    cache = PredictionCache(cache_size, startup_report.get('model_version'))
+    scheduler = BatchScheduler(clf.predict, executor, max_batch_size, max_wait_ms / 1000, cache)
+    try:
+      asyncio.run(serve(sock, scheduler, inference_threads, on_ready, reload_interval, parent_fd))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+      pass
+  print("[{}] Batching: {}".format(os.getpid(), scheduler.stats.to_dict()))
+  print("[{}] Cache: {}".format(os.getpid(), scheduler.cache.to_dict()))
+  print("Shutting down server...")
+
+def stop_workers(pids):
+  for pid in pids:
+    try:
+      os.kill(pid, signal.SIGTERM)
+    except ProcessLookupError:
+      pass
+  for pid in pids:
+    try:
+      os.waitpid(pid, 0)
+    except ChildProcessError:
+      pass
+
+def signal_ready(fd):
+  # Closed right away, so the parent reads EOF on this worker's pipe only if it never got ready
+  os.write(fd, b'.')
+  os.close(fd)
+
+def wait_ready(ready_fds, pids):
+  '''
+  Waits until every worker has signalled on its own pipe
+  Parameters
+  -----------
+  ready_fds: Dict from the read end of every worker's ready pipe to the worker's pid,
+  pids: The pids of the running workers, reaped workers are removed
+  Returns
+  -------
+  ready: False as soon as a worker exits before it is ready
+  '''
+  while ready_fds:
+    readable, _, _ = select.select(list(ready_fds), [], [], 1.0)
+    for fd in readable:
+      data = os.read(fd, 1)
+      os.close(fd)
+      pid = ready_fds.pop(fd)
+      if not data:
+        print("Worker {} exited before it was ready".format(pid))
+        return False
+    # A worker may also have died between two reads of its pipe
+    for pid in list(ready_fds.values()):
+      if os.waitpid(pid, os.WNOHANG)[0] == pid:
+        pids.remove(pid)
+        print("Worker {} exited before it was ready".format(pid))
+        return False
+  return True
+
+def prefork_server(workers, host='127.0.0.1', port=9999, **kwargs):
+  '''
+  Forks a number of workers that all accept connections on the same listening socket.
+  The model is loaded before forking, so the workers share its pages copy-on-write.
+  The ready signal is only sent once every worker is serving. Stopping the parent with
+  SIGTERM or Ctrl+C stops the workers, and workers exit on their own if the parent is killed.
+  '''
+  if not hasattr(os, 'fork'):
+    print("--workers is only supported on platforms with os.fork")
+    exit(1)
+
+  sock = create_socket(host, port)
+  alive_read_fd, alive_write_fd = os.pipe()
+
+  # Keep the garbage collector from touching (and thereby copying) the model's pages
+  gc.freeze()
+
+  # Every worker signals on its own pipe, so one that dies is noticed while the others keep running
+  pids, ready_fds = [], {}
+  for _ in range(workers):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+      for fd in list(ready_fds) + [read_fd, alive_write_fd]:
+        os.close(fd)
+      try:
+        server(sock=sock, on_ready=lambda: signal_ready(write_fd), parent_fd=alive_read_fd, **kwargs)
+      finally:
+        os._exit(0)
+    os.close(write_fd)
+    ready_fds[read_fd] = pid
+    pids.append(pid)
+  os.close(alive_read_fd)
+
+  # The host stops the server by terminating this process, which has to take the workers along
+  signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+  try:
+    if not wait_ready(ready_fds, pids):
+      exit(1)
+
+    ready_signaler()
+
+    for pid in list(pids):
+      os.waitpid(pid, 0)
+      pids.remove(pid)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    stop_workers(pids)
+    sock.close()
 
 def ready_signaler():
     signaler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -51,28 +447,97 @@ dir_path = os.path.dirname(os.path.realpath(__file__))
 model_path = dir_path + "/Classifiers/Model"
 
 
+def load_joblib(filename):
+    # joblib pulls in numpy, so it is imported with the model rather than at startup
+    import joblib
+    return joblib.load(model_path + filename)
+
+def load_multisvm():
+    # multisvm loads its models lazily, load them now so they are shared by forked workers
+    module = importlib.import_module('Classifiers.multisvm')
+    module.load_models()
+    return module
+
+# Backends are only imported and loaded when requested, so e.g. svm never pays for TensorFlow
+registry = {
+    "svm": load_multisvm, # lambda: load_joblib("/svm_pipeline.joblib")
+    # "nb": lambda: load_joblib("/nb_pipeline.joblib"),
+    "rf": lambda: load_joblib("/rf_pipeline.joblib"),
+    "lstm": lambda: importlib.import_module('Classifiers.lstm'),
+    # Updated in place by Classifiers/online_svm.py
+    "online": lambda: load_joblib("/online_svm.joblib"),
+}
+
+# Backends whose loader returns a new model on every call, so they can be swapped while serving
+reloadable = {"rf", "online"}
+
+# Files that make up each backend, their stat identifies the loaded model version
+artifacts = {
+    "svm": ["/multisvm_heads.json", "/posSvm.joblib", "/negSvm.joblib", "/neuSvm.joblib", "/polarity.joblib",
+            "/multisvm_compact.joblib", "/multisvm_flat/manifest.json"],
+    "rf": ["/rf_pipeline.joblib"],
+    "lstm": ["/LSTM_model.h5", "/LSTM_weights.npz", "/tokenizer.pickle", "/tokenizer.json"],
+    "online": ["/online_svm.joblib"],
+}
+
+startup_report = {}
+
+def artifact_version(clf):
+    version = hashlib.sha1(clf.encode('utf-8'))
+    for filename in artifacts.get(clf, []):
+        path = model_path + filename
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            version.update('{}:{}:{}'.format(filename, stat.st_mtime_ns, stat.st_size).encode('utf-8'))
+    return version.hexdigest()[:12]
+
 # Get classifier from supplied argument
 def get_classifier(clf):
-    switcher = {
-        "svm": Classifiers.multisvm, #joblib.load(model_path + "/svm_pipeline.joblib"),
-        # "nb": joblib.load(model_path + "/nb_pipeline.joblib"),
-        "rf": joblib.load(model_path + "/rf_pipeline.joblib"),
-        "lstm": Classifiers.lstm
-    }
-    
     # Check if wrong input
-    if clf not in switcher:
+    if clf not in registry:
         print("Please use one of the classifier arguments:")
-        print("svm")
-        print("nb")
-        print("rf")
-        print("lstm")
+        for name in registry:
+            print(name)
         exit(1)
 
-    return switcher.get(clf)
+    load_start = time.perf_counter()
+    model = registry[clf]()
+    load_end = time.perf_counter()
+
+    startup_report['classifier'] = clf
+    startup_report['model_version'] = artifact_version(clf)
+    startup_report['load_ms'] = round((load_end - load_start) * 1000, 3)
+    startup_report['startup_ms'] = round((load_end - startup_time) * 1000, 3)
+    print("Loaded {} in {} ms ({} ms since start)".format(clf, startup_report['load_ms'], startup_report['startup_ms']))
 
+    return model
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='Serves predictions over a length-prefixed TCP protocol')
+    parser.add_argument('classifier', help='svm, rf, lstm or online')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--inference-threads', type=int, default=1,
+                        help='Threads running model inference. Only raise this for thread safe models')
+    parser.add_argument('--max-batch-size', type=int, default=64,
+                        help='Most sentences, across all connections, predicted in one call')
+    parser.add_argument('--max-wait-ms', type=float, default=2,
+                        help='Milliseconds to wait for a batch to fill up')
+    parser.add_argument('--cache-size', type=int, default=10000,
+                        help='Predictions kept in the LRU cache, 0 disables it')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes forked after the model is loaded. Requires os.fork')
+    parser.add_argument('--reload-interval', type=float, default=2,
+                        help='Seconds between checks for new artifacts of the rf and online backends, 0 disables it')
+    return parser.parse_args()
 
 if __name__ == "__main__":
-  clf = get_classifier(sys.argv[1])
-  server()
\ No newline at end of file
+  args = parse_args()
+  clf = get_classifier(args.classifier)
+  if args.workers > 1:
+    prefork_server(args.workers, args.host, args.port, inference_threads=args.inference_threads,
+                   max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms,
+                   cache_size=args.cache_size, reload_interval=args.reload_interval)
+  else:
+    server(args.host, args.port, args.inference_threads, args.max_batch_size, args.max_wait_ms,
+           args.cache_size, args.reload_interval)
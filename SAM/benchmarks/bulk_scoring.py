@@ -0,0 +1,69 @@
+import argparse, json, os, re, subprocess, sys, tempfile
+
+'''
+Measures how classifier_predictor's streaming mode scales with --jobs.
+TrainingData/all_data.csv is replayed a number of times into a temporary file,
+which is then scored once per job count. Eg:
+python benchmarks/bulk_scoring.py -svm --replay 20 --jobs 1 2 4 8
+'''
+
+sam_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+predictor_path = sam_dir + '/Classifiers/classifier_predictor.py'
+data_path = sam_dir + '/Classifiers/TrainingData/all_data.csv'
+
+# The speedup is computed from the scoring time, model loading is reported on its own
+summary_pattern = re.compile(r'Scored (\d+) rows in ([\d.]+) s, ([\d.]+) s loading the model and ([\d.]+) s scoring')
+
+def replay_data(target, replay):
+    with open(data_path, encoding='utf-8-sig') as source:
+        data = source.read()
+    if not data.endswith('\n'):
+        data += '\n'
+    for _ in range(replay):
+        target.write(data)
+
+def score(classifier, input_path, jobs, chunk_size):
+    command = [sys.executable, predictor_path, classifier, '--input', input_path, '--output', os.devnull,
+               '--format', 'csv', '--chunk-size', str(chunk_size), '--jobs', str(jobs)]
+    stderr = subprocess.run(command, stderr=subprocess.PIPE, check=True).stderr.decode('utf-8')
+    rows, seconds, load_seconds, score_seconds = summary_pattern.search(stderr).groups()
+    return int(rows), float(seconds), float(load_seconds), float(score_seconds)
+
+def main():
+    # The classifier argument starts with a dash, like in classifier_predictor, so it is read by hand
+    if len(sys.argv) < 2:
+        print("Please supply the classifier argument of classifier_predictor, eg. -svm")
+        exit(1)
+    classifier = sys.argv[1]
+
+    parser = argparse.ArgumentParser(description='Benchmarks parallel bulk scoring')
+    parser.add_argument('--replay', type=int, default=10, help='Times all_data.csv is repeated')
+    parser.add_argument('--jobs', type=int, nargs='+', default=None,
+                        help='Job counts to measure, defaults to powers of two up to the core count')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args(sys.argv[2:])
+
+    jobs = args.jobs or [2 ** i for i in range(os.cpu_count().bit_length()) if 2 ** i <= os.cpu_count()]
+
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', delete=False) as replayed:
+        replay_data(replayed, args.replay)
+
+    results = []
+    try:
+        for n in jobs:
+            rows, seconds, load_seconds, score_seconds = score(classifier, replayed.name, n, args.chunk_size)
+            rate = rows / score_seconds if score_seconds > 0 else 0
+            results.append({'jobs': n, 'rows': rows, 'seconds': seconds, 'load_seconds': load_seconds,
+                            'score_seconds': score_seconds, 'rows_per_second': rate})
+            print('jobs={} {} rows/s, {} s loading'.format(n, round(rate, 1), load_seconds), file=sys.stderr)
+    finally:
+        os.remove(replayed.name)
+
+    base = results[0]['rows_per_second']
+    for result in results:
+        result['speedup'] = result['rows_per_second'] / base
+    print(json.dumps({'classifier': classifier, 'cpu_count': os.cpu_count(), 'replay': args.replay,
+                      'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import argparse, json, os, sys, time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+'''
+Compares the memoized char_wb featurizer with the stock TfidfVectorizer.
+Both are fitted on the training data and transform the test data, the matrices
+are checked to be identical. Eg:
+python benchmarks/featurizer.py --repeat 3
+'''
+
+sam_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, sam_dir + '/Classifiers')
+
+from featurizers import CachedCharTfidfVectorizer
+from labeled_data import load_labeled
+
+train_path = sam_dir + '/Classifiers/TrainingData/training_data_all.csv'
+test_path = sam_dir + '/Classifiers/TrainingData/all_data.csv'
+
+# Same settings as the classifier_svm pipeline
+params = dict(ngram_range=(1,10), analyzer='char_wb', use_idf=False, smooth_idf=True, sublinear_tf=False)
+
+def identical(a, b):
+    return (a.shape == b.shape and a.dtype == b.dtype and np.array_equal(a.indptr, b.indptr)
+            and np.array_equal(a.indices, b.indices) and np.array_equal(a.data, b.data))
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+def measure(vectorizer_class, train, test, repeat):
+    '''
+    Returns
+    -------
+    times: Best fit_transform, first transform and repeated transform times,
+    train_matrix, test_matrix: The produced matrices
+    '''
+    fit_times, transform_times = [], []
+    for _ in range(repeat):
+        vectorizer = vectorizer_class(**params)
+        seconds, train_matrix = timed(lambda: vectorizer.fit_transform(train))
+        fit_times.append(seconds)
+
+    # The first transform after fitting starts with an empty word cache
+    cold_seconds, test_matrix = timed(lambda: vectorizer.transform(test))
+    for _ in range(repeat):
+        transform_times.append(timed(lambda: vectorizer.transform(test))[0])
+
+    times = {'fit_transform_seconds': min(fit_times), 'cold_transform_seconds': cold_seconds,
+             'warm_transform_seconds': min(transform_times)}
+    return times, train_matrix, test_matrix
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the memoized char_wb featurizer')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement, the best is reported')
+    args = parser.parse_args()
+
+    train, test = list(load_labeled(train_path)[0]), list(load_labeled(test_path)[0])
+
+    stock, stock_train, stock_test = measure(TfidfVectorizer, train, test, args.repeat)
+    cached, cached_train, cached_test = measure(CachedCharTfidfVectorizer, train, test, args.repeat)
+
+    print(json.dumps({
+        'train_sentences': len(train),
+        'test_sentences': len(test),
+        'identical': identical(stock_train, cached_train) and identical(stock_test, cached_test),
+        'stock': stock,
+        'cached': cached,
+        'speedup': {k: stock[k] / cached[k] for k in stock},
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import argparse, io, json, os, pickle, sys, time, tracemalloc
+
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.pipeline import Pipeline
+from sklearn.svm import LinearSVC
+
+'''
+Compares the vocabulary based char_wb featurizer with the stateless hashing featurizer.
+Every variant is trained like the classifier_svm pipeline on training_data.csv and scored on
+test_data.csv and HypothesisData.csv. pickled_mb is the size of the pipeline on disk and loaded_mb
+the memory it takes once loaded, which is what every server and predictor process holds. Eg:
+python benchmarks/hashing_featurizer.py --bits 16 18 20 22
+'''
+
+sam_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, sam_dir + '/Classifiers')
+
+from labeled_data import load_labeled
+from featurizers import char_wb_featurizer
+
+data_dir = sam_dir + '/Classifiers/TrainingData/'
+train_path = data_dir + 'training_data.csv'
+eval_paths = [data_dir + 'test_data.csv', data_dir + 'HypothesisData.csv']
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+def loaded_mb(pickled):
+    '''
+    Returns
+    -------
+    megabytes: Memory the unpickled object holds, as traced by tracemalloc
+    '''
+    tracemalloc.start()
+    try:
+        loaded = pickle.load(io.BytesIO(pickled))
+        allocated, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del loaded
+    return allocated / 2**20
+
+def measure(featurizer, train, evaluations, hash_bits=None):
+    pipeline = Pipeline([('tfidf', featurizer), ('svm', LinearSVC(C=3))])
+    fit_seconds, _ = timed(lambda: pipeline.fit(*train))
+
+    # The featurizer's cache is not pickled, so this is the model as it is shipped
+    pickled = pickle.dumps(pipeline, protocol=pickle.HIGHEST_PROTOCOL)
+    load_seconds, pipeline = timed(lambda: pickle.load(io.BytesIO(pickled)))
+
+    result = {'hash_bits': hash_bits, 'fit_seconds': fit_seconds, 'load_seconds': load_seconds,
+              'pickled_mb': len(pickled) / 2**20, 'loaded_mb': loaded_mb(pickled),
+              'weights_mb': pipeline.named_steps['svm'].coef_.nbytes / 2**20,
+              'vocabulary_terms': len(getattr(pipeline.named_steps['tfidf'], 'vocabulary_', ())),
+              'scores': {}}
+    for name, (X, y) in evaluations.items():
+        seconds, y_pred = timed(lambda: pipeline.predict(X))
+        result['scores'][name] = {'accuracy': accuracy_score(y, y_pred),
+                                  'f1': f1_score(y, y_pred, average='weighted'),
+                                  'predict_seconds': seconds}
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the hashing featurizer against the tf-idf featurizer')
+    parser.add_argument('--bits', type=int, nargs='+', default=[16, 18, 20, 22],
+                        help='Hashing featurizer sizes to try, as powers of two')
+    args = parser.parse_args()
+
+    train = load_labeled(train_path)
+    evaluations = {os.path.basename(p): load_labeled(p) for p in eval_paths}
+
+    report = {'train_sentences': len(train[0]),
+              'tfidf': measure(char_wb_featurizer('tfidf'), train, evaluations),
+              'hashing': [measure(char_wb_featurizer('hashing', bits), train, evaluations, bits)
+                          for bits in args.bits]}
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+import argparse, contextlib, json, os, platform, subprocess, sys, time
+
+import numpy as np
+
+'''
+Inference micro-benchmarks for every backend whose artifacts are present: cold-load time in a
+fresh interpreter, single-sentence latency percentiles and batch throughput, on
+TrainingData/all_data.csv and Data/100_wild_sentences.csv. The report is JSON and records the
+commit, library versions and artifact sizes, so runs can be compared. With --baseline the
+report is compared to an earlier one and the exit code is 1 when a backend got slower. Eg:
+python benchmarks/inference.py --output before.json
+python benchmarks/inference.py --baseline before.json --tolerance 0.1
+'''
+
+sam_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+classifiers_dir = sam_dir + '/Classifiers'
+model_dir = classifiers_dir + '/Model/'
+sys.path.insert(0, classifiers_dir)
+
+from labeled_data import file_digest, load_labeled
+
+input_paths = {'all_data': classifiers_dir + '/TrainingData/all_data.csv',
+               'wild_sentences': sam_dir + '/Data/100_wild_sentences.csv'}
+
+# Every snippet loads a backend and defines predict(sentences), the same way the server does
+setup_code = {
+    'multisvm': 'import multisvm\nmultisvm.load_models()\npredict = multisvm.predict\n',
+    'svm_pipeline': 'import joblib\npredict = joblib.load({model_dir!r} + "svm_pipeline.joblib").predict\n',
+    'rf_pipeline': 'import joblib\npredict = joblib.load({model_dir!r} + "rf_pipeline.joblib").predict\n',
+    'nb_pipeline': 'import joblib\npredict = joblib.load({model_dir!r} + "nb_pipeline.joblib").predict\n',
+    'lstm': 'import lstm\npredict = lstm.predict\n',
+    # Like ExperimentalSVM.predict_batch, without training the classifiers first
+    'experimental': ('import joblib\n'
+                     'import classifier_svm_experimental as experimental\n'
+                     'from fused_linear import FusedLinearModel\n'
+                     'fused = FusedLinearModel.from_pipelines([joblib.load({model_dir!r} + name) for name in '
+                     '("svm_pos_pipeline.joblib", "svm_neg_pipeline.joblib")])\n'
+                     'def predict(sentences):\n'
+                     '    return experimental.combine(sentences, *fused.predict(sentences))\n'),
+}
+
+# Artifacts of every backend, any one of the alternatives is enough
+artifacts = {
+    'multisvm': [['multisvm_flat/manifest.json'], ['multisvm_compact.joblib'], ['multisvm_heads.json'],
+                 ['posSvm.joblib', 'negSvm.joblib', 'neuSvm.joblib', 'polarity.joblib']],
+    'svm_pipeline': [['svm_pipeline.joblib']],
+    'rf_pipeline': [['rf_pipeline.joblib']],
+    'nb_pipeline': [['nb_pipeline.joblib']],
+    'lstm': [['LSTM_weights.npz', 'tokenizer.json'], ['LSTM_weights.npz', 'tokenizer.pickle'],
+             ['LSTM_model.h5', 'tokenizer.json'], ['LSTM_model.h5', 'tokenizer.pickle']],
+    'experimental': [['svm_pos_pipeline.joblib', 'svm_neg_pipeline.joblib']],
+}
+
+def available_artifacts(backend):
+    '''
+    Returns
+    -------
+    files: The first complete set of artifacts of backend, None if there is none
+    '''
+    for files in artifacts[backend]:
+        if all(os.path.isfile(model_dir + name) for name in files):
+            return files
+    return None
+
+def environment():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=sam_dir,
+                                         stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import sklearn
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'sklearn': sklearn.__version__, 'platform': platform.platform(), 'cpu_count': os.cpu_count()}
+
+def measure_cold_load(backend, repeat):
+    '''
+    Loads the backend in fresh interpreters, imports included
+    Returns
+    -------
+    load: Median seconds and the largest peak resident set size in MB, None where unknown
+    '''
+    code = ('import json, sys, time\n'
+            'start = time.perf_counter()\n'
+            'sys.path.insert(0, {dir!r})\n' + setup_code[backend] +
+            'seconds = time.perf_counter() - start\n'
+            'try:\n'
+            '    import resource\n'
+            '    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024\n'
+            'except ImportError:\n'
+            '    peak = None\n'
+            'print(json.dumps({{"seconds": seconds, "peak_rss_mb": peak}}))').format(
+                dir=classifiers_dir, model_dir=model_dir)
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', code], stderr=subprocess.DEVNULL)
+        runs.append(json.loads(output.decode('utf-8').splitlines()[-1]))
+    peaks = [run['peak_rss_mb'] for run in runs if run['peak_rss_mb'] is not None]
+    return {'seconds': float(np.median([run['seconds'] for run in runs])),
+            'peak_rss_mb': max(peaks) if peaks else None}
+
+def load_in_process(backend):
+    namespace = {}
+    exec(setup_code[backend].format(model_dir=model_dir), namespace)
+    return namespace['predict']
+
+def cycle(sentences, count):
+    return [sentences[i % len(sentences)] for i in range(count)]
+
+def measure_latency(predict, sentences, requests, warmup):
+    '''
+    Returns
+    -------
+    latency: Percentiles and mean of single-sentence predict calls in milliseconds
+    '''
+    requests = cycle(sentences, requests)
+    for sentence in requests[:warmup]:
+        predict([sentence])
+
+    times = np.empty(len(requests))
+    for i, sentence in enumerate(requests):
+        start = time.perf_counter()
+        predict([sentence])
+        times[i] = time.perf_counter() - start
+    times *= 1000
+    return {'p50_ms': float(np.percentile(times, 50)), 'p95_ms': float(np.percentile(times, 95)),
+            'p99_ms': float(np.percentile(times, 99)), 'mean_ms': float(times.mean()), 'requests': len(times)}
+
+def measure_throughput(predict, sentences, batch_size, total, repeat):
+    '''
+    Returns
+    -------
+    throughput: Sentences per second of the best of repeat passes over total sentences
+    '''
+    sentences = cycle(sentences, total)
+    batches = [sentences[start:start + batch_size] for start in range(0, total, batch_size)]
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for batch in batches:
+            predict(batch)
+        best = min(best, time.perf_counter() - start)
+    return {'sentences_per_second': total / best, 'seconds': best}
+
+def benchmark(backend, inputs, args):
+    files = available_artifacts(backend)
+    if files is None:
+        return {'available': False, 'reason': 'no artifacts in Classifiers/Model'}
+    try:
+        predict = load_in_process(backend)
+    except ImportError as e:
+        return {'available': False, 'reason': str(e)}
+
+    report = {'available': True,
+              'artifacts': {name: os.path.getsize(model_dir + name) for name in files},
+              'cold_load': measure_cold_load(backend, args.load_repeat),
+              'inputs': {}}
+    for name, sentences in inputs.items():
+        report['inputs'][name] = {
+            'latency': measure_latency(predict, sentences, args.requests, args.warmup),
+            'throughput': {str(size): measure_throughput(predict, sentences, size, args.throughput_sentences, args.repeat)
+                           for size in args.batch_sizes}}
+    return report
+
+def metrics(report):
+    '''
+    Yields (path, value, higher_is_better) of every comparable number in a report
+    '''
+    for backend, result in report['backends'].items():
+        if not result.get('available'):
+            continue
+        yield (backend, 'cold_load', 'seconds'), result['cold_load']['seconds'], False
+        for name, measured in result['inputs'].items():
+            for percentile in ('p50_ms', 'p95_ms', 'p99_ms'):
+                yield (backend, name, 'latency', percentile), measured['latency'][percentile], False
+            for size, throughput in measured['throughput'].items():
+                yield (backend, name, 'throughput', size), throughput['sentences_per_second'], True
+
+def compare(report, baseline, tolerance):
+    '''
+    Returns
+    -------
+    regressions: Every metric that is more than tolerance (a fraction) worse than in the baseline
+    '''
+    before = {path: value for path, value, _ in metrics(baseline)}
+    regressions = []
+    for path, value, higher_is_better in metrics(report):
+        if path not in before or before[path] <= 0:
+            continue
+        change = value / before[path] - 1
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append({'metric': '/'.join(path), 'baseline': before[path], 'current': value,
+                                'change': change})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks inference of every available backend')
+    parser.add_argument('--backends', nargs='+', choices=sorted(setup_code), default=sorted(setup_code))
+    parser.add_argument('--requests', type=int, default=500, help='Single-sentence calls timed per input')
+    parser.add_argument('--warmup', type=int, default=20, help='Untimed calls before the latency is measured')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 16, 64, 256, 1024])
+    parser.add_argument('--throughput-sentences', type=int, default=4096,
+                        help='Sentences predicted per throughput pass, inputs are cycled to reach it')
+    parser.add_argument('--repeat', type=int, default=3, help='Throughput passes, the best is reported')
+    parser.add_argument('--load-repeat', type=int, default=3, help='Fresh interpreters timed per cold load')
+    parser.add_argument('--output', help='Write the report here instead of stdout')
+    parser.add_argument('--baseline', help='Earlier report to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='Largest fraction a metric may get worse than the baseline')
+    args = parser.parse_args()
+
+    inputs = {name: list(load_labeled(path)[0]) for name, path in input_paths.items()}
+    report = {'environment': environment(),
+              'inputs': {name: {'sentences': len(inputs[name]), 'sha1': file_digest(path)}
+                         for name, path in input_paths.items()},
+              'settings': {key: getattr(args, key) for key in
+                           ('requests', 'warmup', 'batch_sizes', 'throughput_sentences', 'repeat', 'load_repeat')},
+              'backends': {}}
+
+    for backend in args.backends:
+        print('Benchmarking {}'.format(backend), file=sys.stderr)
+        # multisvm reports conflicting heads on stdout, keep the report clean
+        with contextlib.redirect_stdout(sys.stderr):
+            report['backends'][backend] = benchmark(backend, inputs, args)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report['regressions'] = compare(report, json.load(f), args.tolerance)
+        for regression in report['regressions']:
+            print('Regression in {}: {} -> {} ({}%)'.format(regression['metric'], round(regression['baseline'], 4),
+                  round(regression['current'], 4), round(regression['change'] * 100, 1)), file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if report.get('regressions'):
+        exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import argparse, csv, json, os, subprocess, sys, time
+
+import numpy as np
+
+'''
+Compares the NumPy LSTM engine with Keras: startup time in a fresh interpreter, latency per
+batch size and the largest difference between their probabilities. Keras is skipped when it
+is not installed. Export the weights with Classifiers/export_lstm.py first. Eg:
+python benchmarks/lstm_engine.py --batch-sizes 1 16 64 256
+'''
+
+sam_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+classifiers_dir = sam_dir + '/Classifiers'
+sys.path.insert(0, classifiers_dir)
+
+from fast_tokenizer import FastTokenizer
+from lstm_numpy import NumpyLSTM
+
+model_path = classifiers_dir + '/Model/LSTM_model.h5'
+weights_path = classifiers_dir + '/Model/LSTM_weights.npz'
+tokenizer_path = classifiers_dir + '/Model/tokenizer.pickle'
+data_path = classifiers_dir + '/TrainingData/all_data.csv'
+
+max_text_length = 20
+
+# Imports the engine and loads the model, everything a server pays for before the first request
+startup_code = {
+    'numpy': 'from lstm_numpy import NumpyLSTM\nmodel = NumpyLSTM.load({weights!r})\n',
+    'keras': 'import keras\nmodel = keras.models.load_model({model!r})\n',
+}
+
+def measure_startup(engine):
+    code = ('import json, sys, time\n'
+            'start = time.perf_counter()\n'
+            'sys.path.insert(0, {dir!r})\n' + startup_code[engine] +
+            'print(json.dumps(time.perf_counter() - start))').format(
+                dir=classifiers_dir, weights=weights_path, model=model_path)
+    output = subprocess.check_output([sys.executable, '-c', code], stderr=subprocess.DEVNULL)
+    return json.loads(output.decode('utf-8').splitlines()[-1])
+
+def measure_latency(model, X, batch_size, repeat):
+    '''
+    Returns
+    -------
+    latency: Median milliseconds per batch and sentences per second
+    '''
+    batches = [X[i:i + batch_size] for i in range(0, len(X) - batch_size + 1, batch_size)][:repeat]
+    times = []
+    for batch in batches:
+        start = time.perf_counter()
+        model.predict(batch)
+        times.append(time.perf_counter() - start)
+    median = float(np.median(times))
+    return {'median_ms': median * 1000, 'sentences_per_second': batch_size / median}
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the NumPy LSTM engine against Keras')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 16, 64, 256])
+    parser.add_argument('--repeat', type=int, default=50, help='Batches timed per batch size')
+    args = parser.parse_args()
+
+    with open(data_path, encoding='utf-8-sig') as data:
+        sentences = [row[1] for row in csv.reader(data)]
+    X = FastTokenizer.from_pickle(tokenizer_path).encode(sentences, max_text_length)
+
+    engines = {'numpy': NumpyLSTM.load(weights_path)}
+    try:
+        import keras
+        engines['keras'] = keras.models.load_model(model_path)
+    except ImportError:
+        print('Keras is not installed, only the NumPy engine is measured', file=sys.stderr)
+
+    report = {'sentences': len(X)}
+    for name, model in engines.items():
+        # The first call warms up lazily built graphs and caches
+        model.predict(X[:1])
+        report[name] = {'startup_seconds': measure_startup(name),
+                        'latency': {size: measure_latency(model, X, size, args.repeat) for size in args.batch_sizes}}
+
+    if 'keras' in engines:
+        report['max_probability_difference'] = float(np.abs(engines['keras'].predict(X) - engines['numpy'].predict(X)).max())
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
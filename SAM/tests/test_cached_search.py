@@ -0,0 +1,111 @@
+import os, sys, tempfile, time, unittest
+import numpy as np
+
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+from sklearn.pipeline import Pipeline
+from sklearn.svm import LinearSVC
+
+'''
+Checks CachedGridSearch and HalvingSearch against GridSearchCV, and the on-disk fold cache.
+Run from the SAM folder with:
+python -m unittest discover tests
+'''
+
+sam_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, sam_dir + '/Classifiers')
+
+from cached_search import CachedGridSearch, FoldFeatureCache, HalvingSearch
+from featurizers import char_wb_featurizer
+
+words = ['good', 'great', 'love', 'bad', 'awful', 'hate', 'phone', 'store', 'today', 'nine']
+
+def corpus(n=120, seed=0):
+    rng = np.random.RandomState(seed)
+    X, y = [], []
+    for _ in range(n):
+        label = rng.randint(-1, 2)
+        mood = words[:3] if label > 0 else words[3:6] if label < 0 else words[6:]
+        X.append(' '.join(rng.choice(mood, 2).tolist() + rng.choice(words, 3).tolist()))
+        y.append(label)
+    return np.array(X), np.array(y)
+
+def pipeline():
+    return Pipeline([('tfidf', char_wb_featurizer('tfidf')), ('svm', LinearSVC())])
+
+# smooth_idf is only searched with idf, like classifier_svm's grid
+param_grid = [{'svm__C': (0.1, 1), 'tfidf__use_idf': (True,), 'tfidf__smooth_idf': (True, False)},
+              {'svm__C': (0.1, 1), 'tfidf__use_idf': (False,)}]
+
+def folds(X, y, seed=0):
+    return list(StratifiedKFold(3, shuffle=True, random_state=seed).split(X, y))
+
+class CachedGridSearchTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.X, cls.y = corpus()
+
+    def test_matches_grid_search(self):
+        expected = GridSearchCV(pipeline(), param_grid, cv=folds(self.X, self.y)).fit(self.X, self.y)
+        for n_jobs in (None, 2):
+            with self.subTest(n_jobs=n_jobs):
+                search = CachedGridSearch(pipeline(), param_grid, cv=folds(self.X, self.y), verbose=0, n_jobs=n_jobs)
+                search.fit(self.X, self.y)
+                self.assertEqual(6, len(search.cv_results_['params']))
+                np.testing.assert_allclose(search.cv_results_['mean_test_score'],
+                                           expected.cv_results_['mean_test_score'])
+                self.assertEqual(expected.best_params_, search.best_params_)
+
+    def test_featurizes_every_fold_once(self):
+        search = CachedGridSearch(pipeline(), param_grid, cv=folds(self.X, self.y), verbose=0).fit(self.X, self.y)
+        # One count matrix per fold, every weighting and C reuses it
+        self.assertEqual(3, search.cache_.misses)
+
+    def test_halving(self):
+        search = HalvingSearch(pipeline(), param_grid, cv=folds(self.X, self.y), verbose=0, n_jobs=2)
+        search.fit(self.X, self.y)
+        self.assertIn(search.best_params_, search.cv_results_['params'])
+        self.assertEqual(1.0, search.cv_results_['fraction'][search.best_index_])
+
+class FoldFeatureCacheTest(unittest.TestCase):
+
+    def test_seeded_folds_hit_the_disk_cache(self):
+        X, y = corpus()
+        vectorizer = char_wb_featurizer('tfidf')
+        with tempfile.TemporaryDirectory() as directory:
+            first = FoldFeatureCache(X, folds(X, y), directory)
+            expected = first.fold_data(vectorizer, 0)
+
+            again = FoldFeatureCache(X, folds(X, y), directory)
+            actual = again.fold_data(vectorizer, 0)
+            self.assertEqual(len(os.listdir(directory)), 2)
+            for e, a in zip(expected, actual):
+                self.assertEqual(0, (e != a).nnz)
+
+            # Other folds are other entries
+            FoldFeatureCache(X, folds(X, y, seed=1), directory).fold_data(vectorizer, 0)
+            self.assertEqual(len(os.listdir(directory)), 4)
+
+    def test_prune(self):
+        X, y = corpus()
+        vectorizer = char_wb_featurizer('tfidf')
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FoldFeatureCache(X, folds(X, y), directory)
+            cache.fold_data(vectorizer, 0)
+            entry = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+            # Room for about two entries, the least recently used ones go first
+            cache.max_bytes = int(entry * 2.5)
+            oldest = set(os.listdir(directory))
+            past = time.time() - 60
+            for name in oldest:
+                os.utime(os.path.join(directory, name), (past, past))
+            cache.fold_data(vectorizer, 1)
+            cache.fold_data(vectorizer, 2)
+            names = set(os.listdir(directory))
+            self.assertEqual(4, len(names))
+            self.assertFalse(oldest & names)
+            self.assertTrue(all(name.endswith(('.train.npz', '.test.npz')) for name in names))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import contextlib, io, os, subprocess, sys, time, unittest
+
+'''
+Checks that classifier_predictor's worker pool fails cleanly instead of hanging when the
+workers can not load the model. Run from the SAM folder with:
+python -m unittest discover tests
+'''
+
+sam_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, sam_dir + '/Classifiers')
+
+import classifier_predictor
+
+class Constant:
+    def predict(self, X):
+        return [1] * len(X)
+
+def failing_loader():
+    raise IOError('no model here')
+
+def slow_loader():
+    time.sleep(60)
+
+class StartPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = dict(classifier_predictor.registry)
+        classifier_predictor.registry.update({'-constant': Constant, '-failing': failing_loader, '-slow': slow_loader})
+
+    def tearDown(self):
+        classifier_predictor.registry.clear()
+        classifier_predictor.registry.update(self.registry)
+
+    def start_pool(self, classifier, timeout=30):
+        # The workers report their load times on stderr
+        with contextlib.redirect_stderr(io.StringIO()):
+            return classifier_predictor.start_pool(classifier, 2, timeout)
+
+    def test_loaded(self):
+        pool = self.start_pool('-constant')
+        try:
+            labels = [labels for _, labels in classifier_predictor.predict_parallel(pool, [['a', 'b'], ['c']], 2)]
+        finally:
+            pool.terminate()
+        self.assertEqual([[1, 1], [1]], labels)
+
+    def test_failing_worker(self):
+        start = time.perf_counter()
+        with self.assertRaisesRegex(RuntimeError, 'no model here'):
+            self.start_pool('-failing')
+        self.assertLess(time.perf_counter() - start, 10)
+
+    def test_timeout(self):
+        with self.assertRaisesRegex(RuntimeError, 'within'):
+            self.start_pool('-slow', timeout=0.5)
+
+class CommandLineTest(unittest.TestCase):
+
+    def run_predictor(self, *args):
+        return subprocess.run([sys.executable, sam_dir + '/Classifiers/classifier_predictor.py'] + list(args),
+                              input=b'a sentence\n', stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+
+    def test_unknown_classifier(self):
+        result = self.run_predictor('-bad', '--format', 'lines', '--jobs', '2')
+        self.assertEqual(1, result.returncode)
+        self.assertEqual(1, result.stdout.count(b'Please use one of the classifier arguments'))
+
+    def test_missing_artifacts(self):
+        # The trained pipelines are not part of the repository
+        if os.path.isfile(classifier_predictor.model_path + '/rf_pipeline.joblib'):
+            self.skipTest('rf_pipeline.joblib exists')
+        result = self.run_predictor('-rf', '--format', 'lines', '--jobs', '2')
+        self.assertEqual(1, result.returncode)
+        self.assertIn(b'Missing model file', result.stderr)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os, sys, tempfile, unittest
+import numpy as np
+
+'''
+Checks that FastTokenizer encodes sentences like the Keras Tokenizer and pad_sequences it replaces.
+None of the tests need Keras. Run from the SAM folder with:
+python -m unittest discover tests
+'''
+
+sam_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, sam_dir + '/Classifiers')
+
+from fast_tokenizer import FastTokenizer, KerasTokenizerState, tokenizer_path
+
+keras_filters = '!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n'
+
+def keras_state(word_index, num_words=None, oov_token=None, lower=True, split=' ', filters=keras_filters):
+    # What unpickling a fitted keras_preprocessing Tokenizer gives, see TokenizerUnpickler
+    state = KerasTokenizerState()
+    state.__setstate__({'word_index': word_index, 'num_words': num_words, 'oov_token': oov_token,
+                        'lower': lower, 'split': split, 'filters': filters, 'char_level': False})
+    return state
+
+# Keras gives the OOV token index 1 and ranks the other words by frequency
+oov_word_index = {'<OOV>': 1, 'the': 2, 'movie': 3, 'was': 4, 'great': 5, 'not': 6, 'bad': 7}
+
+class FastTokenizerTest(unittest.TestCase):
+
+    def test_encode(self):
+        tokenizer = FastTokenizer.from_keras(keras_state(oov_word_index, num_words=6, oov_token='<OOV>'))
+        X = tokenizer.encode(['The movie was GREAT!', 'great...the--movie', 'the\tmovie\nwas', '', '!!!'],
+                             maxlen=6)
+        self.assertEqual(np.int32, X.dtype)
+        np.testing.assert_array_equal(X, [[0, 0, 2, 3, 4, 5],
+                                          [0, 0, 0, 5, 2, 3],
+                                          [0, 0, 0, 2, 3, 4],
+                                          [0, 0, 0, 0, 0, 0],
+                                          [0, 0, 0, 0, 0, 0]])
+
+    def test_oov_and_num_words(self):
+        # Unknown words and words ranked at or past num_words become the OOV index
+        tokenizer = FastTokenizer.from_keras(keras_state(oov_word_index, num_words=6, oov_token='<OOV>'))
+        np.testing.assert_array_equal(tokenizer.encode(['not bad, the movie at all'], maxlen=8),
+                                      [[0, 0, 1, 1, 2, 3, 1, 1]])
+
+    def test_without_oov(self):
+        # Without an OOV token Keras drops those words
+        word_index = {'the': 1, 'movie': 2, 'was': 3, 'great': 4, 'bad': 5}
+        tokenizer = FastTokenizer.from_keras(keras_state(word_index, num_words=5))
+        self.assertEqual(4, len(tokenizer.words))
+        np.testing.assert_array_equal(tokenizer.encode(['the bad movie', 'so bad'], maxlen=4),
+                                      [[0, 0, 1, 2], [0, 0, 0, 0]])
+
+    def test_pre_truncation(self):
+        tokenizer = FastTokenizer.from_keras(keras_state(oov_word_index, oov_token='<OOV>'))
+        np.testing.assert_array_equal(tokenizer.encode(['the movie was not great'], maxlen=3), [[4, 6, 5]])
+
+    def test_case_sensitive(self):
+        tokenizer = FastTokenizer.from_keras(keras_state(oov_word_index, oov_token='<OOV>', lower=False))
+        np.testing.assert_array_equal(tokenizer.encode(['The movie', 'the Movie'], maxlen=3),
+                                      [[0, 1, 3], [0, 2, 1]])
+
+    def test_custom_filters_and_split(self):
+        tokenizer = FastTokenizer.from_keras(keras_state(oov_word_index, split=',', filters='!'))
+        self.assertEqual(['the movie', 'great'], tokenizer.tokenize('The Movie,,great!'))
+        self.assertEqual([[5]], tokenizer.texts_to_sequences(['The Movie,,great!']))
+
+    def test_json_round_trip(self):
+        tokenizer = FastTokenizer.from_keras(keras_state(oov_word_index, num_words=6, oov_token='<OOV>'))
+        sentences = ['The movie was GREAT!', 'not bad, the movie at all', 'émoji 😀 movie', '']
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tokenizer.json')
+            tokenizer.save(path)
+            loaded = FastTokenizer.load(path)
+        for name in ('words', 'filters', 'lower', 'split', 'oov_index', 'word_index'):
+            self.assertEqual(getattr(tokenizer, name), getattr(loaded, name))
+        np.testing.assert_array_equal(tokenizer.encode(sentences), loaded.encode(sentences))
+
+    @unittest.skipUnless(os.path.isfile(tokenizer_path), 'no trained tokenizer.pickle')
+    def test_trained_tokenizer_round_trip(self):
+        # The pickled Keras Tokenizer is read without Keras
+        tokenizer = FastTokenizer.from_pickle(tokenizer_path)
+        sentences = ['I love this phone', 'Worst. Service. Ever!!', 'qwertyuiop asdfgh']
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tokenizer.json')
+            tokenizer.save(path)
+            loaded = FastTokenizer.load(path)
+        self.assertEqual(tokenizer.word_index, loaded.word_index)
+        np.testing.assert_array_equal(tokenizer.encode(sentences), loaded.encode(sentences))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os, pickle, sys, unittest
+import numpy as np
+
+'''
+Checks that the cached char_wb vectorizers give bit-identical matrices to scikit-learn's.
+Run from the SAM folder with:
+python -m unittest discover tests
+'''
+
+sam_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, sam_dir + '/Classifiers')
+
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+from featurizers import CachedCharCountVectorizer, CachedCharTfidfVectorizer
+
+documents = [
+    'I love this phone, it is GREAT!!', 'love love love   love', 'Worst. Phone. Ever.',
+    'the the the the the', 'Tabs\tand\nnew lines', 'Émojis 😀 and accents: café, naïve', '', '   ',
+]
+
+unseen = ['love the phone', 'completely unseen words', 'café café café', 'the', '']
+
+class CachedCharVectorizerTest(unittest.TestCase):
+
+    def assert_identical(self, expected, actual):
+        self.assertEqual(expected.dtype, actual.dtype)
+        self.assertEqual(expected.shape, actual.shape)
+        # Both store the columns of a row in the order they were first seen, which may differ
+        expected, actual = expected.tocsr().sorted_indices(), actual.tocsr().sorted_indices()
+        np.testing.assert_array_equal(expected.indptr, actual.indptr)
+        np.testing.assert_array_equal(expected.indices, actual.indices)
+        # Bit for bit, not just close
+        np.testing.assert_array_equal(expected.data, actual.data)
+
+    def compare(self, cached, stock, documents=documents, unseen=unseen):
+        self.assert_identical(stock.fit_transform(documents), cached.fit_transform(documents))
+        self.assertEqual(stock.vocabulary_, cached.vocabulary_)
+        self.assert_identical(stock.transform(unseen), cached.transform(unseen))
+        # Transforming twice is served from the word cache
+        self.assert_identical(stock.transform(documents), cached.transform(documents))
+
+    def test_tfidf(self):
+        params = dict(analyzer='char_wb', ngram_range=(1, 10))
+        self.compare(CachedCharTfidfVectorizer(**params), TfidfVectorizer(**params))
+
+    def test_tfidf_settings(self):
+        for params in (dict(use_idf=False), dict(sublinear_tf=True, norm='l1'), dict(lowercase=False),
+                       dict(ngram_range=(2, 4), min_df=2), dict(max_features=50)):
+            with self.subTest(**params):
+                params = dict({'analyzer': 'char_wb', 'ngram_range': (1, 10)}, **params)
+                self.compare(CachedCharTfidfVectorizer(**params), TfidfVectorizer(**params))
+
+    def test_count(self):
+        params = dict(analyzer='char_wb', ngram_range=(1, 5))
+        self.compare(CachedCharCountVectorizer(**params), CountVectorizer(**params))
+
+    def test_repeated_words(self):
+        repeated = ['spam ' * 50, 'spam eggs spam eggs spam', 'eggs']
+        params = dict(analyzer='char_wb', ngram_range=(1, 10))
+        self.compare(CachedCharTfidfVectorizer(**params), TfidfVectorizer(**params), repeated, repeated[::-1])
+
+    def test_cache_eviction(self):
+        params = dict(analyzer='char_wb', ngram_range=(1, 10))
+        cached = CachedCharTfidfVectorizer(**params)
+        cached.cache_size = 2
+        self.compare(cached, TfidfVectorizer(**params))
+        self.assertLessEqual(len(cached._word_cache), 2)
+
+    def test_other_analyzers(self):
+        # Only char_wb is cached, the other analyzers are left to scikit-learn
+        for analyzer in ('word', 'char'):
+            with self.subTest(analyzer=analyzer):
+                self.compare(CachedCharTfidfVectorizer(analyzer=analyzer), TfidfVectorizer(analyzer=analyzer))
+
+    def test_refit_clears_cache(self):
+        params = dict(analyzer='char_wb', ngram_range=(1, 3))
+        cached, stock = CachedCharTfidfVectorizer(**params), TfidfVectorizer(**params)
+        self.compare(cached, stock)
+        self.compare(cached, stock, unseen, documents)
+
+    def test_pickle(self):
+        cached = CachedCharTfidfVectorizer(analyzer='char_wb', ngram_range=(1, 10)).fit(documents)
+        cached.transform(documents)
+        state = pickle.dumps(cached)
+        self.assertNotIn(b'_word_cache', state)
+        self.assert_identical(cached.transform(unseen), pickle.loads(state).transform(unseen))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import os, pickle, sys, tempfile, time, unittest
+import numpy as np
+
+'''
+Checks that a flat export predicts exactly what the model it was exported from predicts, the
+hash table lookups of its vocabulary and how loaders tell that an export is stale.
+Run from the SAM folder with:
+python -m unittest discover tests
+'''
+
+sam_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, sam_dir + '/Classifiers')
+
+from sklearn.pipeline import Pipeline
+from sklearn.svm import LinearSVC
+
+from featurizers import char_wb_featurizer
+from flat_model import FlatVocabulary, load_flat, save_flat
+from fused_linear import FusedLinearModel
+from model_sources import fingerprint, is_stale
+
+sentences = np.array([
+    'I love this phone, it is great', 'What a great day', 'Best purchase ever, love it',
+    'This is awful, I hate it', 'Terrible service and rude staff', 'Worst phone I ever had',
+    'The store opens at nine', 'It is a phone', 'Ünïcode café, naïve',
+], dtype=object)
+labels = np.array([1, 1, 1, -1, -1, -1, 0, 0, 0])
+
+unseen = ['love the great camera', 'awful awful staff', 'café opens at nine', 'zzz qqq', '']
+
+def fused_model(kind):
+    polar = labels != 0
+    heads = [Pipeline([('tfidf', char_wb_featurizer(kind, hash_bits=12)), ('svm', LinearSVC())]).fit(X, y)
+             for X, y in ((sentences, labels > 0), (sentences, labels < 0), (sentences, labels == 0),
+                          (sentences[polar], labels[polar]))]
+    return FusedLinearModel.from_pipelines(heads)
+
+class FlatModelTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = os.path.join(directory.name, 'flat')
+
+    def assert_same_model(self, expected, actual):
+        texts = list(sentences) + unseen
+        np.testing.assert_array_equal(expected.decision_function(texts), actual.decision_function(texts))
+        for e, a in zip(expected.predict(texts), actual.predict(texts)):
+            np.testing.assert_array_equal(e, a)
+
+    def test_round_trip(self):
+        for kind in ('tfidf', 'hashing'):
+            with self.subTest(kind=kind):
+                model = fused_model(kind)
+                model.sources = {'posSvm.joblib': {'size': 1, 'mtime_ns': 2, 'sha1': 'abc'}}
+                save_flat(model, self.directory)
+                loaded = load_flat(self.directory)
+                self.assertIsInstance(loaded.coef, np.memmap)
+                self.assertEqual(model.sources, loaded.sources)
+                self.assert_same_model(model, loaded)
+                self.assert_same_model(model, load_flat(self.directory, mmap_mode=None))
+
+    def test_quantized_round_trip(self):
+        model = fused_model('tfidf').compact(0.0).quantize('int8')
+        save_flat(model, self.directory)
+        loaded = load_flat(self.directory)
+        self.assertEqual(np.int8, loaded.coef.dtype)
+        self.assert_same_model(model, loaded)
+
+    def test_pickled_model(self):
+        # Worker processes get the model pickled, the vocabulary opens the same files again
+        save_flat(fused_model('tfidf'), self.directory)
+        loaded = load_flat(self.directory)
+        self.assert_same_model(loaded, pickle.loads(pickle.dumps(loaded)))
+
+    def test_half_written_export(self):
+        save_flat(fused_model('tfidf'), self.directory)
+        os.remove(os.path.join(self.directory, 'manifest.json'))
+        with self.assertRaises(FileNotFoundError):
+            load_flat(self.directory)
+
+class FlatVocabularyTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        cls.model = fused_model('tfidf')
+        save_flat(cls.model, directory.name)
+        cls.expected = cls.model.vectorizer.get_params()['vocabulary']
+        cls.vocabulary = FlatVocabulary(directory.name)
+
+    def test_lookup(self):
+        self.assertEqual(len(self.expected), len(self.vocabulary))
+        # Rows are stored in term order
+        self.assertEqual(sorted(self.expected), list(self.vocabulary))
+        for row, term in enumerate(sorted(self.expected)):
+            self.assertEqual(row, self.vocabulary[term])
+            self.assertIn(term, self.vocabulary)
+            self.assertEqual(term, self.vocabulary.term(row))
+
+    def test_missing_terms(self):
+        for term in ('zzz', 'café!', '', ' ' * 40):
+            self.assertNotIn(term, self.vocabulary)
+            self.assertIsNone(self.vocabulary.get(term))
+            self.assertEqual(-1, self.vocabulary.get(term, -1))
+            with self.assertRaises(KeyError):
+                self.vocabulary[term]
+
+    def test_indices_skip_unknown_terms(self):
+        known = sorted(self.expected)[:3]
+        terms = [known[0], 'zzz', known[1], known[2], 'qqq']
+        np.testing.assert_array_equal([0, 1, 2], self.vocabulary.indices(terms))
+        self.assertEqual(0, len(self.vocabulary.indices([])))
+
+class StaleTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.paths = [os.path.join(self.root, name) for name in ('posSvm.joblib', 'negSvm.joblib')]
+        for path in self.paths:
+            self.write(path, b'weights of ' + os.path.basename(path).encode('utf-8'))
+        self.sources = fingerprint(self.paths, self.root)
+
+    def write(self, path, content):
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    def touch(self, path, seconds=10):
+        # Later than the recorded mtime, however coarse the file system's timestamps are
+        later = os.path.getmtime(path) + seconds
+        os.utime(path, (later, later))
+
+    def test_fingerprint(self):
+        self.assertEqual({'posSvm.joblib', 'negSvm.joblib'}, set(self.sources))
+        self.assertEqual(len(b'weights of posSvm.joblib'), self.sources['posSvm.joblib']['size'])
+        self.assertFalse(is_stale(self.sources, self.paths, self.root, 0))
+
+    def test_touched_sources(self):
+        # Copied or touched artifacts with the same content are still the ones exported
+        for path in self.paths:
+            self.touch(path)
+        self.assertFalse(is_stale(self.sources, self.paths, self.root, 0))
+
+    def test_retrained_sources(self):
+        # Same size, so only the content tells
+        self.write(self.paths[0], b'weights of posSvm.joblob')
+        self.touch(self.paths[0])
+        self.assertTrue(is_stale(self.sources, self.paths, self.root, 0))
+
+    def test_resized_sources(self):
+        self.write(self.paths[1], b'more weights')
+        self.assertTrue(is_stale(self.sources, self.paths, self.root, 0))
+
+    def test_other_sources(self):
+        other = os.path.join(self.root, 'neuSvm.joblib')
+        self.write(other, b'weights of neuSvm.joblib')
+        self.assertTrue(is_stale(self.sources, self.paths + [other], self.root, 0))
+        self.assertTrue(is_stale(self.sources, self.paths[:1], self.root, 0))
+
+    def test_missing_sources(self):
+        # Without the artifacts the export is all there is
+        for path in self.paths:
+            os.remove(path)
+        self.assertFalse(is_stale(self.sources, self.paths, self.root, 0))
+
+    def test_no_recorded_sources(self):
+        # Older exports recorded nothing, the mtimes decide
+        exported = time.time() + 60
+        self.assertFalse(is_stale(None, self.paths, self.root, exported))
+        self.touch(self.paths[0], 120)
+        self.assertTrue(is_stale(None, self.paths, self.root, exported))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import contextlib, io, os, sys, unittest
+import numpy as np
+
+'''
+Checks that the fused multisvm heads predict exactly what the separate pipelines predict.
+Run from the SAM folder with:
+python -m unittest discover tests
+'''
+
+sam_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, sam_dir + '/Classifiers')
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.pipeline import Pipeline
+from sklearn.svm import LinearSVC
+
+from featurizers import char_wb_featurizer
+from fused_linear import FusedLinearModel
+import multisvm
+
+sentences = np.array([
+    'I love this phone, it is great', 'What a great day', 'Best purchase ever, love it',
+    'This is awful, I hate it', 'Terrible service and rude staff', 'Worst phone I ever had',
+    'The store opens at nine', 'It is a phone', 'The meeting is on Tuesday',
+    'Great camera but awful battery', 'I hate that I love it', 'Nothing special, it works',
+], dtype=object)
+labels = np.array([1, 1, 1, -1, -1, -1, 0, 0, 0, 1, -1, 0])
+
+unseen = ['love the great camera', 'awful awful staff', 'opens on Tuesday', 'zzz qqq', '']
+
+def fit_heads(featurizer, classifier):
+    '''
+    Returns
+    -------
+    heads: The positive, negative, neutral and polarity pipelines, trained like multisvm's heads
+    '''
+    polar = labels != 0
+    heads = []
+    for X, y in ((sentences, labels > 0), (sentences, labels < 0), (sentences, labels == 0),
+                 (sentences[polar], labels[polar])):
+        heads.append(Pipeline([('tfidf', featurizer()), ('svm', classifier())]).fit(X, y))
+    return heads
+
+def reference_label(pos, neg, neu, polarity):
+    # How multisvm.predict combined the heads before they were fused
+    if not(pos) and not(neg) and neu:
+        return 0
+    if pos and neg and not(neu):
+        return polarity
+    if pos:
+        return 1
+    if neg:
+        return -1
+    return 0
+
+def reference_combine(heads, sentences):
+    # One sentence at a time through the separate pipelines
+    is_pos, is_neg, is_neu, polarizer = heads
+    return [reference_label(is_pos.predict([s])[0], is_neg.predict([s])[0], is_neu.predict([s])[0],
+                            polarizer.predict([s])[0]) for s in sentences]
+
+def small_tfidf(**params):
+    return lambda: TfidfVectorizer(ngram_range=(1, 4), analyzer='char_wb', **params)
+
+class FusedLinearModelTest(unittest.TestCase):
+
+    def assert_same_as_heads(self, fused, heads, texts):
+        decisions = fused.decision_function(texts)
+        for (start, stop), head in zip(fused.head_slices, heads):
+            expected = head.decision_function(texts).reshape(len(texts), -1)
+            np.testing.assert_allclose(decisions[:, start:stop], expected, rtol=1e-9, atol=1e-12)
+        for predicted, head in zip(fused.predict(texts), heads):
+            np.testing.assert_array_equal(predicted, head.predict(texts))
+
+    def assert_same_as_combine(self, fused, heads, texts):
+        with contextlib.redirect_stdout(io.StringIO()):
+            combined = multisvm.combine(texts, *fused.predict(texts))
+        self.assertEqual(reference_combine(heads, texts), combined.tolist())
+
+    def test_combine(self):
+        # Every combination of head labels, the fitted heads above do not produce all of them
+        cases = np.array([(pos, neg, neu, polarity) for pos in (False, True) for neg in (False, True)
+                          for neu in (False, True) for polarity in (-1, 1)])
+        pos, neg, neu, polarity = cases.T
+        with contextlib.redirect_stdout(io.StringIO()):
+            combined = multisvm.combine(['sentence'] * len(cases), pos, neg, neu, polarity)
+        self.assertEqual([reference_label(*case) for case in cases.tolist()], combined.tolist())
+
+    def test_multisvm_featurizer(self):
+        heads = fit_heads(lambda: char_wb_featurizer('tfidf'), LinearSVC)
+        fused = FusedLinearModel.from_pipelines(heads)
+        for texts in (list(sentences), unseen):
+            self.assert_same_as_heads(fused, heads, texts)
+            self.assert_same_as_combine(fused, heads, texts)
+
+    def test_idf_differs_between_heads(self):
+        # use_idf and smooth_idf may differ per head, the idf weights are folded into the columns
+        featurizers = iter([small_tfidf(use_idf=True), small_tfidf(use_idf=False),
+                            small_tfidf(use_idf=True, smooth_idf=False), small_tfidf(sublinear_tf=False)])
+        heads = fit_heads(lambda: next(featurizers)(), LinearSVC)
+        fused = FusedLinearModel.from_pipelines(heads)
+        self.assert_same_as_heads(fused, heads, list(sentences) + unseen)
+        self.assert_same_as_combine(fused, heads, list(sentences) + unseen)
+
+    def test_sublinear_l1(self):
+        heads = fit_heads(small_tfidf(sublinear_tf=True, norm='l1'), LinearSVC)
+        self.assert_same_as_heads(FusedLinearModel.from_pipelines(heads), heads, list(sentences) + unseen)
+
+    def test_hashing(self):
+        heads = fit_heads(lambda: char_wb_featurizer('hashing', hash_bits=12), LinearSVC)
+        fused = FusedLinearModel.from_pipelines(heads)
+        self.assert_same_as_heads(fused, heads, list(sentences) + unseen)
+        self.assert_same_as_combine(fused, heads, list(sentences) + unseen)
+
+    def test_mismatched_vectorizers(self):
+        heads = fit_heads(small_tfidf(), LinearSVC)
+        heads[1] = Pipeline([('tfidf', small_tfidf(lowercase=False)()), ('svm', LinearSVC())]).fit(
+            sentences, labels < 0)
+        with self.assertRaises(ValueError):
+            FusedLinearModel.from_pipelines(heads)
+
+    def test_compact(self):
+        # Without a norm, features that no head weighs do not change any decision
+        heads = fit_heads(small_tfidf(norm=None), lambda: LinearSVC(penalty='l1', dual=False, C=0.5))
+        fused = FusedLinearModel.from_pipelines(heads)
+        compact = fused.compact(0.0)
+        self.assertLess(compact.n_features, fused.n_features)
+        self.assert_same_as_heads(compact, heads, list(sentences) + unseen)
+        self.assert_same_as_combine(compact, heads, list(sentences) + unseen)
+
+    def test_compact_keeps_weighted_features(self):
+        heads = fit_heads(lambda: char_wb_featurizer('tfidf'), LinearSVC)
+        fused = FusedLinearModel.from_pipelines(heads)
+        compact = fused.compact(0.0)
+        self.assertEqual(np.count_nonzero(np.abs(fused.coef).max(axis=1)), compact.n_features)
+        np.testing.assert_allclose(compact.decision_function(unseen), fused.decision_function(unseen),
+                                   rtol=1e-9, atol=1e-12)
+
+    def test_float16(self):
+        heads = fit_heads(lambda: char_wb_featurizer('tfidf'), LinearSVC)
+        fused = FusedLinearModel.from_pipelines(heads)
+        texts = list(sentences) + unseen
+        for quantized in (fused.quantize('float16'), fused.compact(0.0).quantize('float16')):
+            self.assertEqual(np.float16, quantized.coef.dtype)
+            decisions = fused.decision_function(texts)
+            np.testing.assert_allclose(quantized.decision_function(texts), decisions, atol=2e-3)
+            # Labels may only flip where the full precision decision is within rounding of zero
+            clear = np.abs(decisions) > 2e-3
+            for (start, stop), predicted, head in zip(fused.head_slices, quantized.predict(texts), heads):
+                if stop - start == 1:
+                    rows = clear[:, start]
+                    np.testing.assert_array_equal(predicted[rows], head.predict(texts)[rows])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os, shutil, sys, tempfile, unittest
+
+from unittest import mock
+
+'''
+Checks the CSV parsing, the label schemes and the parse cache of labeled_data.
+Run from the SAM folder with:
+python -m unittest discover tests
+'''
+
+sam_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, sam_dir + '/Classifiers')
+
+import labeled_data
+
+# A byte order mark, quoted commas and newlines, non-ASCII text and an extra column
+content = ('﻿2,Great phone\n'
+           '0,"Opens at nine, closes at five"\n'
+           '-3,"Awful.\nJust awful"\n'
+           '1,Ünïcode café,extra\n'
+           '0,\n')
+rows = [('Great phone', 2), ('Opens at nine, closes at five', 0), ('Awful.\nJust awful', -3),
+        ('Ünïcode café', 1), ('', 0)]
+
+class LabeledDataTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.cache_dir = os.path.join(directory, 'cache')
+        self.path = os.path.join(directory, 'data.csv')
+        self.write(content)
+
+    def write(self, text):
+        with open(self.path, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+
+    def test_parse(self):
+        for cache_dir in (None, self.cache_dir):
+            with self.subTest(cache_dir=cache_dir):
+                X, y = labeled_data.load_labeled(self.path, 'raw', cache_dir)
+                self.assertEqual(object, X.dtype)
+                self.assertEqual(rows, list(zip(X.tolist(), y.tolist())))
+
+    def test_schemes(self):
+        sentences = [sentence for sentence, _ in rows]
+        X, y = labeled_data.load_labeled(self.path, cache_dir=None)
+        self.assertEqual(sentences, X.tolist())
+        self.assertEqual([1, 0, -1, 1, 0], y.tolist())
+
+        X, y = labeled_data.load_labeled(self.path, 'binary', cache_dir=None)
+        self.assertEqual([sentences[0], sentences[2], sentences[3]], X.tolist())
+        self.assertEqual([1, -1, 1], y.tolist())
+
+        with self.assertRaises(ValueError):
+            labeled_data.load_labeled(self.path, 'five_class', cache_dir=None)
+
+    def test_iter_labeled(self):
+        for scheme in labeled_data.label_schemes:
+            with self.subTest(scheme=scheme):
+                X, y = labeled_data.load_labeled(self.path, scheme, self.cache_dir)
+                self.assertEqual(list(zip(X.tolist(), y.tolist())),
+                                 list(labeled_data.iter_labeled(self.path, scheme, self.cache_dir)))
+
+    def test_cache_hit(self):
+        labeled_data.load_labeled(self.path, cache_dir=self.cache_dir)
+        with mock.patch.object(labeled_data, 'parse_csv', side_effect=AssertionError('parsed again')), \
+             mock.patch.object(labeled_data, 'file_digest', side_effect=AssertionError('hashed again')):
+            X, _ = labeled_data.load_labeled(self.path, cache_dir=self.cache_dir)
+        self.assertEqual(rows[0][0], X[0])
+
+    def test_touched_file_is_only_hashed(self):
+        labeled_data.load_labeled(self.path, cache_dir=self.cache_dir)
+        later = os.path.getmtime(self.path) + 10
+        os.utime(self.path, (later, later))
+        with mock.patch.object(labeled_data, 'parse_csv', side_effect=AssertionError('parsed again')):
+            X, _ = labeled_data.load_labeled(self.path, cache_dir=self.cache_dir)
+        self.assertEqual(rows[0][0], X[0])
+
+    def test_changed_file_is_parsed_again(self):
+        labeled_data.load_labeled(self.path, cache_dir=self.cache_dir)
+        # An unchanged size and mtime is trusted without hashing, a new mtime makes the content decide
+        mtime = os.stat(self.path).st_mtime_ns
+        self.write(content.replace('Great', 'Fine!'))
+        os.utime(self.path, ns=(mtime, mtime))
+        self.assertEqual('Great phone', labeled_data.load_labeled(self.path, cache_dir=self.cache_dir)[0][0])
+
+        later = mtime + 10 * 10**9
+        os.utime(self.path, ns=(later, later))
+        self.assertEqual('Fine! phone', labeled_data.load_labeled(self.path, cache_dir=self.cache_dir)[0][0])
+
+    def test_file_digest(self):
+        digest = labeled_data.file_digest(self.path)
+        self.assertEqual(40, len(digest))
+        self.write(content + '1,More\n')
+        self.assertNotEqual(digest, labeled_data.file_digest(self.path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os, sys, tempfile, unittest
+import numpy as np
+
+'''
+Checks the NumPy LSTM engine on exported float32, float16 and int8 weights against a
+step-by-step reference of the Keras model. None of the tests need Keras. Run from the SAM folder with:
+python -m unittest discover tests
+'''
+
+sam_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, sam_dir + '/Classifiers')
+
+import quantization
+from lstm_numpy import NumpyLSTM
+from model_sources import fingerprint, is_stale
+
+# Same names and scale axes as export_lstm.py, which imports Keras itself
+weight_names = ['embedding', 'lstm_kernel', 'lstm_recurrent_kernel', 'lstm_bias', 'dense_kernel', 'dense_bias']
+scale_axes = {'embedding': 1, 'lstm_kernel': 0, 'lstm_recurrent_kernel': 0, 'dense_kernel': 0}
+config = {'mask_zero': True, 'activation': 'tanh', 'recurrent_activation': 'hard_sigmoid',
+          'dense_activation': 'sigmoid'}
+
+def random_weights(vocabulary=60, dim=8, units=5, seed=0):
+    rng = np.random.RandomState(seed)
+    shapes = [(vocabulary, dim), (dim, 4 * units), (units, 4 * units), (4 * units,), (units, 1), (1,)]
+    return {name: rng.normal(0, 0.5, shape) for name, shape in zip(weight_names, shapes)}
+
+def reference_predict(weights, X):
+    # One sentence and one step at a time in float64, like Keras 2 runs the model
+    hard_sigmoid = lambda x: np.clip(0.2 * x + 0.5, 0, 1)
+    units = weights['lstm_recurrent_kernel'].shape[0]
+    probabilities = []
+    for sentence in X:
+        h, c = np.zeros(units), np.zeros(units)
+        for index in sentence:
+            if index == 0:
+                continue
+            z = weights['embedding'][index] @ weights['lstm_kernel'] + h @ weights['lstm_recurrent_kernel'] \
+                + weights['lstm_bias']
+            i, f = hard_sigmoid(z[:units]), hard_sigmoid(z[units:2 * units])
+            g, o = np.tanh(z[2 * units:3 * units]), hard_sigmoid(z[3 * units:])
+            c = f * c + i * g
+            h = o * np.tanh(c)
+        probabilities.append(1 / (1 + np.exp(-(h @ weights['dense_kernel'] + weights['dense_bias']))))
+    return np.array(probabilities)
+
+class NumpyLSTMTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.weights = random_weights()
+        rng = np.random.RandomState(1)
+        X = rng.randint(1, 60, size=(40, 12))
+        # Pre-padding of different lengths, and one sentence without known words
+        for row, padding in enumerate(rng.randint(0, 12, size=len(X))):
+            X[row, :padding] = 0
+        X[0] = 0
+        cls.X = X
+        cls.expected = reference_predict(cls.weights, X)
+
+    def export(self, precision):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'LSTM_weights.npz')
+            quantization.save_quantized(path, self.weights, scale_axes, precision, config)
+            return NumpyLSTM.load(path)
+
+    def test_float32(self):
+        model = self.export('float32')
+        np.testing.assert_allclose(model.predict(self.X), self.expected, atol=1e-5)
+        np.testing.assert_array_equal(model.predict_classes(self.X), (self.expected > 0.5).astype(np.int32))
+
+    def test_reduced_precision(self):
+        # The embedding is kept in the exported precision, only the looked up rows are converted
+        for precision, dtype, tolerance in (('float16', np.float16, 2e-3), ('int8', np.int8, 2e-2)):
+            with self.subTest(precision=precision):
+                model = self.export(precision)
+                self.assertEqual(dtype, model.embedding.dtype)
+                self.assertEqual(precision == 'int8', model.embedding_scale is not None)
+                np.testing.assert_allclose(model.predict(self.X), self.expected, atol=tolerance)
+
+    def test_stale_after_retrain(self):
+        # Like export_lstm.py records the Keras model and tokenizer, and lstm.py checks them
+        with tempfile.TemporaryDirectory() as directory:
+            sources = [os.path.join(directory, name) for name in ('LSTM_model.h5', 'tokenizer.pickle')]
+            for path in sources:
+                with open(path, 'wb') as f:
+                    f.write(b'trained')
+            path = os.path.join(directory, 'LSTM_weights.npz')
+            quantization.save_quantized(path, self.weights, scale_axes, 'float16',
+                                        dict(config, sources=fingerprint(sources, directory)))
+            recorded = quantization.load_config(path)['sources']
+            self.assertFalse(is_stale(recorded, sources, directory, os.path.getmtime(path)))
+
+            with open(sources[1], 'wb') as f:
+                f.write(b'retrained')
+            self.assertTrue(is_stale(recorded, sources, directory, os.path.getmtime(path)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import contextlib, io, json, os, sys, tempfile, unittest
+import numpy as np
+
+from unittest import mock
+
+'''
+Checks that the heads trained in parallel on the shared matrix are the heads trained one by one,
+and the versioned saving of the heads that multisvm reads.
+Run from the SAM folder with:
+python -m unittest discover tests
+'''
+
+sam_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, sam_dir + '/Classifiers')
+
+from sklearn.svm import LinearSVC
+
+from featurizers import char_wb_featurizer
+import multisvm, parallel_heads
+
+sentences = np.array([
+    'I love this phone, it is great', 'What a great day', 'Best purchase ever, love it',
+    'This is awful, I hate it', 'Terrible service and rude staff', 'Worst phone I ever had',
+    'The store opens at nine', 'It is a phone', 'The meeting is on Tuesday',
+    'Great camera but awful battery', 'I hate that I love it', 'Nothing special, it works',
+], dtype=object)
+labels = np.array([1, 1, 1, -1, -1, -1, 0, 0, 0, 1, -1, 0])
+
+def classifier():
+    # Seeded like multisvm.train_parallel, see parallel_heads.train_heads
+    return LinearSVC(random_state=0)
+
+def train(n_jobs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return parallel_heads.train_heads(sentences, labels, char_wb_featurizer('tfidf'), classifier(), n_jobs)
+
+class TrainHeadsTest(unittest.TestCase):
+
+    def test_head_rows(self):
+        heads = parallel_heads.head_rows(labels)
+        self.assertEqual(parallel_heads.head_names, list(heads))
+        rows, polarity = heads['polarity']
+        np.testing.assert_array_equal(np.flatnonzero(labels != 0), rows)
+        np.testing.assert_array_equal(labels[labels != 0], polarity)
+        np.testing.assert_array_equal(labels == 0, heads['neuSvm'][1])
+
+    def test_matches_sequential_training(self):
+        # Featurized the way train_heads featurizes
+        X = char_wb_featurizer('tfidf').fit_transform(sentences)
+        for n_jobs in (1, 2):
+            with self.subTest(n_jobs=n_jobs):
+                pipelines = train(n_jobs)
+                self.assertEqual(parallel_heads.head_names, list(pipelines))
+                # The heads share one fitted vectorizer
+                self.assertEqual(1, len({id(p.named_steps['tfidf']) for p in pipelines.values()}))
+                for name, (rows, y) in parallel_heads.head_rows(labels).items():
+                    expected = classifier().fit(X[rows], y)
+                    np.testing.assert_array_equal(expected.coef_, pipelines[name].named_steps['svm'].coef_)
+                    np.testing.assert_array_equal(expected.predict(X), pipelines[name].predict(sentences))
+
+    def test_evaluate(self):
+        scores = parallel_heads.evaluate(train(1), sentences, labels)
+        self.assertEqual(set(parallel_heads.head_names), set(scores))
+        self.assertTrue(all(0 <= score <= 1 for score in scores.values()))
+
+class SaveHeadsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pipelines = train(1)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.modelpath = directory.name + '/'
+
+    def manifest(self):
+        with open(os.path.join(self.modelpath, parallel_heads.manifest_name)) as f:
+            return json.load(f)
+
+    def versions(self):
+        return sorted(os.listdir(os.path.join(self.modelpath, parallel_heads.heads_dir_name)))
+
+    def test_save_points_at_new_version(self):
+        paths = parallel_heads.save_heads(self.pipelines, self.modelpath)
+        manifest = self.manifest()
+        self.assertEqual([manifest['version']], self.versions())
+        for name in parallel_heads.head_names:
+            self.assertEqual(os.path.join(self.modelpath, manifest['heads'][name]), paths[name])
+            self.assertTrue(os.path.isfile(paths[name]))
+
+    def test_keeps_previous_version_only(self):
+        versions = []
+        for _ in range(3):
+            parallel_heads.save_heads(self.pipelines, self.modelpath)
+            versions.append(self.manifest()['version'])
+        self.assertEqual(3, len(set(versions)))
+        self.assertEqual(sorted(versions[1:]), self.versions())
+
+    def test_multisvm_reads_the_pointer(self):
+        with mock.patch.object(multisvm, 'modelpath', self.modelpath), \
+             mock.patch.object(multisvm, 'heads_manifest_path', self.modelpath + parallel_heads.manifest_name):
+            # Heads saved before versioning live in Model itself
+            self.assertEqual([self.modelpath + name + '.joblib' for name in multisvm.head_names],
+                             multisvm.head_paths())
+            paths = parallel_heads.save_heads(self.pipelines, self.modelpath)
+            self.assertEqual([paths[name] for name in multisvm.head_names], multisvm.head_paths())
+
+if __name__ == '__main__':
+    unittest.main()
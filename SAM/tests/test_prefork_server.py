@@ -0,0 +1,87 @@
+import os, signal, socket, struct, subprocess, sys, tempfile, time, unittest
+
+'''
+Runs PythonServer.prefork_server in a subprocess with a stand-in model and checks that it gets
+ready, serves on every worker and stops cleanly, also when a worker dies while starting up.
+Run from the SAM folder with:
+python -m unittest discover tests
+'''
+
+sam_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# Serves len(sentence) as the label. With a flag path, the first worker to start exits at once
+script = '''
+import os, sys
+sys.path.insert(0, {sam_dir!r})
+import PythonServer
+
+class Length:
+    def predict(self, sentences):
+        return [len(sentence) for sentence in sentences]
+
+PythonServer.clf = Length()
+
+create_socket, server = PythonServer.create_socket, PythonServer.server
+def announce(host, port):
+    sock = create_socket(host, port)
+    print('PORT', sock.getsockname()[1], flush=True)
+    return sock
+def die_first(**kwargs):
+    if {flag!r}:
+        try:
+            os.close(os.open({flag!r}, os.O_CREAT | os.O_EXCL))
+        except FileExistsError:
+            pass
+        else:
+            os._exit(3)
+    server(**kwargs)
+PythonServer.create_socket = announce
+PythonServer.server = die_first
+PythonServer.ready_signaler = lambda: print('READY', flush=True)
+PythonServer.prefork_server({workers}, port=0)
+'''
+
+header = struct.Struct('>I')
+
+def request(port, sentence):
+    with socket.create_connection(('127.0.0.1', port), timeout=10) as connection:
+        payload = b'S' + sentence.encode('utf-8')
+        connection.sendall(header.pack(len(payload)) + payload)
+        size, = header.unpack(connection.recv(header.size, socket.MSG_WAITALL))
+        return connection.recv(size, socket.MSG_WAITALL).decode('utf-8')
+
+class PreforkServerTest(unittest.TestCase):
+
+    def start(self, workers, flag=''):
+        process = subprocess.Popen([sys.executable, '-c', script.format(sam_dir=sam_dir, flag=flag, workers=workers)],
+                                   cwd=sam_dir, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.addCleanup(process.kill)
+        self.addCleanup(process.stdout.close)
+        return process
+
+    def read_line(self, process):
+        return process.stdout.readline().decode('utf-8').strip()
+
+    def test_serves_and_stops(self):
+        process = self.start(3)
+        port = int(self.read_line(process).split()[1])
+        self.assertEqual('READY', self.read_line(process))
+        self.assertEqual(['5', '3'], [request(port, 'hello'), request(port, 'hej')])
+
+        process.send_signal(signal.SIGTERM)
+        self.assertEqual(128 + signal.SIGTERM, process.wait(timeout=20))
+        with self.assertRaises(OSError):
+            request(port, 'hello')
+
+    def test_worker_dies_before_ready(self):
+        with tempfile.TemporaryDirectory() as directory:
+            process = self.start(3, os.path.join(directory, 'died'))
+            start = time.perf_counter()
+            self.assertEqual(1, process.wait(timeout=20))
+            self.assertLess(time.perf_counter() - start, 15)
+            output = process.stdout.read().decode('utf-8')
+            self.assertIn('exited before it was ready', output)
+            self.assertNotIn('READY', output)
+
+if __name__ == '__main__':
+    unittest.main()
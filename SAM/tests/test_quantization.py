@@ -0,0 +1,43 @@
+import os, sys, unittest
+import numpy as np
+import scipy.sparse as sp
+
+'''
+Checks quantization.sparse_dot against the dense product of the dequantized weights.
+Run from the SAM folder with:
+python -m unittest discover tests
+'''
+
+sam_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, sam_dir + '/Classifiers')
+
+import quantization
+
+class SparseDotTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.RandomState(0)
+        cls.X = sp.random(50, 200, density=0.05, format='csr', random_state=rng)
+        # Rows without any nonzero and a row with many
+        cls.X[3] = 0
+        cls.X[10, :120] = rng.rand(120)
+        cls.X.eliminate_zeros()
+        cls.weights = rng.normal(0, 1, (200, 4))
+
+    def test_reduced_precision(self):
+        for precision in quantization.precisions:
+            values, scale = quantization.quantize(self.weights, precision, axis=0)
+            expected = self.X.toarray() @ quantization.dequantize(values, scale, np.float64)
+            # One row per chunk, several rows per chunk, the whole batch in one chunk
+            for chunk_nnz in (1, 16, 1 << 16):
+                with self.subTest(precision=precision, chunk_nnz=chunk_nnz):
+                    actual = quantization.sparse_dot(self.X, values, scale, chunk_nnz)
+                    np.testing.assert_allclose(actual, expected, rtol=1e-6, atol=1e-9)
+
+    def test_empty_batch(self):
+        values, scale = quantization.quantize(self.weights, 'int8', axis=0)
+        self.assertEqual((0, 4), quantization.sparse_dot(self.X[:0], values, scale).shape)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,233 @@
+import asyncio, json, os, struct, sys, unittest
+
+from concurrent.futures import ThreadPoolExecutor
+
+'''
+Checks the wire protocol, the prediction cache and the batching of PythonServer with a stand-in model.
+Run from the SAM folder with:
+python -m unittest discover tests
+'''
+
+sam_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, sam_dir)
+
+import PythonServer
+from PythonServer import BatchScheduler, PredictionCache
+
+class Recorder:
+    '''
+    Labels every sentence with the text the model saw, and records the batches
+    '''
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, sentences):
+        self.batches.append(list(sentences))
+        return ['<{}>'.format(sentence) for sentence in sentences]
+
+def run(coroutine):
+    # Every test gets its own event loop and gives up instead of hanging
+    return asyncio.run(asyncio.wait_for(coroutine, 10))
+
+async def label_each(model, cache_size, sentences):
+    '''
+    Submits the sentences one after another to a scheduler over model
+    Returns
+    -------
+    labels: The label of every sentence
+    '''
+    # The scheduler's queue belongs to the running event loop, so it is made in here
+    with ThreadPoolExecutor(1) as executor:
+        scheduler = BatchScheduler(model.predict, executor, cache=PredictionCache(cache_size, 'v1'))
+        runner = asyncio.ensure_future(scheduler.run())
+        try:
+            return [(await scheduler.submit([sentence]))[0] for sentence in sentences]
+        finally:
+            runner.cancel()
+
+class ProtocolTest(unittest.TestCase):
+
+    def test_single(self):
+        self.assertEqual((['héllo'], False), PythonServer.decode_request(b'S' + 'héllo'.encode('utf-8')))
+        self.assertEqual(b'1', PythonServer.encode_response([1], False))
+
+    def test_batch(self):
+        sentences = ['héllo', '', 'a, b\nc']
+        payload = b'B' + PythonServer.encode_strings(sentences)
+        self.assertEqual((sentences, True), PythonServer.decode_request(payload))
+        self.assertEqual(['1', '0', '-1'], PythonServer.decode_strings(PythonServer.encode_response([1, 0, -1], True)))
+        self.assertEqual(([], True), PythonServer.decode_request(b'B' + PythonServer.encode_strings([])))
+
+    def test_malformed(self):
+        with self.assertRaises(ValueError):
+            PythonServer.decode_request(b'X')
+        # A string running past the end of the frame
+        with self.assertRaises(ValueError):
+            PythonServer.decode_request(b'B' + struct.pack('>II', 1, 10) + b'short')
+        with self.assertRaises(struct.error):
+            PythonServer.decode_request(b'B' + struct.pack('>I', 2))
+
+    def test_frames(self):
+        async def read(data):
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            return [await PythonServer.read_frame(reader), await PythonServer.read_frame(reader)]
+
+        frame = PythonServer.encode_frame(b'Shello')
+        self.assertEqual([b'Shello', None], run(read(frame)))
+        with self.assertRaises(ValueError):
+            run(read(struct.pack('>I', PythonServer.MAX_FRAME_SIZE + 1)))
+        with self.assertRaises(asyncio.IncompleteReadError):
+            run(read(frame[:-1]))
+
+    def test_handle_request(self):
+        async def handle(payloads):
+            with ThreadPoolExecutor(1) as executor:
+                scheduler = BatchScheduler(Recorder().predict, executor, cache=PredictionCache(10, 'v1'))
+                runner = asyncio.ensure_future(scheduler.run())
+                try:
+                    return [await PythonServer.handle_request(payload, scheduler) for payload in payloads]
+                finally:
+                    runner.cancel()
+
+        single, batch, empty, stats = run(handle([b'SHello', b'B' + PythonServer.encode_strings(['hello', 'Bye']),
+                                                  b'B' + PythonServer.encode_strings([]), b'T']))
+        self.assertEqual(b'<hello>', single)
+        self.assertEqual(['<hello>', '<bye>'], PythonServer.decode_strings(batch))
+        self.assertEqual([], PythonServer.decode_strings(empty))
+        stats = json.loads(stats.decode('utf-8'))
+        self.assertEqual({'hits': 1, 'misses': 2}, {k: stats['cache'][k] for k in ('hits', 'misses')})
+        self.assertEqual(2, stats['batching']['sentences'])
+
+    def test_over_a_connection(self):
+        async def talk(payloads):
+            with ThreadPoolExecutor(1) as executor:
+                scheduler = BatchScheduler(Recorder().predict, executor)
+                runner = asyncio.ensure_future(scheduler.run())
+                server = await asyncio.start_server(lambda r, w: PythonServer.handle_client(r, w, scheduler),
+                                                    '127.0.0.1', 0)
+                try:
+                    reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+                    responses = []
+                    for payload in payloads:
+                        writer.write(payload)
+                        responses.append(await PythonServer.read_frame(reader))
+                    writer.close()
+                    return responses
+                finally:
+                    server.close()
+                    runner.cancel()
+
+        frames = [PythonServer.encode_frame(b'SHello'), PythonServer.encode_frame(b'SBye')]
+        self.assertEqual([b'<hello>', b'<bye>'], run(talk(frames)))
+        # The client is dropped, the connection closes without a response
+        too_large = struct.pack('>I', PythonServer.MAX_FRAME_SIZE + 1)
+        self.assertEqual([b'<hello>', None], run(talk(frames[:1] + [too_large])))
+
+class PredictionCacheTest(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = PredictionCache(2, 'v1')
+        for sentence in ('a', 'b'):
+            cache.put(cache.key(sentence), sentence.upper())
+        # Reading a makes b the least recently used
+        self.assertEqual((True, 'A'), cache.get(cache.key('a')))
+        cache.put(cache.key('c'), 'C')
+        self.assertEqual((False, None), cache.get(cache.key('b')))
+        self.assertEqual((True, 'A'), cache.get(cache.key('a')))
+        self.assertEqual({'size': 2, 'hits': 2, 'misses': 1, 'evictions': 1},
+                         {k: cache.to_dict()[k] for k in ('size', 'hits', 'misses', 'evictions')})
+
+    def test_new_version_empties_the_cache(self):
+        cache = PredictionCache(10, 'v1')
+        old_key = cache.key('a')
+        cache.put(old_key, 1)
+        cache.set_version('v1')
+        self.assertEqual(1, len(cache.entries))
+        cache.set_version('v2')
+        self.assertEqual(0, len(cache.entries))
+        # Labels of a prediction that started on the old model are not kept
+        cache.put(old_key, 1)
+        self.assertEqual((False, None), cache.get(cache.key('a')))
+
+    def test_disabled(self):
+        cache = PredictionCache(0, 'v1')
+        cache.put(cache.key('a'), 1)
+        self.assertEqual((False, None), cache.get(cache.key('a')))
+
+    def test_normalize(self):
+        self.assertEqual('great phone', PythonServer.normalize('  Great\t PHONE https://t.co/x www.example.com '))
+
+class BatchSchedulerTest(unittest.TestCase):
+
+    def test_batches_are_bounded(self):
+        async def submit(model, sentences, max_batch_size):
+            with ThreadPoolExecutor(1) as executor:
+                scheduler = BatchScheduler(model.predict, executor, max_batch_size=max_batch_size, max_wait=0.05)
+                runner = asyncio.ensure_future(scheduler.run())
+                try:
+                    return await scheduler.submit(sentences), scheduler.stats.to_dict()
+                finally:
+                    runner.cancel()
+
+        model = Recorder()
+        sentences = ['sentence {}'.format(i) for i in range(10)]
+        labels, stats = run(submit(model, sentences, 4))
+        self.assertEqual(['<{}>'.format(sentence) for sentence in sentences], labels)
+        self.assertEqual([4, 4, 2], [len(batch) for batch in model.batches])
+        self.assertEqual({'batches': 3, 'sentences': 10, 'max_batch_size': 4, 'batch_sizes': {'2': 1, '4': 2}},
+                         {k: stats[k] for k in ('batches', 'sentences', 'max_batch_size', 'batch_sizes')})
+
+    def test_concurrent_requests_share_a_batch(self):
+        async def submit_all(model):
+            with ThreadPoolExecutor(1) as executor:
+                scheduler = BatchScheduler(model.predict, executor, max_wait=0.05)
+                runner = asyncio.ensure_future(scheduler.run())
+                try:
+                    return await asyncio.gather(*(scheduler.submit([sentence]) for sentence in ('a', 'b', 'c')))
+                finally:
+                    runner.cancel()
+
+        model = Recorder()
+        self.assertEqual([['<a>'], ['<b>'], ['<c>']], run(submit_all(model)))
+        self.assertEqual([['a', 'b', 'c']], model.batches)
+
+    def test_failed_prediction(self):
+        class Failing:
+            def predict(self, sentences):
+                raise RuntimeError('model failed')
+
+        async def submit():
+            with ThreadPoolExecutor(1) as executor:
+                scheduler = BatchScheduler(Failing().predict, executor, cache=PredictionCache(10, 'v1'))
+                runner = asyncio.ensure_future(scheduler.run())
+                try:
+                    # Not assertRaises, clearing the frames of the traceback would close scheduler.run
+                    failed, = await asyncio.gather(scheduler.submit(['a']), return_exceptions=True)
+                    self.assertIsInstance(failed, RuntimeError)
+                    # The scheduler keeps running and nothing was cached
+                    scheduler.predict = Recorder().predict
+                    return await scheduler.submit(['a'])
+                finally:
+                    runner.cancel()
+
+        self.assertEqual(['<a>'], run(submit()))
+
+class CacheConsistencyTest(unittest.TestCase):
+
+    def test_same_key_same_label(self):
+        variants = ['hello', 'HELLO  ', ' Hello\tworld https://example.com', 'hello world']
+        for cache_size in (0, 100):
+            with self.subTest(cache_size=cache_size):
+                model = Recorder()
+                labels = run(label_each(model, cache_size, variants))
+                # The label only depends on the normalized sentence, cached or not
+                self.assertEqual(['<hello>', '<hello>', '<hello world>', '<hello world>'], labels)
+                predicted = [sentence for batch in model.batches for sentence in batch]
+                self.assertEqual({'hello', 'hello world'}, set(predicted))
+                if cache_size:
+                    self.assertEqual(2, len(predicted))
+
+if __name__ == '__main__':
+    unittest.main()
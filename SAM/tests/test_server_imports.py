@@ -0,0 +1,94 @@
+import contextlib, io, json, os, subprocess, sys, tempfile, unittest
+
+'''
+Guards the import cost of the server path. Run from the SAM folder with:
+python -m unittest discover tests
+'''
+
+sam_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# Training, plotting and deep learning modules that must not be loaded to serve predictions.
+# The Classifiers modules import each other by their bare names, so both names are listed
+training_modules = ['keras', 'tensorflow', 'matplotlib', 'yellowbrick', 'mpl_toolkits',
+                    'classifier_svm', 'classifier_lstm', 'Classifiers.classifier_svm', 'Classifiers.classifier_lstm']
+# Importing the server does not even load scikit-learn, the models do once they are loaded
+heavy_modules = ['sklearn'] + training_modules
+
+max_import_seconds = 2.0
+
+def import_in_subprocess(module):
+    '''
+    Imports a module in a fresh interpreter
+    Returns
+    -------
+    seconds: The time the import took,
+    modules: Every module imported afterwards
+    '''
+    code = ('import json, sys, time\n'
+            'start = time.perf_counter()\n'
+            'import {}\n'
+            'print(json.dumps({{"seconds": time.perf_counter() - start, "modules": list(sys.modules)}}))').format(module)
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=sam_dir)
+    return json.loads(output.decode('utf-8').splitlines()[-1])
+
+def save_tiny_heads(modelpath):
+    # Four multisvm heads trained on a handful of sentences, saved like the real ones
+    sys.path.insert(0, sam_dir + '/Classifiers')
+    import parallel_heads
+    from featurizers import char_wb_featurizer
+    from sklearn.svm import LinearSVC
+
+    X = ['I love it', 'great stuff', 'I hate it', 'awful stuff', 'it is a phone', 'the store opens at nine']
+    y = [1, 1, -1, -1, 0, 0]
+    with contextlib.redirect_stdout(io.StringIO()):
+        pipelines = parallel_heads.train_heads(X, y, char_wb_featurizer('tfidf'), LinearSVC(), 1)
+    parallel_heads.save_heads(pipelines, modelpath)
+
+def resolve_in_subprocess(clf, modelpath):
+    '''
+    Loads a backend through PythonServer.get_classifier in a fresh interpreter, with multisvm
+    reading its artifacts from modelpath
+    Returns
+    -------
+    labels: The predictions for two sentences,
+    modules: Every module imported afterwards
+    '''
+    code = ('import json, sys\n'
+            'import PythonServer\n'
+            'import Classifiers.multisvm as multisvm\n'
+            'multisvm.modelpath = {path!r}\n'
+            'multisvm.heads_manifest_path = {path!r} + "multisvm_heads.json"\n'
+            'multisvm.compact_path = {path!r} + "multisvm_compact.joblib"\n'
+            'multisvm.flat_path = {path!r} + "multisvm_flat"\n'
+            'model = PythonServer.get_classifier({clf!r})\n'
+            'labels = [int(label) for label in model.predict(["I love it", "awful"])]\n'
+            'print(json.dumps({{"labels": labels, "modules": list(sys.modules)}}))').format(clf=clf, path=modelpath)
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=sam_dir)
+    return json.loads(output.decode('utf-8').splitlines()[-1])
+
+class ServerImportTest(unittest.TestCase):
+
+    def assert_light_import(self, module):
+        result = import_in_subprocess(module)
+        loaded = [m for m in result['modules'] if m.split('.')[0] in heavy_modules or m in heavy_modules]
+        self.assertEqual([], loaded)
+        self.assertLess(result['seconds'], max_import_seconds)
+
+    def test_python_server(self):
+        self.assert_light_import('PythonServer')
+
+    def test_multisvm(self):
+        self.assert_light_import('Classifiers.multisvm')
+
+    def test_resolve_svm(self):
+        # Loading the svm backend may load scikit-learn, but none of the training code
+        with tempfile.TemporaryDirectory() as modelpath:
+            modelpath += '/'
+            save_tiny_heads(modelpath)
+            result = resolve_in_subprocess('svm', modelpath)
+        self.assertEqual(2, len(result['labels']))
+        loaded = [m for m in result['modules'] if m.split('.')[0] in training_modules or m in training_modules]
+        self.assertEqual([], loaded)
+
+if __name__ == '__main__':
+    unittest.main()